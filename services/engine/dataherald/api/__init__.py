@@ -1,8 +1,7 @@
-import io
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterator, List
 
-from fastapi import BackgroundTasks
+from fastapi import BackgroundTasks, Response
 
 from dataherald.api.types.query import Query
 from dataherald.api.types.requests import (
@@ -48,6 +47,11 @@ class API(Component, ABC):
         """Returns the current server time in nanoseconds to check if the server is alive"""
         pass
 
+    @abstractmethod
+    def get_metrics(self) -> dict:
+        """Returns the counters of the caches and connections of this engine process"""
+        pass
+
     @abstractmethod
     def scan_db(
         self, scanner_request: ScannerRequest, background_tasks: BackgroundTasks
@@ -123,11 +127,26 @@ class API(Component, ABC):
         pass
 
     @abstractmethod
-    def execute_sql_query(self, sql_generation_id: str, max_rows: int = 100) -> list:
+    def execute_sql_query(
+        self, sql_generation_id: str, max_rows: int = 100
+    ) -> tuple[list, bool]:
+        """Returns the rows and whether the engine limits left rows out"""
         pass
 
     @abstractmethod
-    def export_csv_file(self, sql_generation_id: str) -> io.StringIO:
+    def export_csv_file(
+        self, sql_generation_id: str, compress: bool = False
+    ) -> Iterator[bytes]:
+        pass
+
+    @abstractmethod
+    def export_sql_results(
+        self,
+        sql_generation_id: str,
+        result_format: str,
+        max_rows: int | None = None,
+        compress: bool = False,
+    ) -> Iterator[bytes]:
         pass
 
     @abstractmethod
@@ -205,13 +224,13 @@ class API(Component, ABC):
         pass
 
     @abstractmethod
-    def create_sql_generation(
+    async def create_sql_generation(
         self, prompt_id: str, sql_generation_request: SQLGenerationRequest
     ) -> SQLGenerationResponse:
         pass
 
     @abstractmethod
-    def create_prompt_and_sql_generation(
+    async def create_prompt_and_sql_generation(
         self, prompt_sql_generation_request: PromptSQLGenerationRequest
     ) -> SQLGenerationResponse:
         pass
@@ -239,14 +258,14 @@ class API(Component, ABC):
         pass
 
     @abstractmethod
-    def create_sql_and_nl_generation(
+    async def create_sql_and_nl_generation(
         self,
         prompt_id: str,
         nl_generation_sql_generation_request: NLGenerationsSQLGenerationRequest,
     ) -> NLGenerationResponse:
         pass
 
-    def create_prompt_sql_and_nl_generation(
+    async def create_prompt_sql_and_nl_generation(
         self, request: PromptSQLGenerationNLGenerationRequest
     ) -> NLGenerationResponse:
         pass
@@ -271,5 +290,7 @@ class API(Component, ABC):
     async def stream_create_prompt_and_sql_generation(
         self,
         request: StreamPromptSQLGenerationRequest,
-    ):
+    ) -> Response:
+        """Returns the streaming response of the steps, or the error response when the
+        generation is not admitted"""
         pass
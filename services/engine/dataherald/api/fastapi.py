@@ -1,17 +1,17 @@
 import asyncio
 import datetime
-import io
 import json
 import logging
 import os
 import time
-from queue import Queue
-from typing import List
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List
 
 from bson.objectid import InvalidId, ObjectId
 from fastapi import BackgroundTasks, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from overrides import override
 from sqlalchemy.exc import SQLAlchemyError
+from starlette.background import BackgroundTask
 
 from dataherald.api import API
 from dataherald.api.types.requests import (
@@ -39,6 +39,7 @@ from dataherald.db import DB
 from dataherald.db_scanner import Scanner
 from dataherald.db_scanner.models.types import (
     QueryHistory,
+    TableDescription,
 )
 from dataherald.db_scanner.repository.base import (
     InvalidColumnNameError,
@@ -65,7 +66,9 @@ from dataherald.services.sql_generations import (
     EmptySQLGenerationError,
     SQLGenerationService,
 )
+from dataherald.services.table_embeddings import TableEmbeddingService
 from dataherald.sql_database.base import (
+    DBConnections,
     SQLDatabase,
     SQLInjectionError,
 )
@@ -89,8 +92,17 @@ from dataherald.types import (
     TableDescriptionRequest,
     UpdateInstruction,
 )
+from dataherald.utils import metrics
 from dataherald.utils.encrypt import FernetEncrypt
 from dataherald.utils.error_codes import error_response, stream_error_response
+from dataherald.utils.result_stream import MEDIA_TYPES
+from dataherald.utils.s3 import CredentialFileCache
+from dataherald.utils.scheduler import (
+    GenerationQueueFullError,
+    GenerationScheduler,
+    StreamQueue,
+    get_tenant_id,
+)
 from dataherald.utils.sql_utils import (
     filter_golden_records_based_on_schema,
     validate_finetuning_schema,
@@ -101,12 +113,13 @@ logger = logging.getLogger(__name__)
 MAX_ROWS_TO_CREATE_CSV_FILE = 50
 
 
-def async_scanning(scanner, database, table_descriptions, storage):
+def async_scanning(scanner, database, table_descriptions, storage, incremental=False):
     scanner.scan(
         database,
         table_descriptions,
         TableDescriptionRepository(storage),
         QueryHistoryRepository(storage),
+        incremental,
     )
 
 
@@ -131,6 +144,14 @@ class FastAPI(API):
         """Returns the current server time in nanoseconds to check if the server is alive"""
         return int(time.time_ns())
 
+    @override
+    def get_metrics(self) -> dict:
+        """Returns the counters of the caches and connections of this engine process"""
+        return {
+            "counters": metrics.get_counters(),
+            "db_engines": DBConnections.get_stats(),
+        }
+
     @override
     def scan_db(
         self, scanner_request: ScannerRequest, background_tasks: BackgroundTasks
@@ -170,7 +191,12 @@ class FastAPI(API):
                 )
 
                 background_tasks.add_task(
-                    async_scanning, scanner, database, table_descriptions, self.storage
+                    async_scanning,
+                    scanner,
+                    database,
+                    table_descriptions,
+                    self.storage,
+                    scanner_request.incremental,
                 )
         return [TableDescriptionResponse(**row.dict()) for row in rows]
 
@@ -259,6 +285,11 @@ class FastAPI(API):
                     f"Database connection {db_connection_id} not found"
                 )
 
+            # Credential files uploaded again under the same path are downloaded again
+            CredentialFileCache.invalidate(db_connection.path_to_credentials_file)
+            CredentialFileCache.invalidate(
+                database_connection_request.path_to_credentials_file
+            )
             db_connection = DatabaseConnection(
                 id=db_connection_id,
                 alias=database_connection_request.alias,
@@ -268,9 +299,14 @@ class FastAPI(API):
                 use_ssh=database_connection_request.use_ssh,
                 ssh_settings=database_connection_request.ssh_settings,
                 file_storage=database_connection_request.file_storage,
+                sql_validation_mode=database_connection_request.sql_validation_mode,
+                cache_query_results=database_connection_request.cache_query_results,
+                pool_size=database_connection_request.pool_size,
                 metadata=database_connection_request.metadata,
             )
 
+            # The engines of the previous settings are not used anymore
+            DBConnections.invalidate(db_connection_id)
             sql_database = SQLDatabase.get_sql_engine(db_connection, True)
 
             # Get tables and views and create missing table-descriptions as NOT_SCANNED and update DEPRECATED
@@ -319,10 +355,23 @@ class FastAPI(API):
             table_description = scanner_repository.update_fields(
                 table, table_description_request
             )
+            self.refresh_table_embeddings([table_description])
             return TableDescriptionResponse(**table_description.dict())
         except InvalidColumnNameError as e:
             raise HTTPException(status_code=400, detail=str(e)) from e
 
+    def refresh_table_embeddings(self, tables: list[TableDescription]) -> None:
+        if not tables:
+            return
+        db_connection = DatabaseConnectionRepository(self.storage).find_by_id(
+            tables[0].db_connection_id
+        )
+        if not db_connection:
+            return
+        TableEmbeddingService.from_database_connection(
+            self.storage, db_connection
+        ).refresh(tables)
+
     @override
     def list_table_descriptions(
         self, db_connection_id: str, table_name: str | None = None
@@ -426,8 +475,11 @@ class FastAPI(API):
         return [GoldenSQLResponse(**golden_sql.dict()) for golden_sql in golden_sqls]
 
     @override
-    def execute_sql_query(self, sql_generation_id: str, max_rows: int = 100) -> list:
-        """Executes a SQL query against the database and returns the results"""
+    def execute_sql_query(
+        self, sql_generation_id: str, max_rows: int = 100
+    ) -> tuple[list, bool]:
+        """Executes a SQL query against the database and returns the results and
+        whether they were truncated"""
         sql_generation_service = SQLGenerationService(self.system, self.storage)
         try:
             results = sql_generation_service.execute(sql_generation_id, max_rows)
@@ -439,16 +491,34 @@ class FastAPI(API):
             raise HTTPException(status_code=400, detail=str(e)) from e
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e)) from e
-        return results[1].get("result", [])
+        return results[1].get("result", []), results[1].get("truncated", False)
 
     @override
-    def export_csv_file(self, sql_generation_id: str) -> io.StringIO:
+    def export_csv_file(
+        self, sql_generation_id: str, compress: bool = False
+    ) -> Iterator[bytes]:
         """Exports a SQL query to a CSV file"""
+        return self.export_sql_results(sql_generation_id, "csv", compress=compress)
+
+    @override
+    def export_sql_results(
+        self,
+        sql_generation_id: str,
+        result_format: str,
+        max_rows: int | None = None,
+        compress: bool = False,
+    ) -> Iterator[bytes]:
+        """Streams the results of a SQL query as csv, jsonl, arrow or parquet"""
+        if result_format not in MEDIA_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid format {result_format}, use one of {', '.join(MEDIA_TYPES)}",
+            )
         sql_generation_service = SQLGenerationService(self.system, self.storage)
         try:
-            csv_dataframe = sql_generation_service.create_dataframe(sql_generation_id)
-            csv_stream = io.StringIO()
-            csv_dataframe.to_csv(csv_stream, index=False)
+            return sql_generation_service.export(
+                sql_generation_id, result_format, max_rows, compress
+            )
         except SQLGenerationNotFoundError as e:
             raise HTTPException(status_code=404, detail=str(e)) from e
         except SQLInjectionError as e:
@@ -457,7 +527,6 @@ class FastAPI(API):
             raise HTTPException(status_code=400, detail=str(e)) from e
         except EmptySQLGenerationError as e:
             raise HTTPException(status_code=400, detail=str(e)) from e
-        return csv_stream
 
     @override
     def delete_golden_sql(self, golden_sql_id: str) -> dict:
@@ -702,13 +771,13 @@ class FastAPI(API):
         return model_repository.update(model)
 
     @override
-    def create_sql_generation(
+    async def create_sql_generation(
         self, prompt_id: str, sql_generation_request: SQLGenerationRequest
     ) -> SQLGenerationResponse:
         try:
             ObjectId(prompt_id)
             sql_generation_service = SQLGenerationService(self.system, self.storage)
-            sql_generation = sql_generation_service.create(
+            sql_generation = await sql_generation_service.acreate(
                 prompt_id, sql_generation_request
             )
         except Exception as e:
@@ -719,14 +788,16 @@ class FastAPI(API):
         return SQLGenerationResponse(**sql_generation.dict())
 
     @override
-    def create_prompt_and_sql_generation(
+    async def create_prompt_and_sql_generation(
         self, prompt_sql_generation_request: PromptSQLGenerationRequest
     ) -> SQLGenerationResponse:
         try:
             prompt_service = PromptService(self.storage)
-            prompt = prompt_service.create(prompt_sql_generation_request.prompt)
+            prompt = await asyncio.to_thread(
+                prompt_service.create, prompt_sql_generation_request.prompt
+            )
             sql_generation_service = SQLGenerationService(self.system, self.storage)
-            sql_generation = sql_generation_service.create(
+            sql_generation = await sql_generation_service.acreate(
                 prompt.id, prompt_sql_generation_request
             )
         except Exception as e:
@@ -801,7 +872,7 @@ class FastAPI(API):
         return NLGenerationResponse(**nl_generation.dict())
 
     @override
-    def create_sql_and_nl_generation(
+    async def create_sql_and_nl_generation(
         self,
         prompt_id: str,
         nl_generation_sql_generation_request: NLGenerationsSQLGenerationRequest,
@@ -809,12 +880,14 @@ class FastAPI(API):
         try:
             ObjectId(prompt_id)
             sql_generation_service = SQLGenerationService(self.system, self.storage)
-            sql_generation = sql_generation_service.create(
+            sql_generation = await sql_generation_service.acreate(
                 prompt_id, nl_generation_sql_generation_request.sql_generation
             )
             nl_generation_service = NLGenerationService(self.system, self.storage)
-            nl_generation = nl_generation_service.create(
-                sql_generation.id, nl_generation_sql_generation_request
+            nl_generation = await asyncio.to_thread(
+                nl_generation_service.create,
+                sql_generation.id,
+                nl_generation_sql_generation_request,
             )
         except Exception as e:
             return error_response(
@@ -829,18 +902,22 @@ class FastAPI(API):
         return NLGenerationResponse(**nl_generation.dict())
 
     @override
-    def create_prompt_sql_and_nl_generation(
+    async def create_prompt_sql_and_nl_generation(
         self, request: PromptSQLGenerationNLGenerationRequest
     ) -> NLGenerationResponse:
         prompt_service = PromptService(self.storage)
         try:
-            prompt = prompt_service.create(request.sql_generation.prompt)
+            prompt = await asyncio.to_thread(
+                prompt_service.create, request.sql_generation.prompt
+            )
             sql_generation_service = SQLGenerationService(self.system, self.storage)
-            sql_generation = sql_generation_service.create(
+            sql_generation = await sql_generation_service.acreate(
                 prompt.id, request.sql_generation
             )
             nl_generation_service = NLGenerationService(self.system, self.storage)
-            nl_generation = nl_generation_service.create(sql_generation.id, request)
+            nl_generation = await asyncio.to_thread(
+                nl_generation_service.create, sql_generation.id, request
+            )
         except Exception as e:
             return error_response(e, request.dict(), "nl_generation_not_created")
 
@@ -894,21 +971,43 @@ class FastAPI(API):
     async def stream_create_prompt_and_sql_generation(
         self,
         request: StreamPromptSQLGenerationRequest,
-    ):
+    ) -> Response:
+        """Admits the generation before the response starts, so a full queue is
+        answered with a 429. The slot is freed when the stream ends, or by the
+        background task when the client left before it started"""
+        try:
+            release = await GenerationScheduler.get().acquire(
+                request.prompt.db_connection_id, get_tenant_id(request.metadata)
+            )
+        except GenerationQueueFullError as e:
+            return error_response(e, request.dict(), "nl_generation_not_created")
+        return StreamingResponse(
+            self.stream_sql_generation_steps(request, release),
+            media_type="text/event-stream",
+            background=BackgroundTask(release),
+        )
+
+    async def stream_sql_generation_steps(
+        self,
+        request: StreamPromptSQLGenerationRequest,
+        release: Callable[[], Awaitable[None]],
+    ) -> AsyncIterator[str]:
         try:
-            queue = Queue()
+            queue = StreamQueue(asyncio.get_running_loop())
             prompt_service = PromptService(self.storage)
-            prompt = prompt_service.create(request.prompt)
+            prompt = await asyncio.to_thread(prompt_service.create, request.prompt)
             sql_generation_service = SQLGenerationService(self.system, self.storage)
-            sql_generation_service.start_streaming(prompt.id, request, queue)
+            await asyncio.to_thread(
+                sql_generation_service.start_streaming, prompt.id, request, queue
+            )
             while True:
-                value = queue.get()
+                value = await queue.aget()
                 if value is None:
                     break
                 yield value
-                queue.task_done()
-                await asyncio.sleep(0.001)
         except Exception as e:
             yield json.dumps(
                 stream_error_response(e, request.dict(), "nl_generation_not_created")
             )
+        finally:
+            await release()
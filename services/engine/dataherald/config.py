@@ -15,6 +15,7 @@ _abstract_type_keys: Dict[str, str] = {
     "dataherald.db.DB": "db_impl",
     "dataherald.context_store.ContextStore": "context_store_impl",
     "dataherald.vector_store.VectorStore": "vector_store_impl",
+    "dataherald.smart_cache.SmartCache": "smart_cache_impl",
 }
 
 
@@ -38,6 +39,9 @@ class Settings(BaseSettings):
     vector_store_impl: str = os.environ.get(
         "VECTOR_STORE", "dataherald.vector_store.chroma.Chroma"
     )
+    smart_cache_impl: str = os.environ.get(
+        "SMART_CACHE", "dataherald.smart_cache.in_memory.InMemoryCache"
+    )
 
     db_name: str | None = os.environ.get("MONGODB_DB_NAME")
     db_uri: str | None = os.environ.get("MONGODB_URI")
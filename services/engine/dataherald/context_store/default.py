@@ -11,7 +11,7 @@ from dataherald.repositories.database_connections import (
     DatabaseConnectionRepository,
 )
 from dataherald.repositories.golden_sqls import GoldenSQLRepository
-from dataherald.repositories.instructions import InstructionRepository
+from dataherald.services.context_snapshots import ContextSnapshots
 from dataherald.types import GoldenSQL, GoldenSQLRequest, Prompt
 from dataherald.utils.sql_utils import extract_the_schemas_from_sql
 
@@ -31,37 +31,32 @@ class DefaultContextStore(ContextStore):
         self, prompt: Prompt, number_of_samples: int = 3
     ) -> Tuple[List[dict] | None, List[dict] | None]:
         logger.info(f"Getting context for {prompt.text}")
-        closest_questions = self.vector_store.query(
-            query_texts=[prompt.text],
-            db_connection_id=prompt.db_connection_id,
-            collection=self.golden_sql_collection,
-            num_results=number_of_samples,
-        )
+        snapshot = ContextSnapshots.get(self.db, prompt.db_connection_id)
+        closest_questions = []
+        if snapshot.golden_sql_count > 0:
+            closest_questions = self.vector_store.query(
+                query_texts=[prompt.text],
+                db_connection_id=prompt.db_connection_id,
+                collection=self.golden_sql_collection,
+                num_results=number_of_samples,
+            )
 
-        samples = []
         golden_sqls_repository = GoldenSQLRepository(self.db)
-        for question in closest_questions:
-            golden_sql = golden_sqls_repository.find_by_id(question["id"])
-            if golden_sql is not None:
-                samples.append(
-                    {
-                        "prompt_text": golden_sql.prompt_text,
-                        "sql": golden_sql.sql,
-                        "score": question["score"],
-                    }
-                )
+        golden_sqls = golden_sqls_repository.find_by_ids(
+            [question["id"] for question in closest_questions]
+        )
+        scores = {question["id"]: question["score"] for question in closest_questions}
+        samples = [
+            {
+                "prompt_text": golden_sql.prompt_text,
+                "sql": golden_sql.sql,
+                "score": scores[golden_sql.id],
+            }
+            for golden_sql in golden_sqls
+        ]
         if len(samples) == 0:
             samples = None
-        instructions = []
-        instruction_repository = InstructionRepository(self.db)
-        all_instructions = instruction_repository.find_all()
-        for instruction in all_instructions:
-            if instruction.db_connection_id == prompt.db_connection_id:
-                instructions.append(
-                    {
-                        "instruction": instruction.instruction,
-                    }
-                )
+        instructions = list(snapshot.instructions)
         if len(instructions) == 0:
             instructions = None
 
@@ -45,10 +45,25 @@ class DB(Component, ABC):
     ) -> list:
         pass
 
+    @abstractmethod
+    def count(self, collection: str, query: dict) -> int:
+        pass
+
     @abstractmethod
     def find_all(self, collection: str, page: int = 0, limit: int = 0) -> list:
         pass
 
+    @abstractmethod
+    def create_index(self, collection: str, keys: list, **options) -> str:
+        """Options are passed to MongoDB, as unique or expireAfterSeconds"""
+        pass
+
+    @abstractmethod
+    def get_indexes(self, collection: str) -> list:
+        """Keys and options of each index of the collection, as (keys, options) where
+        the keys are lists of (field, direction)"""
+        pass
+
     @abstractmethod
     def delete_by_id(self, collection: str, id: str) -> int:
         pass
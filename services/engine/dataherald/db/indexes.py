@@ -0,0 +1,93 @@
+"""Indexes of the queries the engine runs on its hot paths"""
+
+import logging
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING
+
+from dataherald.db import DB
+
+logger = logging.getLogger(__name__)
+
+# Options compared with the ones of the existing indexes
+COMPARED_OPTIONS = ("unique", "expireAfterSeconds")
+# Keys and create_index options of the indexes of each collection
+INDEXES: Dict[str, List[Tuple[List[Tuple[str, int]], dict]]] = {
+    "table_descriptions": [
+        ([("db_connection_id", ASCENDING), ("status", ASCENDING)], {}),
+        (
+            [
+                ("db_connection_id", ASCENDING),
+                ("table_name", ASCENDING),
+                ("schema_name", ASCENDING),
+            ],
+            {},
+        ),
+    ],
+    "table_embeddings": [
+        (
+            [
+                ("db_connection_id", ASCENDING),
+                ("embedding_model", ASCENDING),
+                ("table_description_id", ASCENDING),
+            ],
+            {},
+        )
+    ],
+    "golden_sqls": [([("db_connection_id", ASCENDING)], {})],
+    "instructions": [([("db_connection_id", ASCENDING)], {})],
+    "context_versions": [([("db_connection_id", ASCENDING)], {"unique": True})],
+    "sql_generations": [([("prompt_id", ASCENDING)], {})],
+    "nl_generations": [([("sql_generation_id", ASCENDING)], {})],
+    "sql_generation_cache": [
+        ([("key", ASCENDING)], {"unique": True}),
+        # MongoDB deletes the cached generations once their expires_at is reached
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+}
+
+
+def get_missing_indexes(
+    storage: DB,
+) -> List[Tuple[str, List[Tuple[str, int]], dict]]:
+    """Indexes of INDEXES that do not exist, as (collection, keys, options). Indexes
+    with the same keys and other options can not be created and are only reported"""
+    missing = []
+    for collection, indexes in INDEXES.items():
+        existing = storage.get_indexes(collection)
+        for keys, options in indexes:
+            existing_options = next(
+                (
+                    index_options
+                    for index_keys, index_options in existing
+                    if index_keys == keys
+                ),
+                None,
+            )
+            if existing_options is None:
+                missing.append((collection, keys, options))
+            elif any(
+                existing_options.get(option) != options.get(option)
+                for option in COMPARED_OPTIONS
+            ):
+                logger.warning(
+                    f"Index {keys} on {collection} has the options {existing_options}"
+                    f" instead of {options}, drop it so it is created again"
+                )
+    return missing
+
+
+def ensure_indexes(storage: DB) -> List[Tuple[str, List[Tuple[str, int]], dict]]:
+    """Creates the missing indexes and returns the ones created, creating an index that
+    exists does nothing so it is safe to run on every start"""
+    created = []
+    for collection, keys, options in get_missing_indexes(storage):
+        logger.info(f"Creating index {keys} {options} on {collection}")
+        try:
+            storage.create_index(collection, keys, **options)
+        except Exception as e:
+            # As a unique index over duplicated values, the other indexes are created
+            logger.warning(f"Unable to create index {keys} on {collection}: {e}")
+            continue
+        created.append((collection, keys, options))
+    return created
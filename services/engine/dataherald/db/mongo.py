@@ -1,9 +1,19 @@
+import logging
+import os
+
 from bson.objectid import ObjectId
 from overrides import override
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 
 from dataherald.config import System
 from dataherald.db import DB
+from dataherald.db.indexes import ensure_indexes
+
+# Creates the missing indexes of dataherald.db.indexes when the engine starts
+MONGODB_ENSURE_INDEXES = os.environ.get("MONGODB_ENSURE_INDEXES", "true") == "true"
+
+logger = logging.getLogger(__name__)
 
 
 class MongoDB(DB):
@@ -14,6 +24,11 @@ class MongoDB(DB):
         db_uri = system.settings.require("db_uri")
         db_name = system.settings.require("db_name")
         self._data_store = MongoClient(db_uri, tz_aware=True)[db_name]
+        if MONGODB_ENSURE_INDEXES:
+            try:
+                ensure_indexes(self)
+            except Exception as e:
+                logger.warning(f"Unable to create the MongoDB indexes: {e}")
 
     @override
     def find_one(self, collection: str, query: dict) -> dict:
@@ -43,7 +58,14 @@ class MongoDB(DB):
                 del obj["created_at"]
             self._data_store[collection].update_one(query, {"$set": obj})
             return row["_id"]
-        return self.insert_one(collection, obj)
+        try:
+            return self.insert_one(collection, obj)
+        except DuplicateKeyError:
+            # A concurrent call inserted the row first, as unique indexes allow one
+            obj.pop("_id", None)
+            obj.pop("created_at", None)
+            self._data_store[collection].update_one(query, {"$set": obj})
+            return self.find_one(collection, query)["_id"]
 
     @override
     def find_by_id(self, collection: str, id: str) -> dict:
@@ -66,6 +88,10 @@ class MongoDB(DB):
             cursor = cursor.skip(skip_count).limit(limit)
         return list(cursor)
 
+    @override
+    def count(self, collection: str, query: dict) -> int:
+        return self._data_store[collection].count_documents(query)
+
     @override
     def find_all(self, collection: str, page: int = 0, limit: int = 0) -> list:
         if page > 0 and limit > 0:
@@ -75,6 +101,24 @@ class MongoDB(DB):
             )
         return list(self._data_store[collection].find({}))
 
+    @override
+    def create_index(self, collection: str, keys: list, **options) -> str:
+        return self._data_store[collection].create_index(keys, **options)
+
+    @override
+    def get_indexes(self, collection: str) -> list:
+        return [
+            (
+                [(field, direction) for field, direction in index["key"]],
+                {
+                    name: value
+                    for name, value in index.items()
+                    if name not in ("key", "v", "ns")
+                },
+            )
+            for index in self._data_store[collection].index_information().values()
+        ]
+
     @override
     def delete_by_id(self, collection: str, id: str) -> int:
         result = self._data_store[collection].delete_one({"_id": ObjectId(id)})
@@ -18,8 +18,9 @@ class Scanner(Component, ABC):
         table_descriptions: list[TableDescription],
         repository: TableDescriptionRepository,
         query_history_repository: QueryHistoryRepository,
+        incremental: bool = False,
     ) -> None:
-        """ "Scan a db"""
+        """ "Scan a db, if incremental only the tables that changed since the last scan are profiled"""
 
     @abstractmethod
     def synchronizing(
@@ -41,6 +41,7 @@ class TableDescription(BaseModel):
     status: str = TableDescriptionStatus.SCANNED.value
     error_message: str | None
     metadata: dict | None
+    fingerprint: str | None
     created_at: datetime = Field(default_factory=datetime.now)
 
     @validator("last_schema_sync", pre=True)
@@ -57,3 +58,13 @@ class QueryHistory(BaseModel):
     query: str
     user: str
     occurrences: int = 0
+
+
+class TableEmbedding(BaseModel):
+    id: str | None
+    db_connection_id: str
+    table_description_id: str
+    embedding_model: str
+    content_hash: str
+    embedding: list[float]
+    created_at: datetime = Field(default_factory=datetime.now)
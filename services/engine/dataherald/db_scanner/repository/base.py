@@ -4,6 +4,7 @@ from bson.objectid import ObjectId
 from pymongo import ASCENDING
 
 from dataherald.db_scanner.models.types import TableDescription
+from dataherald.repositories.context_versions import ContextVersionRepository
 
 DB_COLLECTION = "table_descriptions"
 
@@ -68,6 +69,7 @@ class TableDescriptionRepository:
                 table_info_dict,
             )
         )
+        ContextVersionRepository(self.storage).bump(table_info.db_connection_id)
         return table_info
 
     def update(self, table_info: TableDescription) -> TableDescription:
@@ -81,6 +83,7 @@ class TableDescriptionRepository:
             {"_id": ObjectId(table_info.id)},
             table_info_dict,
         )
+        ContextVersionRepository(self.storage).bump(table_info.db_connection_id)
         return table_info
 
     def find_all(self) -> list[TableDescription]:
@@ -0,0 +1,30 @@
+from dataherald.db_scanner.models.types import TableEmbedding
+
+DB_COLLECTION = "table_embeddings"
+
+
+class TableEmbeddingRepository:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def find_by(self, query: dict) -> list[TableEmbedding]:
+        rows = self.storage.find(DB_COLLECTION, query)
+        result = []
+        for row in rows:
+            row["id"] = str(row["_id"])
+            result.append(TableEmbedding(**row))
+        return result
+
+    def save(self, table_embedding: TableEmbedding) -> TableEmbedding:
+        table_embedding.id = str(
+            self.storage.update_or_create(
+                DB_COLLECTION,
+                {
+                    "db_connection_id": str(table_embedding.db_connection_id),
+                    "table_description_id": str(table_embedding.table_description_id),
+                    "embedding_model": table_embedding.embedding_model,
+                },
+                table_embedding.dict(exclude={"id"}),
+            )
+        )
+        return table_embedding
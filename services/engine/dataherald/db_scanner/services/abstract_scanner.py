@@ -1,10 +1,18 @@
 from abc import ABC, abstractmethod
+from typing import Any
 
-from sqlalchemy.sql.schema import Column
+import sqlalchemy
+from sqlalchemy import String, cast
+from sqlalchemy.sql import func
+from sqlalchemy.sql.schema import Column, Table
 
 from dataherald.db_scanner.models.types import QueryHistory
 from dataherald.sql_database.base import SQLDatabase
 
+MIN_CATEGORY_VALUE = 1
+MAX_CATEGORY_VALUE = 100
+PROFILING_COLUMNS_PER_QUERY = 100
+
 
 class AbstractScanner(ABC):
     @abstractmethod
@@ -18,3 +26,64 @@ class AbstractScanner(ABC):
     ) -> list[QueryHistory]:
         """Returns a list of logs"""
         pass
+
+    def get_table_change_metadata(
+        self,
+        table: str,  # noqa: ARG002
+        db_engine: SQLDatabase,  # noqa: ARG002
+        schema: str | None = None,  # noqa: ARG002
+    ) -> list | None:
+        """Returns row count or last modification values that change when the data of the
+        table changes, None if the dialect does not expose them"""
+        return None
+
+    def distinct_count_expression(self, column: Column) -> Any:
+        """Returns the aggregate used to count, or estimate, the distinct values of a column"""
+        return func.count(func.distinct(column))
+
+    def max_length_expression(self, column: Column) -> Any:
+        """Returns the aggregate used to get the length of the longest value of a column"""
+        return func.max(func.length(cast(column, String)))
+
+    def distinct_values(self, column: Column, db_engine: SQLDatabase) -> list:
+        cardinality_query = sqlalchemy.select([func.distinct(column)]).limit(
+            MAX_CATEGORY_VALUE + 1
+        )
+        cardinality = db_engine.engine.execute(cardinality_query).fetchall()
+        return [str(category[0]) for category in cardinality]
+
+    def profile_columns(
+        self,
+        table: Table,
+        columns: list[Column],
+        db_engine: SQLDatabase,
+        max_size_letters: int,
+    ) -> dict[str, list | None]:
+        """Returns the categories of each column, or None if it is not a catalog. The
+        distinct count and max length of the columns are measured with one aggregate
+        query per chunk of columns, the values are only fetched for the catalogs"""
+        categories = {}
+        for start in range(0, len(columns), PROFILING_COLUMNS_PER_QUERY):
+            chunk = columns[start : start + PROFILING_COLUMNS_PER_QUERY]
+            aggregates = []
+            for index, column in enumerate(chunk):
+                aggregates.append(
+                    self.distinct_count_expression(column).label(f"distinct_{index}")
+                )
+                aggregates.append(
+                    self.max_length_expression(column).label(f"length_{index}")
+                )
+            profile_query = sqlalchemy.select(aggregates).select_from(table)
+            row = db_engine.engine.execute(profile_query).first()
+            for index, column in enumerate(chunk):
+                distinct_count = row[2 * index] if row else None
+                max_length = row[2 * index + 1] if row else None
+                if (
+                    distinct_count is not None
+                    and MIN_CATEGORY_VALUE < distinct_count <= MAX_CATEGORY_VALUE
+                    and (max_length or 0) <= max_size_letters
+                ):
+                    categories[column.name] = self.distinct_values(column, db_engine)
+                else:
+                    categories[column.name] = None
+        return categories
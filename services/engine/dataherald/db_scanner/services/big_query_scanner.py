@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from typing import Any
 
 import sqlalchemy
 from overrides import override
@@ -35,6 +36,22 @@ class BigQueryScanner(AbstractScanner):
 
         return None
 
+    @override
+    def distinct_count_expression(self, column: Column) -> Any:
+        return func.APPROX_COUNT_DISTINCT(column)
+
+    @override
+    def get_table_change_metadata(
+        self, table: str, db_engine: SQLDatabase, schema: str | None = None
+    ) -> list | None:
+        dataset = schema or db_engine.engine.url.database
+        if not dataset:
+            return None
+        rs = db_engine.engine.execute(
+            f"SELECT row_count, last_modified_time FROM `{dataset}.__TABLES__` WHERE table_id = '{table}'"  # noqa: S608 E501
+        ).fetchall()
+        return [str(value) for row in rs for value in row] or None
+
     @override
     def get_logs(
         self, table: str, db_engine: SQLDatabase, db_connection_id: str
@@ -1,3 +1,5 @@
+from typing import Any
+
 import sqlalchemy
 from overrides import override
 from sqlalchemy.sql import func
@@ -29,6 +31,20 @@ class ClickHouseScanner(AbstractScanner):
 
         return None
 
+    @override
+    def distinct_count_expression(self, column: Column) -> Any:
+        return func.uniqHLL12(column)
+
+    @override
+    def get_table_change_metadata(
+        self, table: str, db_engine: SQLDatabase, schema: str | None = None
+    ) -> list | None:
+        schema_filter = f" AND database = '{schema}'" if schema else ""
+        rs = db_engine.engine.execute(
+            f"SELECT total_rows, total_bytes, metadata_modification_time FROM system.tables WHERE name = '{table}'{schema_filter}"  # noqa: S608 E501
+        ).fetchall()
+        return [str(value) for row in rs for value in row] or None
+
     @override
     def get_logs(
         self, table: str, db_engine: SQLDatabase, db_connection_id: str  # noqa: ARG002
@@ -1,5 +1,6 @@
 from overrides import override
-from sqlalchemy.sql.schema import Column
+from sqlalchemy import text
+from sqlalchemy.sql.schema import Column, Table
 
 from dataherald.db_scanner.models.types import QueryHistory
 from dataherald.db_scanner.services.abstract_scanner import AbstractScanner
@@ -23,6 +24,51 @@ class PostgreSqlScanner(AbstractScanner):
             return rs[0]["most_common_vals"]
         return None
 
+    @override
+    def profile_columns(
+        self,
+        table: Table,
+        columns: list[Column],
+        db_engine: SQLDatabase,
+        max_size_letters: int,
+    ) -> dict[str, list | None]:
+        """pg_stats already has the distinct count and the most common values of every
+        column, so the whole table is profiled with a single query. Tables without a
+        schema are looked up in the current schema"""
+        rs = db_engine.engine.execute(
+            text(
+                "SELECT attname, n_distinct, most_common_vals::TEXT::TEXT[] FROM pg_catalog.pg_stats "
+                "WHERE tablename = :table AND schemaname = COALESCE(:schema, current_schema())"
+            ),
+            table=table.name,
+            schema=table.schema,
+        ).fetchall()
+        stats = {row["attname"]: row for row in rs}
+        categories = {}
+        for column in columns:
+            row = stats.get(column.name)
+            if (
+                row is not None
+                and MIN_CATEGORY_VALUE < row["n_distinct"] <= MAX_CATEGORY_VALUE
+                and row["most_common_vals"]
+                and max(len(str(value)) for value in row["most_common_vals"])
+                <= max_size_letters
+            ):
+                categories[column.name] = row["most_common_vals"]
+            else:
+                categories[column.name] = None
+        return categories
+
+    @override
+    def get_table_change_metadata(
+        self, table: str, db_engine: SQLDatabase, schema: str | None = None
+    ) -> list | None:
+        schema_filter = f" AND schemaname = '{schema}'" if schema else ""
+        rs = db_engine.engine.execute(
+            f"SELECT n_live_tup, n_tup_ins, n_tup_upd, n_tup_del FROM pg_catalog.pg_stat_user_tables WHERE relname = '{table}'{schema_filter}"  # noqa: S608 E501
+        ).fetchall()
+        return [str(value) for row in rs for value in row] or None
+
     @override
     def get_logs(
         self, table: str, db_engine: SQLDatabase, db_connection_id: str  # noqa: ARG002
@@ -1,3 +1,5 @@
+from typing import Any
+
 import sqlalchemy
 from overrides import override
 from sqlalchemy.sql import func
@@ -29,6 +31,10 @@ class RedshiftScanner(AbstractScanner):
 
         return None
 
+    @override
+    def distinct_count_expression(self, column: Column) -> Any:
+        return func.HLL(column)
+
     @override
     def get_logs(
         self, table: str, db_engine: SQLDatabase, db_connection_id: str  # noqa: ARG002
@@ -1,7 +1,9 @@
 from datetime import datetime, timedelta
+from typing import Any
 
 import sqlalchemy
 from overrides import override
+from sqlalchemy import text
 from sqlalchemy.sql import func
 from sqlalchemy.sql.schema import Column
 
@@ -31,6 +33,29 @@ class SnowflakeScanner(AbstractScanner):
 
         return None
 
+    @override
+    def distinct_count_expression(self, column: Column) -> Any:
+        return func.HLL(column)
+
+    @override
+    def get_table_change_metadata(
+        self, table: str, db_engine: SQLDatabase, schema: str | None = None
+    ) -> list | None:
+        """Unquoted identifiers are stored in upper case, the reflected name is matched
+        as is and in upper case. Tables without a schema are looked up in the current
+        schema"""
+        rs = db_engine.engine.execute(
+            text(
+                "SELECT ROW_COUNT, LAST_ALTERED FROM INFORMATION_SCHEMA.TABLES "
+                "WHERE TABLE_NAME IN (:table, UPPER(:table)) "
+                "AND TABLE_SCHEMA IN (COALESCE(:schema, CURRENT_SCHEMA()), UPPER(:schema)) "
+                "ORDER BY TABLE_SCHEMA, TABLE_NAME"
+            ),
+            table=table,
+            schema=schema,
+        ).fetchall()
+        return [str(value) for row in rs for value in row] or None
+
     @override
     def get_logs(
         self, table: str, db_engine: SQLDatabase, db_connection_id: str
@@ -1,5 +1,10 @@
+from typing import Any
+
 from overrides import override
+from sqlalchemy import cast
+from sqlalchemy.dialects.mssql import NVARCHAR
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql import func
 from sqlalchemy.sql.schema import Column
 
 from dataherald.db_scanner.models.types import QueryHistory
@@ -31,6 +36,20 @@ class SqlServerScanner(AbstractScanner):
 
         return None
 
+    @override
+    def distinct_count_expression(self, column: Column) -> Any:
+        return func.APPROX_COUNT_DISTINCT(column)
+
+    @override
+    def max_length_expression(self, column: Column) -> Any:
+        return func.max(func.len(cast(column, NVARCHAR(4000))))
+
+    @override
+    def distinct_values(self, column: Column, db_engine: SQLDatabase) -> list:
+        cardinality_query = f"SELECT TOP 101 {column.name} FROM (SELECT DISTINCT {column.name} FROM [{column.table.name}]) AS subquery;"  # noqa: E501 S608
+        cardinality = db_engine.engine.execute(cardinality_query).fetchall()
+        return [str(category[0]) for category in cardinality]
+
     @override
     def get_logs(
         self, table: str, db_engine: SQLDatabase, db_connection_id: str  # noqa: ARG002
@@ -1,5 +1,10 @@
+import hashlib
+import json
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from threading import BoundedSemaphore, Lock
 from typing import Any, List
 
 import sqlalchemy
@@ -25,20 +30,47 @@ from dataherald.db_scanner.services.postgre_sql_scanner import PostgreSqlScanner
 from dataherald.db_scanner.services.redshift_scanner import RedshiftScanner
 from dataherald.db_scanner.services.snowflake_scanner import SnowflakeScanner
 from dataherald.db_scanner.services.sql_server_scanner import SqlServerScanner
+from dataherald.repositories.database_connections import DatabaseConnectionRepository
+from dataherald.services.table_embeddings import TableEmbeddingService
 from dataherald.sql_database.base import SQLDatabase
 from dataherald.types import ScannerRequest
 
 MIN_CATEGORY_VALUE = 1
 MAX_CATEGORY_VALUE = 60
 MAX_SIZE_LETTERS = 50
+# Number of tables of the same db connection scanned at the same time
+SCANNER_PARALLELISM = int(os.environ.get("SCANNER_PARALLELISM", "1"))
+# Number of columns of a table profiled at the same time
+SCANNER_COLUMN_PARALLELISM = int(os.environ.get("SCANNER_COLUMN_PARALLELISM", "1"))
+# "column" runs a size probe and a cardinality query per column, "table" profiles all the
+# columns of a table with a single aggregate query. Dialects without an approximate
+# distinct count (the default AbstractScanner one) run an exact COUNT(DISTINCT) for each of
+# up to PROFILING_COLUMNS_PER_QUERY (100) columns in that query, which reads and sorts the
+# whole table once per column and can be slower than "column" on large tables. PostgreSQL
+# reads pg_stats instead, if the table profile fails the columns are profiled one by one
+COLUMN_PROFILING_MODE = os.environ.get("COLUMN_PROFILING_MODE", "column")
 
 logger = logging.getLogger(__name__)
 
 
 class SqlAlchemyScanner(Scanner):
+    _scan_semaphores: dict[str, BoundedSemaphore] = {}
+    _scan_semaphores_lock = Lock()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+    @classmethod
+    def get_scan_semaphore(cls, db_connection_id: str) -> BoundedSemaphore:
+        """Limits the tables scanned at the same time for a db connection, also across
+        scans running in different background tasks"""
+        with cls._scan_semaphores_lock:
+            if db_connection_id not in cls._scan_semaphores:
+                cls._scan_semaphores[db_connection_id] = BoundedSemaphore(
+                    max(SCANNER_PARALLELISM, 1)
+                )
+            return cls._scan_semaphores[db_connection_id]
+
     @override
     def create_tables(
         self,
@@ -183,12 +215,36 @@ class SqlAlchemyScanner(Scanner):
             low_cardinality=False,
         )
 
+    def get_column_categories(
+        self,
+        meta: MetaData,
+        table: str,
+        columns: list[dict],
+        db_engine: SQLDatabase,
+        scanner_service: AbstractScanner,
+    ) -> dict[str, list | None] | None:
+        """Profiles all the columns of the table at once, returns None if the dialect does
+        not support it so the columns are processed one by one"""
+        dynamic_meta_table = meta.tables[table]
+        try:
+            return scanner_service.profile_columns(
+                dynamic_meta_table,
+                [dynamic_meta_table.c[column["name"]] for column in columns],
+                db_engine,
+                MAX_SIZE_LETTERS,
+            )
+        except Exception as e:
+            logger.warning(
+                f"Unable to profile the columns of {table} in a single query: {e}"
+            )
+            return None
+
     def get_table_schema(
         self, meta: MetaData, db_engine: SQLDatabase, table: str
     ) -> str:
         print(f"Create table schema for: {table}")
 
-        original_table = next((x for x in meta.sorted_tables if x.name == table), None)
+        original_table = meta.tables.get(table)
         if original_table is None:
             raise ValueError(f"Table '{table}' not found in metadata.")
 
@@ -243,6 +299,8 @@ class SqlAlchemyScanner(Scanner):
         repository: TableDescriptionRepository,
         scanner_service: AbstractScanner,
         schema: str | None = None,
+        table_embedding_service: TableEmbeddingService | None = None,
+        fingerprint: str | None = None,
     ) -> TableDescription:
         print(f"Scanning table: {table}")
         inspector = inspect(db_engine.engine)
@@ -250,18 +308,45 @@ class SqlAlchemyScanner(Scanner):
         columns = inspector.get_columns(table_name=table)
         columns = [column for column in columns if column["name"].find(".") < 0]
 
-        for column in columns:
+        def process_column(column: dict) -> ColumnDetail:
             print(f"Scanning column: {column['name']}")
-            table_columns.append(
-                self.get_processed_column(
-                    meta=meta,
-                    table=table,
-                    column=column,
-                    db_engine=db_engine,
-                    scanner_service=scanner_service,
-                )
+            return self.get_processed_column(
+                meta=meta,
+                table=table,
+                column=column,
+                db_engine=db_engine,
+                scanner_service=scanner_service,
+            )
+
+        column_categories = None
+        if COLUMN_PROFILING_MODE == "table":
+            column_categories = self.get_column_categories(
+                meta=meta,
+                table=table,
+                columns=columns,
+                db_engine=db_engine,
+                scanner_service=scanner_service,
             )
 
+        if column_categories is not None:
+            table_columns = [
+                ColumnDetail(
+                    name=column["name"],
+                    data_type=str(column["type"]),
+                    low_cardinality=bool(column_categories.get(column["name"])),
+                    categories=column_categories.get(column["name"]) or None,
+                )
+                for column in columns
+            ]
+        elif SCANNER_COLUMN_PARALLELISM > 1 and len(columns) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(SCANNER_COLUMN_PARALLELISM, len(columns))
+            ) as executor:
+                table_columns = list(executor.map(process_column, columns))
+        else:
+            for column in columns:
+                table_columns.append(process_column(column))
+
         object = TableDescription(
             db_connection_id=db_connection_id,
             table_name=table,
@@ -276,11 +361,61 @@ class SqlAlchemyScanner(Scanner):
             error_message="",
             status=TableDescriptionStatus.SCANNED.value,
             schema_name=schema,
+            fingerprint=fingerprint,
         )
 
         repository.save_table_info(object)
+        if table_embedding_service:
+            table_embedding_service.refresh([object])
         return object
 
+    def get_table_fingerprint(
+        self,
+        meta: MetaData,
+        table: str,
+        db_engine: SQLDatabase,
+        scanner_service: AbstractScanner,
+        schema: str | None = None,
+    ) -> str | None:
+        """Hashes the reflected columns and types of the table together with the row count
+        or last modification values exposed by the dialect"""
+        try:
+            columns = [
+                f"{column.name}:{column.type!r}"
+                for column in meta.tables[table].columns
+            ]
+        except Exception as e:
+            logger.warning(f"Unable to fingerprint table {table}: {e}")
+            return None
+        try:
+            change_metadata = scanner_service.get_table_change_metadata(
+                table, db_engine, schema
+            )
+        except Exception as e:
+            logger.warning(f"Unable to get the change metadata of table {table}: {e}")
+            change_metadata = None
+        return hashlib.sha256(
+            json.dumps(
+                {"columns": columns, "change_metadata": change_metadata}, default=str
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def get_table_embedding_service(
+        self, db_connection_id: str, repository: TableDescriptionRepository
+    ) -> TableEmbeddingService | None:
+        db_connection = DatabaseConnectionRepository(repository.storage).find_by_id(
+            db_connection_id
+        )
+        if not db_connection:
+            return None
+        try:
+            return TableEmbeddingService.from_database_connection(
+                repository.storage, db_connection
+            )
+        except Exception as e:
+            logger.warning(f"Table embeddings will not be stored: {e}")
+            return None
+
     @override
     def scan(
         self,
@@ -288,6 +423,7 @@ class SqlAlchemyScanner(Scanner):
         table_descriptions: list[TableDescription],
         repository: TableDescriptionRepository,
         query_history_repository: QueryHistoryRepository,
+        incremental: bool = False,
     ) -> None:
         services = {
             "snowflake": SnowflakeScanner,
@@ -301,11 +437,88 @@ class SqlAlchemyScanner(Scanner):
         if db_engine.engine.dialect.name in services.keys():
             scanner_service = services[db_engine.engine.dialect.name]()
 
-        inspect(db_engine.engine)
-        meta = MetaData(bind=db_engine.engine)
-        MetaData.reflect(meta, views=True)
+        # The fingerprints hash the columns, a cached reflection would miss an ALTER
+        meta = db_engine.get_metadata(
+            [table.table_name for table in table_descriptions], refresh=True
+        )
+
+        table_embedding_service = None
+        if table_descriptions:
+            table_embedding_service = self.get_table_embedding_service(
+                table_descriptions[0].db_connection_id, repository
+            )
+
+        total = len(table_descriptions)
+        scan_kwargs = {
+            "meta": meta,
+            "db_engine": db_engine,
+            "repository": repository,
+            "query_history_repository": query_history_repository,
+            "scanner_service": scanner_service,
+            "table_embedding_service": table_embedding_service,
+            "incremental": incremental,
+        }
+        if SCANNER_PARALLELISM <= 1:
+            for index, table in enumerate(table_descriptions):
+                status = self.scan_table_and_logs(table=table, **scan_kwargs)
+                logger.info(
+                    f"Scanned {index + 1}/{total} tables: {table.table_name} {status}"
+                )
+            return
+
+        with ThreadPoolExecutor(
+            max_workers=min(SCANNER_PARALLELISM, max(total, 1))
+        ) as executor:
+            futures = {
+                executor.submit(
+                    self.scan_table_and_logs, table=table, **scan_kwargs
+                ): table
+                for table in table_descriptions
+            }
+            for index, future in enumerate(as_completed(futures)):
+                logger.info(
+                    f"Scanned {index + 1}/{total} tables: {futures[future].table_name} {future.result()}"
+                )
 
-        for table in table_descriptions:
+    def scan_table_and_logs(
+        self,
+        meta: MetaData,
+        table: TableDescription,
+        *,
+        db_engine: SQLDatabase,
+        repository: TableDescriptionRepository,
+        query_history_repository: QueryHistoryRepository,
+        scanner_service: AbstractScanner,
+        table_embedding_service: TableEmbeddingService | None = None,
+        incremental: bool = False,
+    ) -> str:
+        """Scans a table and stores its query history, returns the status of the table.
+        In incremental mode a table already scanned is skipped if its fingerprint did not change
+        """
+        with self.get_scan_semaphore(str(table.db_connection_id)):
+            status = TableDescriptionStatus.SCANNED.value
+            fingerprint = self.get_table_fingerprint(
+                meta=meta,
+                table=table.table_name,
+                db_engine=db_engine,
+                scanner_service=scanner_service,
+                schema=table.schema_name,
+            )
+            if (
+                incremental
+                and fingerprint is not None
+                and table.fingerprint == fingerprint
+                and table.status == TableDescriptionStatus.SCANNED.value
+            ):
+                repository.save_table_info(
+                    TableDescription(
+                        db_connection_id=table.db_connection_id,
+                        table_name=table.table_name,
+                        status=status,
+                        schema_name=table.schema_name,
+                    )
+                )
+                return f"{status} (unchanged)"
             try:
                 self.scan_single_table(
                     meta=meta,
@@ -315,25 +528,28 @@ class SqlAlchemyScanner(Scanner):
                     repository=repository,
                     scanner_service=scanner_service,
                     schema=table.schema_name,
+                    table_embedding_service=table_embedding_service,
+                    fingerprint=fingerprint,
                 )
             except Exception as e:
+                status = TableDescriptionStatus.FAILED.value
                 repository.save_table_info(
                     TableDescription(
                         db_connection_id=table.db_connection_id,
-                        table_name=table,
-                        status=TableDescriptionStatus.FAILED.value,
+                        table_name=table.table_name,
+                        status=status,
                         error_message=f"{e}",
                         schema_name=table.schema_name,
                     )
                 )
             try:
-                logger.info(f"Get logs table: {table}")
+                logger.info(f"Get logs table: {table.table_name}")
                 query_history = scanner_service.get_logs(
                     table.table_name, db_engine, table.db_connection_id
                 )
                 if len(query_history) > 0:
                     for query in query_history:
                         query_history_repository.insert(query)
-
-            except Exception:  # noqa: S112
-                continue
+            except Exception as e:
+                logger.warning(f"Unable to get logs for table {table.table_name}: {e}")
+            return status
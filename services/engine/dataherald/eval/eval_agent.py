@@ -21,7 +21,7 @@ from langchain.tools.sql_database.tool import (
 )
 from overrides import override
 from pydantic import Field, confloat
-from sqlalchemy import MetaData, Table, select
+from sqlalchemy import select
 
 from dataherald.config import System
 from dataherald.eval import Evaluation, Evaluator
@@ -94,8 +94,7 @@ class EntityFinder(BaseSQLDatabaseTool, BaseTool):
             entity, column_name, table_name = input.split(", ")
             engine = self.db._engine
 
-            metadata = MetaData(bind=engine)
-            table = Table(table_name, metadata, autoload=True)
+            table = self.db.get_metadata([table_name]).tables[table_name]
             column = table.c[column_name]
 
             query = select(column.distinct()).select_from(table)
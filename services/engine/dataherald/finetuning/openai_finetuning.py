@@ -5,7 +5,6 @@ import time
 import uuid
 from typing import Any, List
 
-import numpy as np
 import tiktoken
 from langchain_openai import AzureOpenAIEmbeddings, OpenAIEmbeddings
 from openai import OpenAI
@@ -20,9 +19,14 @@ from dataherald.finetuning import FinetuningModel
 from dataherald.repositories.database_connections import DatabaseConnectionRepository
 from dataherald.repositories.finetunings import FinetuningsRepository
 from dataherald.repositories.golden_sqls import GoldenSQLRepository
+from dataherald.services.table_embeddings import (
+    TableEmbeddingService,
+    create_table_representation,
+)
 from dataherald.types import Finetuning, FineTuningStatus
 from dataherald.utils.agent_prompts import FINETUNING_SYSTEM_INFORMATION
 from dataherald.utils.models_context_window import OPENAI_FINETUNING_MODELS_WINDOW_SIZES
+from dataherald.utils.table_ranking import TableRanker
 
 FILE_PROCESSING_ATTEMPTS = 20
 EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL","text-embedding-3-large")
@@ -55,14 +59,12 @@ class OpenAIFineTuning(FinetuningModel):
                 openai_api_key=db_connection.decrypt_api_key(),
                 model=EMBEDDING_MODEL,
             )
+        self.table_embedding_service = TableEmbeddingService(storage, self.embedding)
         self.encoding = tiktoken.encoding_for_model(
             fine_tuning_model.base_llm.model_name
         )
         self.client = OpenAI(api_key=db_connection.decrypt_api_key())
 
-    def cosine_similarity(self, a: List[float], b: List[float]) -> float:
-        return round(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)), 4)
-
     @staticmethod
     def map_finetuning_status(status: str) -> str:
         mapped_statuses = {
@@ -136,57 +138,33 @@ class OpenAIFineTuning(FinetuningModel):
         return table_representation
 
     def create_table_representation(self, table: TableDescription) -> str:
-        col_rep = ""
-        for column in table.columns:
-            if column.description is not None:
-                col_rep += f"{column.name}: {column.description}, "
-            else:
-                col_rep += f"{column.name}, "
-        if table.description is not None:
-            table_rep = f"Table {table.table_name} contain columns: [{col_rep}], this tables has: {table.description}"
-        else:
-            table_rep = f"Table {table.table_name} contain columns: [{col_rep}]"
-        return table_rep
+        return create_table_representation(table)
 
     def sort_tables(
         self,
         tables: List[TableDescription],
-        table_embeddings: List[List[float]],
+        table_ranker: TableRanker,
         prompt: str,
     ) -> List[TableDescription]:
-        tables_with_similarity = []
         prompt_embedding = self.embedding.embed_query(prompt)
-        similarities = np.dot(table_embeddings, prompt_embedding) / (
-            np.linalg.norm(table_embeddings) * np.linalg.norm(prompt_embedding)
-        )
-        for i in range(len(tables)):
-            tables_with_similarity.append((tables[i], similarities[i]))
-        tables_with_similarity.sort(key=lambda x: x[1], reverse=True)
-        return [table[0] for table in tables_with_similarity]
+        indexes, _ = table_ranker.top_k(prompt_embedding, len(tables))
+        return [tables[index] for index in indexes]
 
     def format_dataset(
         self,
         db_scan: List[TableDescription],
-        table_embeddings: List[List[float]],
+        table_ranker: TableRanker,
         prompt: str,
         token_limit: int,
         correct_tables: [str] = None,  # type: ignore
     ) -> str:
         schema_of_database = ""
-        indexes_to_remove = []
-        for i in range(len(db_scan)):
-            table = db_scan[i]
+        for table in db_scan:
             if correct_tables and table.table_name in correct_tables:
                 schema_of_database += self.format_table(table)
-                indexes_to_remove.append(i)
-        new_db_scan = []
-        new_table_embeddings = []
-        for i in range(len(db_scan)):
-            if i not in indexes_to_remove:
-                new_db_scan.append(db_scan[i])
-                new_table_embeddings.append(table_embeddings[i])
-        db_scan = self.sort_tables(new_db_scan, new_table_embeddings, prompt)
-        for table in db_scan:
+        for table in self.sort_tables(db_scan, table_ranker, prompt):
+            if correct_tables and table.table_name in correct_tables:
+                continue
             next_table = self.format_table(table)
             if len(schema_of_database) + len(next_table) < token_limit:
                 schema_of_database = next_table + schema_of_database
@@ -217,10 +195,7 @@ class OpenAIFineTuning(FinetuningModel):
         model_repository = FinetuningsRepository(self.storage)
         model = model_repository.find_by_id(self.fine_tuning_model.id)
         results = []
-        table_representations = []
-        for table in db_scan:
-            table_representations.append(self.create_table_representation(table))
-        table_embeddings = self.embedding.embed_documents(table_representations)
+        table_ranker = self.table_embedding_service.get_ranker(db_scan)
         for index, golden_sql_id in enumerate(self.fine_tuning_model.golden_sqls):
             logger.info(
                 f"Processing golden sql {index + 1} of {len(self.fine_tuning_model.golden_sqls)}"
@@ -235,7 +210,7 @@ class OpenAIFineTuning(FinetuningModel):
                 correct_tables.append(table.split(".")[-1])
             database_schema = self.format_dataset(
                 db_scan=list(db_scan),
-                table_embeddings=table_embeddings,
+                table_ranker=table_ranker,
                 prompt=question,
                 token_limit=OPENAI_FINETUNING_MODELS_WINDOW_SIZES[
                     self.fine_tuning_model.base_llm.model_name
@@ -0,0 +1,42 @@
+import uuid
+from datetime import datetime
+
+DB_COLLECTION = "context_versions"
+
+
+class ContextVersionRepository:
+    """Keeps a version per db connection that changes every time its golden sqls,
+    instructions or table descriptions are written, so cached values built from them can
+    be invalidated"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def get(self, db_connection_id: str) -> str:
+        row = self.storage.find_one(
+            DB_COLLECTION, {"db_connection_id": str(db_connection_id)}
+        )
+        if not row:
+            return ""
+        return row["version"]
+
+    def get_updated_at(self, db_connection_id: str) -> datetime | None:
+        row = self.storage.find_one(
+            DB_COLLECTION, {"db_connection_id": str(db_connection_id)}
+        )
+        if not row:
+            return None
+        return row["updated_at"]
+
+    def bump(self, db_connection_id: str) -> str:
+        version = uuid.uuid4().hex
+        self.storage.update_or_create(
+            DB_COLLECTION,
+            {"db_connection_id": str(db_connection_id)},
+            {
+                "db_connection_id": str(db_connection_id),
+                "version": version,
+                "updated_at": datetime.now(),
+            },
+        )
+        return version
@@ -1,5 +1,6 @@
 from bson.objectid import ObjectId
 
+from dataherald.repositories.context_versions import ContextVersionRepository
 from dataherald.types import GoldenSQL
 
 DB_COLLECTION = "golden_sqls"
@@ -17,6 +18,7 @@ class GoldenSQLRepository:
         golden_sql_dict = golden_sql.dict(exclude={"id"})
         golden_sql_dict["db_connection_id"] = str(golden_sql.db_connection_id)
         golden_sql.id = str(self.storage.insert_one(DB_COLLECTION, golden_sql_dict))
+        ContextVersionRepository(self.storage).bump(golden_sql.db_connection_id)
         return golden_sql
 
     def find_one(self, query: dict) -> GoldenSQL | None:
@@ -36,6 +38,7 @@ class GoldenSQLRepository:
             {"_id": ObjectId(golden_sql.id)},
             golden_sql_dict,
         )
+        ContextVersionRepository(self.storage).bump(golden_sql.db_connection_id)
         return golden_sql
 
     def find_by_id(self, id: str) -> GoldenSQL | None:
@@ -46,6 +49,20 @@ class GoldenSQLRepository:
         row["db_connection_id"] = str(row["db_connection_id"])
         return GoldenSQL(**row)
 
+    def find_by_ids(self, ids: list[str]) -> list[GoldenSQL]:
+        """Golden SQLs that exist, in the order of the ids"""
+        if not ids:
+            return []
+        rows = self.storage.find(
+            DB_COLLECTION, {"_id": {"$in": [ObjectId(id) for id in ids]}}
+        )
+        golden_sqls = {}
+        for row in rows:
+            row["id"] = str(row["_id"])
+            row["db_connection_id"] = str(row["db_connection_id"])
+            golden_sqls[row["id"]] = GoldenSQL(**row)
+        return [golden_sqls[str(id)] for id in ids if str(id) in golden_sqls]
+
     def find_by(self, query: dict, page: int = 1, limit: int = 10) -> list[GoldenSQL]:
         rows = self.storage.find(DB_COLLECTION, query, page=page, limit=limit)
         golden_sqls = []
@@ -55,6 +72,9 @@ class GoldenSQLRepository:
             golden_sqls.append(GoldenSQL(**row))
         return golden_sqls
 
+    def count(self, query: dict) -> int:
+        return self.storage.count(DB_COLLECTION, query)
+
     def find_all(self, page: int = 0, limit: int = 0) -> list[GoldenSQL]:
         rows = self.storage.find_all(DB_COLLECTION, page=page, limit=limit)
         golden_sqls = []
@@ -65,4 +85,8 @@ class GoldenSQLRepository:
         return golden_sqls
 
     def delete_by_id(self, id: str) -> int:
-        return self.storage.delete_by_id(DB_COLLECTION, id)
+        golden_sql = self.find_by_id(id)
+        deleted_count = self.storage.delete_by_id(DB_COLLECTION, id)
+        if golden_sql:
+            ContextVersionRepository(self.storage).bump(golden_sql.db_connection_id)
+        return deleted_count
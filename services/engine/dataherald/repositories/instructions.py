@@ -1,5 +1,6 @@
 from bson.objectid import ObjectId
 
+from dataherald.repositories.context_versions import ContextVersionRepository
 from dataherald.types import Instruction
 
 DB_COLLECTION = "instructions"
@@ -13,6 +14,7 @@ class InstructionRepository:
         instruction_dict = instruction.dict(exclude={"id"})
         instruction_dict["db_connection_id"] = str(instruction.db_connection_id)
         instruction.id = str(self.storage.insert_one(DB_COLLECTION, instruction_dict))
+        ContextVersionRepository(self.storage).bump(instruction.db_connection_id)
 
         return instruction
 
@@ -33,6 +35,7 @@ class InstructionRepository:
             {"_id": ObjectId(instruction.id)},
             instruction_dict,
         )
+        ContextVersionRepository(self.storage).bump(instruction.db_connection_id)
         return instruction
 
     def find_by_id(self, id: str) -> Instruction | None:
@@ -62,4 +65,8 @@ class InstructionRepository:
         return result
 
     def delete_by_id(self, id: str) -> int:
-        return self.storage.delete_by_id(DB_COLLECTION, id)
+        instruction = self.find_by_id(id)
+        deleted_count = self.storage.delete_by_id(DB_COLLECTION, id)
+        if instruction:
+            ContextVersionRepository(self.storage).bump(instruction.db_connection_id)
+        return deleted_count
@@ -0,0 +1,24 @@
+import logging
+import sys
+
+import dataherald.config
+from dataherald.config import System
+from dataherald.db import DB
+from dataherald.db.indexes import ensure_indexes, get_missing_indexes
+
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    settings = dataherald.config.Settings()
+    system = System(settings)
+    system.start()
+    storage = system.instance(DB)
+    # With --check the missing indexes are only reported
+    if "--check" in sys.argv:
+        missing = get_missing_indexes(storage)
+        for collection, keys, _ in missing:
+            logger.warning(f"Missing index {keys} on {collection}")
+        sys.exit(1 if missing else 0)
+    for collection, keys, _ in ensure_indexes(storage):
+        logger.info(f"Created index {keys} on {collection}")
@@ -1,10 +1,10 @@
 import os
-from typing import List
+from typing import Iterator, List
 
 import fastapi
 from fastapi import BackgroundTasks, status
 from fastapi import FastAPI as _FastAPI
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.routing import APIRoute
 
 import dataherald
@@ -44,6 +44,7 @@ from dataherald.types import (
     TableDescriptionRequest,
     UpdateInstruction,
 )
+from dataherald.utils.result_stream import MEDIA_TYPES
 
 
 def use_route_names_as_operation_ids(app: _FastAPI) -> None:
@@ -231,6 +232,7 @@ class FastAPI(dataherald.server.Server):
             self.execute_sql_query,
             methods=["GET"],
             tags=["SQL Generation"],
+            response_model=None,
         )
 
         self.router.add_api_route(
@@ -368,6 +370,10 @@ class FastAPI(dataherald.server.Server):
             "/api/v1/heartbeat", self.heartbeat, methods=["GET"], tags=["System"]
         )
 
+        self.router.add_api_route(
+            "/api/v1/metrics", self.get_metrics, methods=["GET"], tags=["System"]
+        )
+
         self._app.include_router(self.router)
         use_route_names_as_operation_ids(self._app)
 
@@ -398,15 +404,17 @@ class FastAPI(dataherald.server.Server):
     def get_prompts(self, db_connection_id: str | None = None) -> list[PromptResponse]:
         return self._api.get_prompts(db_connection_id)
 
-    def create_sql_generation(
+    async def create_sql_generation(
         self, prompt_id: str, sql_generation_request: SQLGenerationRequest
     ) -> SQLGenerationResponse:
-        return self._api.create_sql_generation(prompt_id, sql_generation_request)
+        return await self._api.create_sql_generation(prompt_id, sql_generation_request)
 
-    def create_prompt_and_sql_generation(
+    async def create_prompt_and_sql_generation(
         self, prompt_sql_generation_request: PromptSQLGenerationRequest
     ) -> SQLGenerationResponse:
-        return self._api.create_prompt_and_sql_generation(prompt_sql_generation_request)
+        return await self._api.create_prompt_and_sql_generation(
+            prompt_sql_generation_request
+        )
 
     def get_sql_generations(
         self, prompt_id: str | None = None
@@ -428,19 +436,19 @@ class FastAPI(dataherald.server.Server):
     ) -> NLGenerationResponse:
         return self._api.create_nl_generation(sql_generation_id, nl_generation_request)
 
-    def create_sql_and_nl_generation(
+    async def create_sql_and_nl_generation(
         self,
         prompt_id: str,
         nl_generation_sql_generation_request: NLGenerationsSQLGenerationRequest,
     ) -> NLGenerationResponse:
-        return self._api.create_sql_and_nl_generation(
+        return await self._api.create_sql_and_nl_generation(
             prompt_id, nl_generation_sql_generation_request
         )
 
-    def create_prompt_sql_and_nl_generation(
+    async def create_prompt_sql_and_nl_generation(
         self, request: PromptSQLGenerationNLGenerationRequest
     ) -> NLGenerationResponse:
-        return self._api.create_prompt_sql_and_nl_generation(request)
+        return await self._api.create_prompt_sql_and_nl_generation(request)
 
     def get_nl_generations(
         self, sql_generation_id: str | None = None
@@ -461,6 +469,9 @@ class FastAPI(dataherald.server.Server):
     def heartbeat(self) -> dict[str, int]:
         return self.root()
 
+    def get_metrics(self) -> dict:
+        return self._api.get_metrics()
+
     def create_database_connection(
         self, database_connection_request: DatabaseConnectionRequest
     ) -> DatabaseConnectionResponse:
@@ -507,18 +518,62 @@ class FastAPI(dataherald.server.Server):
         """Get description"""
         return self._api.get_query_history(db_connection_id)
 
-    def execute_sql_query(self, sql_generation_id: str, max_rows: int = 100) -> list:
-        """Executes a query on the given db_connection_id"""
-        return self._api.execute_sql_query(sql_generation_id, max_rows)
-
-    def export_csv_file(self, sql_generation_id: str) -> StreamingResponse:
-        """Exports a CSV file for the given sql_generation_id"""
-        stream = self._api.export_csv_file(sql_generation_id)
-
-        response = StreamingResponse(iter([stream.getvalue()]), media_type="text/csv")
-        response.headers["Content-Disposition"] = (
-            f"attachment; filename=sql_generation_{sql_generation_id}.csv"
+    def execute_sql_query(
+        self,
+        sql_generation_id: str,
+        response: fastapi.Response,
+        max_rows: int = 100,
+        result_format: str = fastapi.Query("json", alias="format"),
+    ) -> list | StreamingResponse:
+        """Executes a query on the given db_connection_id, the rows are returned as a
+        JSON list or streamed as csv, jsonl, arrow or parquet. The X-Result-Truncated
+        header of the JSON list tells if the engine limits left rows out"""
+        if result_format == "json":
+            rows, truncated = self._api.execute_sql_query(sql_generation_id, max_rows)
+            response.headers["X-Result-Truncated"] = str(truncated).lower()
+            return rows
+        return self.stream_results(sql_generation_id, result_format, max_rows)
+
+    def export_csv_file(
+        self,
+        sql_generation_id: str,
+        compress: bool = False,
+        result_format: str = fastapi.Query("csv", alias="format"),
+    ) -> StreamingResponse:
+        """Exports a CSV file for the given sql_generation_id, or a jsonl, arrow or
+        parquet file. It is gzip compressed when compress is set"""
+        if result_format == "csv":
+            stream = self._api.export_csv_file(sql_generation_id, compress)
+        else:
+            stream = self._api.export_sql_results(
+                sql_generation_id, result_format, compress=compress
+            )
+        return self.get_file_response(
+            stream, sql_generation_id, result_format, compress
+        )
+
+    def stream_results(
+        self, sql_generation_id: str, result_format: str, max_rows: int
+    ) -> StreamingResponse:
+        stream = self._api.export_sql_results(
+            sql_generation_id, result_format, max_rows
         )
+        return StreamingResponse(stream, media_type=MEDIA_TYPES[result_format])
+
+    def get_file_response(
+        self,
+        stream: Iterator[bytes],
+        sql_generation_id: str,
+        result_format: str,
+        compress: bool,
+    ) -> StreamingResponse:
+        filename = f"sql_generation_{sql_generation_id}.{result_format}"
+        if compress:
+            response = StreamingResponse(stream, media_type="application/gzip")
+            filename = f"{filename}.gz"
+        else:
+            response = StreamingResponse(stream, media_type=MEDIA_TYPES[result_format])
+        response.headers["Content-Disposition"] = f"attachment; filename={filename}"
         return response
 
     def delete_golden_sql(self, golden_sql_id: str) -> dict:
@@ -605,8 +660,5 @@ class FastAPI(dataherald.server.Server):
 
     async def stream_sql_generation(
         self, request: StreamPromptSQLGenerationRequest
-    ) -> StreamingResponse:
-        return StreamingResponse(
-            self._api.stream_create_prompt_and_sql_generation(request),
-            media_type="text/event-stream",
-        )
+    ) -> Response:
+        return await self._api.stream_create_prompt_and_sql_generation(request)
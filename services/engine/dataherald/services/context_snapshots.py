@@ -0,0 +1,95 @@
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Tuple
+
+from pydantic import BaseModel
+
+from dataherald.db_scanner.models.types import TableDescription, TableDescriptionStatus
+from dataherald.db_scanner.repository.base import TableDescriptionRepository
+from dataherald.repositories.context_versions import ContextVersionRepository
+from dataherald.repositories.golden_sqls import GoldenSQLRepository
+from dataherald.repositories.instructions import InstructionRepository
+from dataherald.services.table_embeddings import (
+    create_table_representation,
+    get_content_hash,
+)
+from dataherald.utils import metrics
+
+# Number of db connections whose context is kept in memory, 0 disables the snapshots
+CONTEXT_SNAPSHOT_MAX_COUNT = int(os.environ.get("CONTEXT_SNAPSHOT_MAX_COUNT", "256"))
+
+
+class ContextSnapshot(BaseModel):
+    """Context of a db connection read at a given context version. The models are shared
+    by every generation that uses the snapshot and must not be modified"""
+
+    db_connection_id: str
+    version: str
+    tables: List[TableDescription]
+    instructions: List[dict]
+    golden_sql_count: int
+    # Representation and content hash of each table by table description id
+    table_representations: Dict[str, Tuple[str, str]]
+
+
+class ContextSnapshots:
+    """Snapshots of the context of each db connection. Every read checks the context
+    version, which the golden sql, instruction and table description repositories bump
+    on each write, and builds the snapshot again when it changed"""
+
+    snapshots = OrderedDict()
+    lock = Lock()
+
+    @staticmethod
+    def get(storage, db_connection_id: str) -> ContextSnapshot:
+        db_connection_id = str(db_connection_id)
+        # Read before the context so a concurrent write makes the next read reload it
+        version = ContextVersionRepository(storage).get(db_connection_id)
+        with ContextSnapshots.lock:
+            snapshot = ContextSnapshots.snapshots.get(db_connection_id)
+            if snapshot is not None:
+                ContextSnapshots.snapshots.move_to_end(db_connection_id)
+        if snapshot is not None and snapshot.version == version:
+            metrics.increment("context_snapshots.hits")
+            return snapshot
+        metrics.increment("context_snapshots.misses")
+        snapshot = ContextSnapshots.load(storage, db_connection_id, version)
+        if CONTEXT_SNAPSHOT_MAX_COUNT > 0:
+            with ContextSnapshots.lock:
+                ContextSnapshots.snapshots[db_connection_id] = snapshot
+                ContextSnapshots.snapshots.move_to_end(db_connection_id)
+                while len(ContextSnapshots.snapshots) > CONTEXT_SNAPSHOT_MAX_COUNT:
+                    ContextSnapshots.snapshots.popitem(last=False)
+        return snapshot
+
+    @staticmethod
+    def load(storage, db_connection_id: str, version: str) -> ContextSnapshot:
+        tables = TableDescriptionRepository(storage).get_all_tables_by_db(
+            {
+                "db_connection_id": db_connection_id,
+                "status": TableDescriptionStatus.SCANNED.value,
+            }
+        )
+        instructions = InstructionRepository(storage).find_by(
+            {"db_connection_id": db_connection_id}, page=0, limit=0
+        )
+        table_representations = {}
+        for table in tables:
+            representation = create_table_representation(table)
+            table_representations[table.id] = (
+                representation,
+                get_content_hash(representation),
+            )
+        return ContextSnapshot.construct(
+            db_connection_id=db_connection_id,
+            version=version,
+            tables=tables,
+            instructions=[
+                {"instruction": instruction.instruction} for instruction in instructions
+            ],
+            golden_sql_count=GoldenSQLRepository(storage).count(
+                {"db_connection_id": db_connection_id}
+            ),
+            table_representations=table_representations,
+        )
@@ -1,13 +1,16 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from datetime import datetime
 from queue import Queue
-
-import pandas as pd
+from typing import Iterator
 
 from dataherald.api.types.requests import SQLGenerationRequest
 from dataherald.config import System
 from dataherald.eval import Evaluator
+from dataherald.repositories.context_versions import ContextVersionRepository
 from dataherald.repositories.database_connections import (
     DatabaseConnectionRepository,
 )
@@ -16,13 +19,48 @@ from dataherald.repositories.sql_generations import (
     SQLGenerationNotFoundError,
     SQLGenerationRepository,
 )
+from dataherald.smart_cache import SmartCache
+from dataherald.smart_cache.semantic import SemanticCache
+from dataherald.sql_database.arrow import fetch_arrow_batches
 from dataherald.sql_database.base import SQLDatabase
+from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.sql_generator import SQLGenerator
 from dataherald.sql_generator.create_sql_query_status import create_sql_query_status
 from dataherald.sql_generator.dataherald_finetuning_agent import (
     DataheraldFinetuningAgent,
 )
 from dataherald.sql_generator.dataherald_sqlagent import DataheraldSQLAgent
-from dataherald.types import LLMConfig, SQLGeneration
+from dataherald.types import LLMConfig, Prompt, SQLGeneration
+from dataherald.utils import metrics
+from dataherald.utils.result_stream import (
+    compress_chunks,
+    encode_arrow,
+    encode_csv,
+    encode_jsonl,
+    encode_parquet,
+    limit_batches,
+)
+from dataherald.utils.scheduler import (
+    GenerationQueueFullError,
+    GenerationScheduler,
+    get_tenant_id,
+)
+from dataherald.utils.strings import remove_whitespace
+
+SMART_CACHE_ENABLED = os.environ.get("SMART_CACHE_ENABLED", "False").lower() in (
+    "true",
+    "1",
+)
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "False").lower() in (
+    "true",
+    "1",
+)
+SEMANTIC_CACHE_REVALIDATE = os.environ.get(
+    "SEMANTIC_CACHE_REVALIDATE", "True"
+).lower() in ("true", "1")
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+
+logger = logging.getLogger(__name__)
 
 
 class SQLGenerationError(Exception):
@@ -43,14 +81,71 @@ class SQLGenerationService:
         sql_generation.error = error
         return self.sql_generation_repository.update(sql_generation)
 
-    def generate_response_with_timeout(
-        self, sql_generator, user_prompt, db_connection, metadata=None
-    ):
-        return sql_generator.generate_response(
-            user_prompt=user_prompt,
-            database_connection=db_connection,
-            metadata=metadata,
+    def get_cache_key(
+        self, prompt: Prompt, sql_generation_request: SQLGenerationRequest
+    ) -> str:
+        """The key changes whenever the golden sqls, instructions or table descriptions
+        of the db connection change, so stale generations are never returned"""
+        llm_config = (
+            sql_generation_request.llm_config
+            if sql_generation_request.llm_config
+            else LLMConfig()
         )
+        key = {
+            "prompt": remove_whitespace(prompt.text.lower()),
+            "db_connection_id": str(prompt.db_connection_id),
+            "schemas": sorted(prompt.schemas or []),
+            "llm_config": llm_config.dict(),
+            "finetuning_id": sql_generation_request.finetuning_id or "",
+            "low_latency_mode": sql_generation_request.low_latency_mode,
+            "context_version": ContextVersionRepository(self.storage).get(
+                prompt.db_connection_id
+            ),
+        }
+        return hashlib.sha256(
+            json.dumps(key, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def lookup_cache(
+        self,
+        prompt: Prompt,
+        sql_generation_request: SQLGenerationRequest,
+        db_connection,
+        cache_key: str | None,
+    ) -> tuple[SQLGeneration, dict] | None:
+        """Returns a stored generation for the prompt and the cache details recorded in the
+        metadata, trying an exact match first and then a paraphrase of an earlier prompt
+        """
+        if cache_key is not None:
+            sql_generation = self.system.instance(SmartCache).lookup(cache_key)
+            if sql_generation is not None:
+                metrics.increment("sql_generation_cache.exact_hits")
+                return sql_generation, {"type": "exact"}
+        if SEMANTIC_CACHE_ENABLED:
+            result = SemanticCache(self.system, self.storage).lookup(
+                prompt, sql_generation_request
+            )
+            if result is not None:
+                sql_generation, similarity = result
+                logger.info(
+                    f"Semantic cache hit for prompt {prompt.id} with similarity {similarity:.4f}"
+                )
+                if SEMANTIC_CACHE_REVALIDATE:
+                    sql_generation = create_sql_query_status(
+                        db=SQLDatabase.get_sql_engine(db_connection, True),
+                        query=sql_generation.sql,
+                        sql_generation=sql_generation,
+                    )
+                if sql_generation.status == "VALID":
+                    metrics.increment("sql_generation_cache.semantic_hits")
+                    return sql_generation, {
+                        "type": "semantic",
+                        "sql_generation_id": sql_generation.id,
+                        "similarity": similarity,
+                    }
+                metrics.increment("sql_generation_cache.semantic_invalid")
+        metrics.increment("sql_generation_cache.misses")
+        return None
 
     def update_the_initial_sql_generation(
         self, initial_sql_generation: SQLGeneration, sql_generation: SQLGeneration
@@ -63,9 +158,9 @@ class SQLGenerationService:
         initial_sql_generation.intermediate_steps = sql_generation.intermediate_steps
         return self.sql_generation_repository.update(initial_sql_generation)
 
-    def create(  # noqa: PLR0912
+    def insert_initial_sql_generation(
         self, prompt_id: str, sql_generation_request: SQLGenerationRequest
-    ) -> SQLGeneration:  # noqa: PLR0912
+    ) -> tuple[SQLGeneration, Prompt, DatabaseConnection]:
         initial_sql_generation = SQLGeneration(
             prompt_id=prompt_id,
             created_at=datetime.now(),
@@ -76,11 +171,6 @@ class SQLGenerationService:
             ),
             metadata=sql_generation_request.metadata,
         )
-        langsmith_metadata = (
-            sql_generation_request.metadata.get("lang_smith", {})
-            if sql_generation_request.metadata
-            else {}
-        )
         self.sql_generation_repository.insert(initial_sql_generation)
         prompt_repository = PromptRepository(self.storage)
         prompt = prompt_repository.find_by_id(prompt_id)
@@ -91,81 +181,119 @@ class SQLGenerationService:
             )
         db_connection_repository = DatabaseConnectionRepository(self.storage)
         db_connection = db_connection_repository.find_by_id(prompt.db_connection_id)
-        database = SQLDatabase.get_sql_engine(db_connection, True)
+        return initial_sql_generation, prompt, db_connection
+
+    def get_cached_sql_generation(
+        self,
+        prompt: Prompt,
+        sql_generation_request: SQLGenerationRequest,
+        db_connection: DatabaseConnection,
+    ) -> tuple[str | None, tuple[SQLGeneration, dict] | None]:
+        cache_key = None
+        cached = None
         if sql_generation_request.sql is not None:
-            sql_generation = SQLGeneration(
-                prompt_id=prompt_id,
-                sql=sql_generation_request.sql,
-                tokens_used=0,
-            )
+            return cache_key, cached
+        if SMART_CACHE_ENABLED:
+            cache_key = self.get_cache_key(prompt, sql_generation_request)
+        if SMART_CACHE_ENABLED or SEMANTIC_CACHE_ENABLED:
             try:
-                sql_generation = create_sql_query_status(
-                    db=database, query=sql_generation.sql, sql_generation=sql_generation
+                cached = self.lookup_cache(
+                    prompt, sql_generation_request, db_connection, cache_key
                 )
             except Exception as e:
-                self.update_error(initial_sql_generation, str(e))
-                raise SQLGenerationError(str(e), initial_sql_generation.id) from e
-        else:
-            if (
-                sql_generation_request.finetuning_id is None
-                or sql_generation_request.finetuning_id == ""
-            ):
-                if sql_generation_request.low_latency_mode:
-                    raise SQLGenerationError(
-                        "Low latency mode is not supported for our old agent with no finetuning. Please specify a finetuning id.",
-                        initial_sql_generation.id,
-                    )
-                sql_generator = DataheraldSQLAgent(
-                    self.system,
-                    (
-                        sql_generation_request.llm_config
-                        if sql_generation_request.llm_config
-                        else LLMConfig()
-                    ),
-                )
-            else:
-                sql_generator = DataheraldFinetuningAgent(
-                    self.system,
-                    (
-                        sql_generation_request.llm_config
-                        if sql_generation_request.llm_config
-                        else LLMConfig()
-                    ),
-                )
-                sql_generator.finetuning_id = sql_generation_request.finetuning_id
-                sql_generator.use_fintuned_model_only = (
-                    sql_generation_request.low_latency_mode
-                )
-                initial_sql_generation.finetuning_id = (
-                    sql_generation_request.finetuning_id
-                )
-                initial_sql_generation.low_latency_mode = (
-                    sql_generation_request.low_latency_mode
+                logger.warning(f"Unable to look up the SQL generation cache: {e}")
+        return cache_key, cached
+
+    def validate_sql(
+        self,
+        initial_sql_generation: SQLGeneration,
+        sql_generation_request: SQLGenerationRequest,
+        db_connection: DatabaseConnection,
+    ) -> SQLGeneration:
+        database = SQLDatabase.get_sql_engine(db_connection, True)
+        sql_generation = SQLGeneration(
+            prompt_id=initial_sql_generation.prompt_id,
+            sql=sql_generation_request.sql,
+            tokens_used=0,
+        )
+        try:
+            return create_sql_query_status(
+                db=database, query=sql_generation.sql, sql_generation=sql_generation
+            )
+        except Exception as e:
+            self.update_error(initial_sql_generation, str(e))
+            raise SQLGenerationError(str(e), initial_sql_generation.id) from e
+
+    def use_cached_sql_generation(
+        self,
+        initial_sql_generation: SQLGeneration,
+        sql_generation_request: SQLGenerationRequest,
+        cached: tuple[SQLGeneration, dict],
+    ) -> SQLGeneration:
+        sql_generation = cached[0].copy()
+        sql_generation.tokens_used = 0
+        initial_sql_generation.metadata = {
+            **(initial_sql_generation.metadata or {}),
+            "cache": cached[1],
+        }
+        if sql_generation_request.finetuning_id:
+            initial_sql_generation.finetuning_id = sql_generation_request.finetuning_id
+            initial_sql_generation.low_latency_mode = (
+                sql_generation_request.low_latency_mode
+            )
+        return sql_generation
+
+    def create_sql_generator(
+        self,
+        initial_sql_generation: SQLGeneration,
+        sql_generation_request: SQLGenerationRequest,
+    ) -> SQLGenerator:
+        if (
+            sql_generation_request.finetuning_id is None
+            or sql_generation_request.finetuning_id == ""
+        ):
+            if sql_generation_request.low_latency_mode:
+                raise SQLGenerationError(
+                    "Low latency mode is not supported for our old agent with no finetuning. Please specify a finetuning id.",
+                    initial_sql_generation.id,
                 )
-            try:
-                with ThreadPoolExecutor(max_workers=1) as executor:
-                    future = executor.submit(
-                        self.generate_response_with_timeout,
-                        sql_generator,
-                        prompt,
-                        db_connection,
-                        metadata=langsmith_metadata,
-                    )
-                    try:
-                        sql_generation = future.result(
-                            timeout=int(os.environ.get("DH_ENGINE_TIMEOUT", 150))
-                        )
-                    except TimeoutError as e:
-                        self.update_error(
-                            initial_sql_generation, "SQL generation request timed out"
-                        )
-                        raise SQLGenerationError(
-                            "SQL generation request timed out",
-                            initial_sql_generation.id,
-                        ) from e
-            except Exception as e:
-                self.update_error(initial_sql_generation, str(e))
-                raise SQLGenerationError(str(e), initial_sql_generation.id) from e
+            return DataheraldSQLAgent(
+                self.system,
+                (
+                    sql_generation_request.llm_config
+                    if sql_generation_request.llm_config
+                    else LLMConfig()
+                ),
+            )
+        sql_generator = DataheraldFinetuningAgent(
+            self.system,
+            (
+                sql_generation_request.llm_config
+                if sql_generation_request.llm_config
+                else LLMConfig()
+            ),
+        )
+        sql_generator.finetuning_id = sql_generation_request.finetuning_id
+        sql_generator.use_fintuned_model_only = sql_generation_request.low_latency_mode
+        initial_sql_generation.finetuning_id = sql_generation_request.finetuning_id
+        initial_sql_generation.low_latency_mode = (
+            sql_generation_request.low_latency_mode
+        )
+        return sql_generator
+
+    def complete_sql_generation(
+        self,
+        initial_sql_generation: SQLGeneration,
+        sql_generation: SQLGeneration,
+        prompt: Prompt,
+        sql_generation_request: SQLGenerationRequest,
+        *,
+        db_connection: DatabaseConnection,
+        generated: bool,
+        cache_key: str | None,
+    ) -> SQLGeneration:
+        if generated and cache_key is not None and sql_generation.status == "VALID":
+            self.system.instance(SmartCache).add(cache_key, sql_generation)
         if sql_generation_request.evaluate:
             evaluator = self.system.instance(Evaluator)
             evaluator.llm_config = (
@@ -180,9 +308,114 @@ class SQLGenerationService:
             )
             initial_sql_generation.evaluate = sql_generation_request.evaluate
             initial_sql_generation.confidence_score = confidence_score
-        return self.update_the_initial_sql_generation(
+        initial_sql_generation = self.update_the_initial_sql_generation(
             initial_sql_generation, sql_generation
         )
+        if (
+            SEMANTIC_CACHE_ENABLED
+            and generated
+            and initial_sql_generation.status == "VALID"
+        ):
+            SemanticCache(self.system, self.storage).add(prompt, initial_sql_generation)
+        return initial_sql_generation
+
+    async def acreate(
+        self, prompt_id: str, sql_generation_request: SQLGenerationRequest
+    ) -> SQLGeneration:
+        """Generates the SQL of a prompt, the agent runs on the event loop and only the
+        database and storage calls are sent to worker threads. Generations that are not
+        served from the cache go through the GenerationScheduler admission control"""
+        langsmith_metadata = (
+            sql_generation_request.metadata.get("lang_smith", {})
+            if sql_generation_request.metadata
+            else {}
+        )
+        initial_sql_generation, prompt, db_connection = await asyncio.to_thread(
+            self.insert_initial_sql_generation, prompt_id, sql_generation_request
+        )
+        cache_key, cached = await asyncio.to_thread(
+            self.get_cached_sql_generation,
+            prompt,
+            sql_generation_request,
+            db_connection,
+        )
+        generated = False
+        if cached is not None:
+            sql_generation = self.use_cached_sql_generation(
+                initial_sql_generation, sql_generation_request, cached
+            )
+        else:
+            try:
+                admission = GenerationScheduler.get().admit(
+                    prompt.db_connection_id,
+                    get_tenant_id(sql_generation_request.metadata),
+                )
+                async with admission:
+                    if sql_generation_request.sql is not None:
+                        sql_generation = await asyncio.to_thread(
+                            self.validate_sql,
+                            initial_sql_generation,
+                            sql_generation_request,
+                            db_connection,
+                        )
+                    else:
+                        sql_generation = await self.agenerate(
+                            initial_sql_generation,
+                            prompt,
+                            db_connection,
+                            sql_generation_request,
+                            langsmith_metadata,
+                        )
+                        generated = True
+            except GenerationQueueFullError as e:
+                await asyncio.to_thread(
+                    self.update_error, initial_sql_generation, str(e)
+                )
+                raise
+        return await asyncio.to_thread(
+            self.complete_sql_generation,
+            initial_sql_generation,
+            sql_generation,
+            prompt,
+            sql_generation_request,
+            db_connection=db_connection,
+            generated=generated,
+            cache_key=cache_key,
+        )
+
+    async def agenerate(
+        self,
+        initial_sql_generation: SQLGeneration,
+        prompt: Prompt,
+        db_connection: DatabaseConnection,
+        sql_generation_request: SQLGenerationRequest,
+        langsmith_metadata: dict,
+    ) -> SQLGeneration:
+        sql_generator = self.create_sql_generator(
+            initial_sql_generation, sql_generation_request
+        )
+        try:
+            # Cancels the agent, and its pending LLM calls, once the timeout is reached
+            return await asyncio.wait_for(
+                sql_generator.agenerate_response(
+                    user_prompt=prompt,
+                    database_connection=db_connection,
+                    metadata=langsmith_metadata,
+                ),
+                timeout=int(os.environ.get("DH_ENGINE_TIMEOUT", "150")),
+            )
+        except asyncio.TimeoutError as e:
+            await asyncio.to_thread(
+                self.update_error,
+                initial_sql_generation,
+                "SQL generation request timed out",
+            )
+            raise SQLGenerationError(
+                "SQL generation request timed out", initial_sql_generation.id
+            ) from e
+        except Exception as e:
+            await asyncio.to_thread(self.update_error, initial_sql_generation, str(e))
+            raise SQLGenerationError(str(e), initial_sql_generation.id) from e
 
     def start_streaming(
         self, prompt_id: str, sql_generation_request: SQLGenerationRequest, queue: Queue
@@ -212,40 +445,9 @@ class SQLGenerationService:
             )
         db_connection_repository = DatabaseConnectionRepository(self.storage)
         db_connection = db_connection_repository.find_by_id(prompt.db_connection_id)
-        if (
-            sql_generation_request.finetuning_id is None
-            or sql_generation_request.finetuning_id == ""
-        ):
-            if sql_generation_request.low_latency_mode:
-                raise SQLGenerationError(
-                    "Low latency mode is not supported for our old agent with no finetuning. Please specify a finetuning id.",
-                    initial_sql_generation.id,
-                )
-            sql_generator = DataheraldSQLAgent(
-                self.system,
-                (
-                    sql_generation_request.llm_config
-                    if sql_generation_request.llm_config
-                    else LLMConfig()
-                ),
-            )
-        else:
-            sql_generator = DataheraldFinetuningAgent(
-                self.system,
-                (
-                    sql_generation_request.llm_config
-                    if sql_generation_request.llm_config
-                    else LLMConfig()
-                ),
-            )
-            sql_generator.finetuning_id = sql_generation_request.finetuning_id
-            sql_generator.use_fintuned_model_only = (
-                sql_generation_request.low_latency_mode
-            )
-            initial_sql_generation.finetuning_id = sql_generation_request.finetuning_id
-            initial_sql_generation.low_latency_mode = (
-                sql_generation_request.low_latency_mode
-            )
+        sql_generator = self.create_sql_generator(
+            initial_sql_generation, sql_generation_request
+        )
         try:
             sql_generator.stream_response(
                 user_prompt=prompt,
@@ -283,21 +485,39 @@ class SQLGenerationService:
         sql_generation.metadata = metadata_request.metadata
         return self.sql_generation_repository.update(sql_generation)
 
-    def create_dataframe(self, sql_generation_id):
+    def export(
+        self,
+        sql_generation_id: str,
+        result_format: str = "csv",
+        max_rows: int | None = None,
+        compress: bool = False,
+    ) -> Iterator[bytes]:
+        """Runs the SQL of the generation and returns its rows encoded in chunks as csv,
+        jsonl, arrow or parquet. The query is executed before returning so its errors
+        are raised here"""
         sql_generation = self.sql_generation_repository.find_by_id(sql_generation_id)
         if not sql_generation:
             raise SQLGenerationNotFoundError(
                 f"Sql generation {sql_generation_id} not found"
             )
+        if not sql_generation.sql:
+            raise EmptySQLGenerationError(
+                f"Sql generation {sql_generation_id} is empty"
+            )
         prompt_repository = PromptRepository(self.storage)
         prompt = prompt_repository.find_by_id(sql_generation.prompt_id)
         db_connection_repository = DatabaseConnectionRepository(self.storage)
         db_connection = db_connection_repository.find_by_id(prompt.db_connection_id)
         database = SQLDatabase.get_sql_engine(db_connection)
-        results = database.run_sql(sql_generation.sql)
-        if results is None:
-            raise EmptySQLGenerationError(
-                f"Sql generation {sql_generation_id} is empty"
+        if result_format in ["arrow", "parquet"]:
+            columns, batches = fetch_arrow_batches(
+                database, sql_generation.sql, EXPORT_BATCH_SIZE
             )
-        data = results[1]["result"]
-        return pd.DataFrame(data)
+            encode = encode_arrow if result_format == "arrow" else encode_parquet
+            chunks = encode(columns, limit_batches(batches, max_rows))
+            return compress_chunks(chunks) if compress else chunks
+        columns, batches = database.stream_sql(
+            sql_generation.sql, batch_size=EXPORT_BATCH_SIZE
+        )
+        encode = encode_jsonl if result_format == "jsonl" else encode_csv
+        return encode(columns, limit_batches(batches, max_rows), compress)
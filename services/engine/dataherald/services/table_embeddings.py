@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from dataherald.config import Settings
+from dataherald.db_scanner.models.types import TableDescription, TableEmbedding
+from dataherald.db_scanner.repository.table_embedding import TableEmbeddingRepository
+from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.utils.embeddings import EmbeddingClients
+from dataherald.utils.table_ranking import TableRanker
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-large")
+# Number of table rankers kept in memory, 0 disables the cache
+TABLE_RANKER_MAX_COUNT = int(os.environ.get("TABLE_RANKER_MAX_COUNT", "256"))
+
+logger = logging.getLogger(__name__)
+
+
+def create_table_representation(table: TableDescription) -> str:
+    """Use the concatenation of table name, columns names, and the description of the table as the table representation"""
+    col_rep = ""
+    for column in table.columns:
+        if column.description is not None:
+            col_rep += f"{column.name}: {column.description}, "
+        else:
+            col_rep += f"{column.name}, "
+    if table.description is not None:
+        return f"Table {table.table_name} contain columns: [{col_rep}], this tables has: {table.description}"
+    return f"Table {table.table_name} contain columns: [{col_rep}]"
+
+
+def get_content_hash(table_representation: str) -> str:
+    return hashlib.sha256(table_representation.encode("utf-8")).hexdigest()
+
+
+class TableEmbeddingService:
+    # Fingerprint of the tables and ranker by db connection, schemas and model
+    _rankers = OrderedDict()
+    _rankers_lock = Lock()
+
+    def __init__(
+        self,
+        storage,
+        embedding: Embeddings,
+        embedding_model: str = None,
+        table_representations: Dict[str, Tuple[str, str]] | None = None,
+    ):
+        self.repository = TableEmbeddingRepository(storage)
+        self.embedding = embedding
+        self.embedding_model = embedding_model or getattr(
+            embedding, "model", EMBEDDING_MODEL
+        )
+        # Precomputed representation and content hash by table description id
+        self.table_representations = table_representations or {}
+
+    @classmethod
+    def from_database_connection(
+        cls, storage, database_connection: DatabaseConnection
+    ) -> "TableEmbeddingService":
+        embedding = EmbeddingClients.get(
+            database_connection.decrypt_api_key(),
+            EMBEDDING_MODEL,
+            azure=Settings().azure_api_key is not None,
+        )
+        return cls(storage, embedding)
+
+    def get_embeddings(self, tables: List[TableDescription]) -> List[List[float]]:
+        """Returns one embedding per table, only calling the embedding model for tables
+        whose representation is not stored yet or has changed since it was embedded"""
+        if not tables:
+            return []
+        representations, content_hashes = self.get_representations(tables)
+        return self._get_embeddings(tables, representations, content_hashes)
+
+    def get_representations(
+        self, tables: List[TableDescription]
+    ) -> Tuple[List[str], List[str]]:
+        representations, content_hashes = [], []
+        for table in tables:
+            if table.id in self.table_representations:
+                representation, content_hash = self.table_representations[table.id]
+            else:
+                representation = create_table_representation(table)
+                content_hash = get_content_hash(representation)
+            representations.append(representation)
+            content_hashes.append(content_hash)
+        return representations, content_hashes
+
+    def get_ranker(self, tables: List[TableDescription]) -> TableRanker:
+        """Returns a ranker over the given tables, reusing the normalized matrix built for
+        the same connection as long as none of the tables has changed"""
+        representations, content_hashes = self.get_representations(tables)
+        fingerprint = get_content_hash(
+            "\n".join(
+                f"{table.id}:{content_hash}"
+                for table, content_hash in zip(tables, content_hashes, strict=True)
+            )
+        )
+        key = (
+            ",".join(sorted({str(table.db_connection_id) for table in tables})),
+            ",".join(sorted({str(table.schema_name) for table in tables})),
+            self.embedding_model,
+        )
+        with TableEmbeddingService._rankers_lock:
+            cached = TableEmbeddingService._rankers.get(key)
+            if cached is not None:
+                TableEmbeddingService._rankers.move_to_end(key)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+        ranker = TableRanker(
+            self._get_embeddings(tables, representations, content_hashes)
+        )
+        if TABLE_RANKER_MAX_COUNT > 0:
+            with TableEmbeddingService._rankers_lock:
+                TableEmbeddingService._rankers[key] = (fingerprint, ranker)
+                TableEmbeddingService._rankers.move_to_end(key)
+                while len(TableEmbeddingService._rankers) > TABLE_RANKER_MAX_COUNT:
+                    TableEmbeddingService._rankers.popitem(last=False)
+        return ranker
+
+    def _get_embeddings(
+        self,
+        tables: List[TableDescription],
+        representations: List[str],
+        content_hashes: List[str],
+    ) -> List[List[float]]:
+        stored_embeddings = {}
+        table_ids = [table.id for table in tables if table.id is not None]
+        if table_ids:
+            for table_embedding in self.repository.find_by(
+                {
+                    "table_description_id": {"$in": table_ids},
+                    "embedding_model": self.embedding_model,
+                }
+            ):
+                stored_embeddings[table_embedding.table_description_id] = (
+                    table_embedding
+                )
+
+        embeddings = [None] * len(tables)
+        missing = []
+        for index, table in enumerate(tables):
+            stored = stored_embeddings.get(table.id)
+            if stored and stored.content_hash == content_hashes[index]:
+                embeddings[index] = stored.embedding
+            else:
+                missing.append(index)
+
+        if missing:
+            logger.info(f"Embedding {len(missing)} of {len(tables)} tables")
+            new_embeddings = self.embedding.embed_documents(
+                [representations[index] for index in missing]
+            )
+            for index, embedding in zip(missing, new_embeddings, strict=True):
+                embeddings[index] = embedding
+                if tables[index].id is None:
+                    continue
+                self.repository.save(
+                    TableEmbedding(
+                        db_connection_id=str(tables[index].db_connection_id),
+                        table_description_id=tables[index].id,
+                        embedding_model=self.embedding_model,
+                        content_hash=content_hashes[index],
+                        embedding=embedding,
+                    )
+                )
+        return embeddings
+
+    def refresh(self, tables: List[TableDescription]) -> None:
+        """Stores the embeddings of the given tables, failures are logged and the
+        embeddings will be computed again at query time"""
+        try:
+            self.get_embeddings(tables)
+        except Exception as e:
+            logger.warning(f"Unable to store table embeddings: {e}")
@@ -1,17 +1,16 @@
 """Base class that all cache classes inherit from."""
 
 from abc import ABC, abstractmethod
-from typing import Any, Union
 
 from dataherald.config import Component
-from dataherald.types import Response
+from dataherald.types import SQLGeneration
 
 
 class SmartCache(Component, ABC):
     @abstractmethod
-    def add(self, key: str, value: Response) -> dict[str, Any]:
+    def add(self, key: str, value: SQLGeneration) -> None:
         """Adds a key-value pair to the cache."""
 
     @abstractmethod
-    def lookup(self, key: str) -> str:
-        """Looks up a key in the cache."""
+    def lookup(self, key: str) -> SQLGeneration | None:
+        """Looks up a key in the cache, returns None when it is missing or expired."""
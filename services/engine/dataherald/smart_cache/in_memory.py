@@ -0,0 +1,46 @@
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Tuple
+
+from overrides import override
+
+from dataherald.config import System
+from dataherald.smart_cache import SmartCache
+from dataherald.types import SQLGeneration
+
+SMART_CACHE_TTL = int(os.environ.get("SMART_CACHE_TTL", "3600"))
+SMART_CACHE_MAX_SIZE = int(os.environ.get("SMART_CACHE_MAX_SIZE", "1000"))
+
+
+class InMemoryCache(SmartCache):
+    """Process local cache with a TTL, the least recently used entry is evicted once
+    SMART_CACHE_MAX_SIZE entries are stored"""
+
+    def __init__(self, system: System):
+        super().__init__(system)
+        self.ttl = timedelta(seconds=SMART_CACHE_TTL)
+        self.max_size = SMART_CACHE_MAX_SIZE
+        self._entries: OrderedDict[str, Tuple[datetime, SQLGeneration]] = OrderedDict()
+        self._lock = Lock()
+
+    @override
+    def add(self, key: str, value: SQLGeneration) -> None:
+        with self._lock:
+            self._entries[key] = (datetime.now(), value.copy(deep=True))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    @override
+    def lookup(self, key: str) -> SQLGeneration | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if datetime.now() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1].copy(deep=True)
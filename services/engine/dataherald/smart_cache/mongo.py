@@ -0,0 +1,45 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from overrides import override
+
+from dataherald.config import System
+from dataherald.db import DB
+from dataherald.smart_cache import SmartCache
+from dataherald.types import SQLGeneration
+
+DB_COLLECTION = "sql_generation_cache"
+SMART_CACHE_TTL = int(os.environ.get("SMART_CACHE_TTL", "3600"))
+
+
+class MongoCache(SmartCache):
+    """Cache shared by every engine process, entries expire after SMART_CACHE_TTL seconds.
+    The TTL index on expires_at (dataherald.db.indexes) deletes the expired entries"""
+
+    def __init__(self, system: System):
+        super().__init__(system)
+        self.storage = system.instance(DB)
+        self.ttl = timedelta(seconds=SMART_CACHE_TTL)
+
+    @override
+    def add(self, key: str, value: SQLGeneration) -> None:
+        self.storage.update_or_create(
+            DB_COLLECTION,
+            {"key": key},
+            {
+                "key": key,
+                "value": value.dict(exclude={"id"}),
+                "expires_at": datetime.now(timezone.utc) + self.ttl,
+            },
+        )
+
+    @override
+    def lookup(self, key: str) -> SQLGeneration | None:
+        # MongoDB removes expired entries once a minute, the filter skips the rest
+        row = self.storage.find_one(
+            DB_COLLECTION,
+            {"key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        )
+        if not row:
+            return None
+        return SQLGeneration(**row["value"])
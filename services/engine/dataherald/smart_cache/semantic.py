@@ -0,0 +1,98 @@
+import logging
+import os
+from typing import Tuple
+
+from dataherald.api.types.requests import SQLGenerationRequest
+from dataherald.config import System
+from dataherald.repositories.context_versions import ContextVersionRepository
+from dataherald.repositories.prompts import PromptRepository
+from dataherald.repositories.sql_generations import SQLGenerationRepository
+from dataherald.types import LLMConfig, Prompt, SQLGeneration
+from dataherald.vector_store import VectorStore
+
+SEMANTIC_CACHE_COLLECTION = os.environ.get(
+    "SEMANTIC_CACHE_COLLECTION", "sql-generation-cache"
+)
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_CANDIDATES = 3
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Finds VALID generations of earlier prompts that are paraphrases of a new prompt,
+    using the configured vector store to compare the prompt texts"""
+
+    def __init__(self, system: System, storage):
+        self.vector_store = system.instance(VectorStore)
+        self.prompt_repository = PromptRepository(storage)
+        self.sql_generation_repository = SQLGenerationRepository(storage)
+        self.context_version_repository = ContextVersionRepository(storage)
+
+    def is_compatible(
+        self,
+        prompt: Prompt,
+        sql_generation_request: SQLGenerationRequest,
+        sql_generation: SQLGeneration,
+    ) -> bool:
+        if sql_generation.status != "VALID" or sql_generation.sql is None:
+            return False
+        llm_config = sql_generation_request.llm_config or LLMConfig()
+        if (sql_generation.llm_config or LLMConfig()) != llm_config:
+            return False
+        if (sql_generation.finetuning_id or None) != (
+            sql_generation_request.finetuning_id or None
+        ):
+            return False
+        if sql_generation.low_latency_mode != sql_generation_request.low_latency_mode:
+            return False
+        cached_prompt = self.prompt_repository.find_by_id(sql_generation.prompt_id)
+        if cached_prompt is None or sorted(cached_prompt.schemas or []) != sorted(
+            prompt.schemas or []
+        ):
+            return False
+        context_updated_at = self.context_version_repository.get_updated_at(
+            prompt.db_connection_id
+        )
+        return context_updated_at is None or (
+            sql_generation.completed_at is not None
+            and sql_generation.completed_at > context_updated_at
+        )
+
+    def lookup(
+        self, prompt: Prompt, sql_generation_request: SQLGenerationRequest
+    ) -> Tuple[SQLGeneration, float] | None:
+        """Returns the most similar compatible generation and its similarity, or None when
+        no stored prompt reaches SEMANTIC_CACHE_THRESHOLD"""
+        try:
+            results = self.vector_store.query(
+                query_texts=[prompt.text],
+                db_connection_id=str(prompt.db_connection_id),
+                collection=SEMANTIC_CACHE_COLLECTION,
+                num_results=SEMANTIC_CACHE_CANDIDATES,
+            )
+        except Exception as e:
+            logger.warning(f"Unable to query the semantic cache: {e}")
+            return None
+        for result in results:
+            similarity = self.vector_store.get_similarity(result["score"])
+            if similarity < SEMANTIC_CACHE_THRESHOLD:
+                continue
+            sql_generation = self.sql_generation_repository.find_by_id(result["id"])
+            if sql_generation is not None and self.is_compatible(
+                prompt, sql_generation_request, sql_generation
+            ):
+                return sql_generation, similarity
+        return None
+
+    def add(self, prompt: Prompt, sql_generation: SQLGeneration) -> None:
+        try:
+            self.vector_store.add_record(
+                documents=prompt.text,
+                db_connection_id=str(prompt.db_connection_id),
+                collection=SEMANTIC_CACHE_COLLECTION,
+                metadata=[{"db_connection_id": str(prompt.db_connection_id)}],
+                ids=[sql_generation.id],
+            )
+        except Exception as e:
+            logger.warning(f"Unable to add the prompt to the semantic cache: {e}")
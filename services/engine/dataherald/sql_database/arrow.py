@@ -0,0 +1,131 @@
+"""Reads query results as Apache Arrow record batches, with the native Arrow fetch of
+the drivers that have one"""
+
+import logging
+from typing import Iterator, List
+
+import pyarrow as pa
+
+from dataherald.sql_database.base import SQLDatabase
+
+logger = logging.getLogger(__name__)
+
+
+def rows_to_record_batches(
+    columns: List[str], batches: Iterator[list]
+) -> Iterator[pa.RecordBatch]:
+    """Converts batches of rows, every batch is cast to the types inferred from the
+    first one so the writers get a single schema"""
+    schema = None
+    for rows in batches:
+        table = pa.Table.from_pydict(
+            {
+                column: [row[index] for row in rows]
+                for index, column in enumerate(columns)
+            }
+        )
+        if schema is None:
+            # Columns without values in the first batch have no type, keep them as text
+            schema = pa.schema(
+                [
+                    (
+                        field.with_type(pa.string())
+                        if pa.types.is_null(field.type)
+                        else field
+                    )
+                    for field in table.schema
+                ]
+            )
+        yield from table.cast(schema).to_batches()
+
+
+def fetch_snowflake_batches(
+    dbapi_connection, command: str
+) -> tuple[List[str], Iterator[pa.RecordBatch]]:
+    cursor = dbapi_connection.cursor()
+    cursor.execute(command)
+    columns = [description[0] for description in cursor.description]
+
+    def batches():
+        try:
+            for table in cursor.fetch_arrow_batches():
+                yield from table.to_batches()
+        finally:
+            cursor.close()
+
+    return columns, batches()
+
+
+def fetch_bigquery_batches(
+    dbapi_connection, command: str, batch_size: int
+) -> tuple[List[str], Iterator[pa.RecordBatch]] | None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute(command)
+    query_job = getattr(cursor, "_query_job", None)
+    if query_job is None:
+        cursor.close()
+        return None
+    rows = query_job.result(page_size=batch_size)
+    if not hasattr(rows, "to_arrow_iterable"):
+        cursor.close()
+        return None
+    columns = [field.name for field in rows.schema]
+    # Reads through the BigQuery Storage API when google-cloud-bigquery-storage is
+    # installed, otherwise page by page through the REST API
+    bqstorage_client = query_job.client._ensure_bqstorage_client()
+
+    def batches():
+        try:
+            yield from rows.to_arrow_iterable(bqstorage_client=bqstorage_client)
+        finally:
+            cursor.close()
+
+    return columns, batches()
+
+
+def fetch_duckdb_batches(
+    dbapi_connection, command: str, batch_size: int
+) -> tuple[List[str], Iterator[pa.RecordBatch]]:
+    # duckdb_engine wraps the connection, its execute does not return the result
+    dbapi_connection.execute(command)
+    reader = dbapi_connection.fetch_record_batch(batch_size)
+    return reader.schema.names, iter(reader)
+
+
+def fetch_arrow_batches(
+    database: SQLDatabase, command: str, batch_size: int = 1000
+) -> tuple[List[str], Iterator[pa.RecordBatch]]:
+    """Executes the statement and returns its columns and an iterator over Arrow record
+    batches. Snowflake, BigQuery and duckdb return Arrow data directly, the rest of the
+    dialects convert the rows of a server side cursor"""
+    command = database.parser_to_filter_commands(command)
+    if database.dialect in ["snowflake", "bigquery", "duckdb"]:
+        connection = database.engine.raw_connection()
+        try:
+            if database.dialect == "snowflake":
+                result = fetch_snowflake_batches(connection.dbapi_connection, command)
+            elif database.dialect == "bigquery":
+                result = fetch_bigquery_batches(
+                    connection.dbapi_connection, command, batch_size
+                )
+            else:
+                result = fetch_duckdb_batches(
+                    connection.dbapi_connection, command, batch_size
+                )
+        except Exception:
+            connection.close()
+            raise
+        if result is not None:
+            columns, batches = result
+
+            def native_batches():
+                try:
+                    yield from batches
+                finally:
+                    connection.close()
+
+            return columns, native_batches()
+        connection.close()
+        logger.info("The BigQuery client can not fetch Arrow data, reading rows")
+    columns, batches = database.stream_sql(command, batch_size)
+    return columns, rows_to_record_batches(columns, batches)
@@ -1,23 +1,59 @@
 """SQL wrapper around SQLDatabase in langchain."""
 
+import hashlib
 import logging
+import os
 import re
-from typing import List
+import time
+import weakref
+from collections import OrderedDict
+from queue import Empty, SimpleQueue
+from threading import Lock
+from typing import Any, Callable, Iterator, List
 from urllib.parse import unquote
 
 import sqlparse
-from sqlalchemy import MetaData, create_engine, inspect, text
-from sqlalchemy.engine import Engine
-from sqlalchemy.exc import OperationalError
-from sshtunnel import SSHTunnelForwarder
+from sqlalchemy import MetaData, create_engine, event, inspect, text
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.pool import QueuePool
 
 from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.sql_database.ssh_tunnels import SSHTunnels
+from dataherald.sql_database.statement_timeout import StatementTimeout
+from dataherald.sql_database.validation import validate
+from dataherald.utils import metrics
 from dataherald.utils.encrypt import FernetEncrypt
 from dataherald.utils.error_codes import CustomError
 from dataherald.utils.s3 import S3
 
 logger = logging.getLogger(__name__)
 
+# Seconds a reflected table is reused before it is reflected again
+REFLECTION_CACHE_TTL = int(os.environ.get("REFLECTION_CACHE_TTL", "60"))
+# Number of database urls whose reflected tables are kept in memory
+REFLECTION_CACHE_MAX_COUNT = int(os.environ.get("REFLECTION_CACHE_MAX_COUNT", "64"))
+# Seconds the rows of a query are reused, 0 disables the query result cache
+QUERY_RESULT_CACHE_TTL = int(os.environ.get("QUERY_RESULT_CACHE_TTL", "300"))
+QUERY_RESULT_CACHE_MAX_BYTES = int(
+    os.environ.get("QUERY_RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+# Upper bounds of the rows run_sql reads, measured as the length of their string
+# representation, the rest of the result is left in the database
+SQL_RESULT_MAX_ROWS = int(os.environ.get("SQL_RESULT_MAX_ROWS", "100000"))
+SQL_RESULT_MAX_BYTES = int(
+    os.environ.get("SQL_RESULT_MAX_BYTES", str(100 * 1024 * 1024))
+)
+SQL_FETCH_BATCH_SIZE = 1000
+# Pool of each engine, pool_size of the db connection overrides DB_ENGINE_POOL_SIZE
+DB_ENGINE_POOL_SIZE = int(os.environ.get("DB_ENGINE_POOL_SIZE", "5"))
+DB_ENGINE_MAX_OVERFLOW = int(os.environ.get("DB_ENGINE_MAX_OVERFLOW", "10"))
+DB_ENGINE_POOL_RECYCLE = int(os.environ.get("DB_ENGINE_POOL_RECYCLE", "1800"))
+# Registered engines are disposed after DB_ENGINE_MAX_IDLE seconds without use or when
+# there are more than DB_ENGINE_MAX_COUNT
+DB_ENGINE_MAX_IDLE = int(os.environ.get("DB_ENGINE_MAX_IDLE", "3600"))
+DB_ENGINE_MAX_COUNT = int(os.environ.get("DB_ENGINE_MAX_COUNT", "64"))
+
 
 # Define a custom exception class
 class SQLInjectionError(CustomError):
@@ -37,23 +73,334 @@ class SSHInvalidDatabaseConnectionError(CustomError):
 
 
 class DBConnections:
-    db_connections = {}
+    """Engines shared by every request, one per db connection and connection settings.
+    Engines unused for DB_ENGINE_MAX_IDLE seconds and the least recently used ones over
+    DB_ENGINE_MAX_COUNT are removed. Removed engines are disposed, closing their pooled
+    connections and releasing their SSH tunnel, once no request holds their SQLDatabase
+    """
+
+    db_connections: OrderedDict = OrderedDict()
+    # Removed engines still held by a request, by id of their SQLDatabase
+    retired: dict = {}
+    # Retired engines no request holds anymore, queued by their finalizers
+    released: SimpleQueue = SimpleQueue()
+    lock = Lock()
+
+    @staticmethod
+    def get_key(database_info: DatabaseConnection, db_uri: str) -> str:
+        ssh = database_info.ssh_settings
+        settings = [
+            database_info.id,
+            db_uri,
+            database_info.path_to_credentials_file,
+            database_info.use_ssh,
+            (ssh.host, ssh.port, ssh.username) if ssh else None,
+            database_info.pool_size,
+        ]
+        return hashlib.sha256(str(settings).encode()).hexdigest()
+
+    @staticmethod
+    def get(key: str) -> "SQLDatabase | None":
+        DBConnections.close_released()
+        with DBConnections.lock:
+            entry = DBConnections.db_connections.get(key)
+            if entry is None:
+                return None
+            entry["last_used"] = time.monotonic()
+            DBConnections.db_connections.move_to_end(key)
+        metrics.increment("db_engines.reused")
+        return entry["sql_database"]
+
+    @staticmethod
+    def add(key: str, db_connection_id: str | None, sql_database: "SQLDatabase"):
+        DBConnections.close_released()
+        with DBConnections.lock:
+            disposed = [DBConnections.db_connections.pop(key, None)]
+            DBConnections.db_connections[key] = {
+                "db_connection_id": db_connection_id,
+                "sql_database": sql_database,
+                "last_used": time.monotonic(),
+            }
+            disposed += DBConnections._pop_expired()
+        metrics.increment("db_engines.created")
+        DBConnections._dispose(disposed)
 
     @staticmethod
-    def add(uri, engine):
-        DBConnections.db_connections[uri] = engine
+    def discard(key: str) -> None:
+        with DBConnections.lock:
+            entry = DBConnections.db_connections.pop(key, None)
+        DBConnections._dispose([entry])
+
+    @staticmethod
+    def invalidate(db_connection_id: str) -> None:
+        """Disposes the engines of a db connection, used when it is updated"""
+        with DBConnections.lock:
+            keys = [
+                key
+                for key, entry in DBConnections.db_connections.items()
+                if entry["db_connection_id"] == str(db_connection_id)
+            ]
+            disposed = [DBConnections.db_connections.pop(key) for key in keys]
+        DBConnections._dispose(disposed)
+
+    @staticmethod
+    def get_checked_out(engine: Engine) -> int:
+        """Connections of the engine in use, pools without the count report 0"""
+        pool = engine.pool
+        return pool.checkedout() if hasattr(pool, "checkedout") else 0
+
+    @staticmethod
+    def _pop_expired() -> list:
+        """Called with the lock, engines with connections in use are never evicted"""
+        now = time.monotonic()
+        idle = [
+            key
+            for key, entry in DBConnections.db_connections.items()
+            if DBConnections.get_checked_out(entry["sql_database"].engine) == 0
+        ]
+        expired = [
+            key
+            for key in idle
+            if now - DBConnections.db_connections[key]["last_used"] > DB_ENGINE_MAX_IDLE
+        ]
+        overflow = (
+            len(DBConnections.db_connections) - len(expired) - DB_ENGINE_MAX_COUNT
+        )
+        if overflow > 0:
+            expired += [key for key in idle if key not in expired][:overflow]
+        return [DBConnections.db_connections.pop(key) for key in expired]
+
+    @staticmethod
+    def _dispose(entries: list) -> None:
+        """Agents keep the SQLDatabase between their queries, while no connection is
+        checked out, so the engine is only disposed once the last reference is gone"""
+        for entry in entries:
+            if entry is None:
+                continue
+            sql_database = entry["sql_database"]
+            key = id(sql_database)
+            with DBConnections.lock:
+                DBConnections.retired[key] = {
+                    "db_connection_id": entry["db_connection_id"],
+                    "engine": sql_database.engine,
+                    "ssh_tunnel": sql_database.ssh_tunnel,
+                    "last_used": entry["last_used"],
+                }
+            weakref.finalize(sql_database, DBConnections.released.put, key)
+        DBConnections.close_released()
+
+    @staticmethod
+    def close_released() -> None:
+        """Disposes the retired engines that are not held anymore. The finalizers only
+        queue them, the garbage collector can run them while any lock is held"""
+        while True:
+            try:
+                key = DBConnections.released.get_nowait()
+            except Empty:
+                return
+            with DBConnections.lock:
+                entry = DBConnections.retired.pop(key)
+            engine = entry["engine"]
+            engine.dispose()
+            MetadataCache.invalidate(engine)
+            QueryResultCache.invalidate(engine)
+            if entry["ssh_tunnel"] is not None:
+                SSHTunnels.release(entry["ssh_tunnel"])
+            metrics.increment("db_engines.disposed")
+
+    @staticmethod
+    def get_stats() -> List[dict]:
+        """Pool usage of the registered engines and of the retired ones still held"""
+        DBConnections.close_released()
+        now = time.monotonic()
+        with DBConnections.lock:
+            entries = [
+                (entry["db_connection_id"], entry["sql_database"].engine, entry, False)
+                for entry in DBConnections.db_connections.values()
+            ] + [
+                (entry["db_connection_id"], entry["engine"], entry, True)
+                for entry in DBConnections.retired.values()
+            ]
+            return [
+                {
+                    "db_connection_id": db_connection_id,
+                    "pool": engine.pool.status(),
+                    "checked_out": DBConnections.get_checked_out(engine),
+                    "idle_seconds": round(now - entry["last_used"]),
+                    "retired": retired,
+                }
+                for db_connection_id, engine, entry, retired in entries
+            ]
+
+
+class MetadataCache:
+    """Reflected tables per database url, each table is reflected on demand and reused
+    until REFLECTION_CACHE_TTL expires. The returned MetaData is never modified, stale
+    tables are reflected into a new one that replaces it, and only the
+    REFLECTION_CACHE_MAX_COUNT most recently used urls are kept"""
+
+    entries = OrderedDict()
+    lock = Lock()
+
+    @staticmethod
+    def _get_entry(engine: Engine) -> dict:
+        key = str(engine.url)
+        with MetadataCache.lock:
+            if key not in MetadataCache.entries:
+                MetadataCache.entries[key] = {
+                    "metadata": MetaData(),
+                    "reflected_at": {},
+                    "lock": Lock(),
+                }
+            MetadataCache.entries.move_to_end(key)
+            entry = MetadataCache.entries[key]
+            while len(MetadataCache.entries) > max(REFLECTION_CACHE_MAX_COUNT, 1):
+                MetadataCache.entries.popitem(last=False)
+            return entry
+
+    @staticmethod
+    def get_metadata(engine: Engine, table_names: List[str]) -> MetaData:
+        """Returns a MetaData that contains at least the given tables or views, only the
+        missing or expired ones are reflected"""
+        entry = MetadataCache._get_entry(engine)
+        with entry["lock"]:
+            now = time.monotonic()
+            stale = [
+                table_name
+                for table_name in dict.fromkeys(table_names)
+                if table_name not in entry["metadata"].tables
+                or now - entry["reflected_at"].get(table_name, 0) > REFLECTION_CACHE_TTL
+            ]
+            if not stale:
+                return entry["metadata"]
+            metadata = MetaData()
+            reflected_at = {}
+            for table_name, table in entry["metadata"].tables.items():
+                if table_name not in stale:
+                    table.to_metadata(metadata)
+                    if table_name in entry["reflected_at"]:
+                        reflected_at[table_name] = entry["reflected_at"][table_name]
+            try:
+                metadata.reflect(bind=engine, only=stale, views=True)
+            except InvalidRequestError:
+                # Some of the tables do not exist, reflect the rest one by one
+                for table_name in stale:
+                    try:
+                        metadata.reflect(bind=engine, only=[table_name], views=True)
+                    except InvalidRequestError as e:
+                        logger.warning(f"Unable to reflect {table_name}: {e}")
+            for table_name in stale:
+                if table_name in metadata.tables:
+                    reflected_at[table_name] = now
+            entry["metadata"] = metadata
+            entry["reflected_at"] = reflected_at
+            return metadata
+
+    @staticmethod
+    def invalidate(engine: Engine, table_names: List[str] | None = None) -> None:
+        key = str(engine.url)
+        if table_names is None:
+            with MetadataCache.lock:
+                MetadataCache.entries.pop(key, None)
+            return
+        entry = MetadataCache._get_entry(engine)
+        with entry["lock"]:
+            for table_name in table_names:
+                entry["reflected_at"].pop(table_name, None)
+
+
+class QueryResultCache:
+    """Rows returned by the queries of each database url, keyed by the normalized query
+    and the row limit. Entries expire after QUERY_RESULT_CACHE_TTL and the least recently
+    used ones are evicted once the results take more than QUERY_RESULT_CACHE_MAX_BYTES
+    """
+
+    entries: OrderedDict = OrderedDict()
+    size = 0
+    lock = Lock()
+
+    @staticmethod
+    def get_key(engine: Engine, command: str, top_k: int | None) -> tuple:
+        normalized = re.sub(r"\s+", " ", command).strip().rstrip(";").strip()
+        return str(engine.url), normalized, top_k
+
+    @staticmethod
+    def _pop(key: tuple) -> None:
+        entry = QueryResultCache.entries.pop(key, None)
+        if entry is not None:
+            QueryResultCache.size -= entry["size"]
+
+    @staticmethod
+    def lookup(engine: Engine, command: str, top_k: int | None) -> list | None:
+        """Returns the rows of the same query with the same limit, or the first top_k
+        rows of a complete result"""
+        keys = [QueryResultCache.get_key(engine, command, top_k)]
+        if top_k:
+            keys.append(QueryResultCache.get_key(engine, command, None))
+        now = time.monotonic()
+        with QueryResultCache.lock:
+            for key in keys:
+                entry = QueryResultCache.entries.get(key)
+                if entry is None:
+                    continue
+                if now - entry["stored_at"] > QUERY_RESULT_CACHE_TTL:
+                    QueryResultCache._pop(key)
+                    continue
+                QueryResultCache.entries.move_to_end(key)
+                metrics.increment("query_result_cache.hits")
+                return entry["result"][:top_k] if top_k else list(entry["result"])
+        metrics.increment("query_result_cache.misses")
+        return None
+
+    @staticmethod
+    def add(
+        engine: Engine, command: str, top_k: int | None, result: list, size: int
+    ) -> None:
+        """Stores the rows, size is the length of their string representation"""
+        if QUERY_RESULT_CACHE_TTL <= 0 or size > QUERY_RESULT_CACHE_MAX_BYTES:
+            return
+        # A result with fewer rows than the limit is complete and serves any limit
+        if top_k and len(result) < top_k:
+            top_k = None
+        key = QueryResultCache.get_key(engine, command, top_k)
+        with QueryResultCache.lock:
+            QueryResultCache._pop(key)
+            QueryResultCache.entries[key] = {
+                "stored_at": time.monotonic(),
+                "result": list(result),
+                "size": size,
+            }
+            QueryResultCache.size += size
+            while QueryResultCache.size > QUERY_RESULT_CACHE_MAX_BYTES:
+                oldest_key = next(iter(QueryResultCache.entries))
+                QueryResultCache._pop(oldest_key)
+
+    @staticmethod
+    def invalidate(engine: Engine | None = None) -> None:
+        with QueryResultCache.lock:
+            for key in list(QueryResultCache.entries):
+                if engine is None or key[0] == str(engine.url):
+                    QueryResultCache._pop(key)
 
 
 class SQLDatabase:
     def __init__(self, engine: Engine):
         """Create engine from database URI."""
         self._engine = engine
+        self.validation_mode = None
+        self.cache_query_results = True
+        self.ssh_tunnel = None
 
     @property
     def engine(self) -> Engine:
         """Return SQL Alchemy engine."""
         return self._engine
 
+    def apply_settings(self, database_info: DatabaseConnection) -> None:
+        """Copies the settings of the db connection that change how queries are run"""
+        self.validation_mode = database_info.sql_validation_mode
+        self.cache_query_results = database_info.cache_query_results
+
     @classmethod
     def from_uri(
         cls, database_uri: str, engine_args: dict | None = None
@@ -66,36 +413,58 @@ class SQLDatabase:
         engine = create_engine(database_uri, **_engine_args)
         return cls(engine)
 
+    @classmethod
+    def get_engine_args(cls, database_uri: str, pool_size: int | None = None) -> dict:
+        """Pool settings of the engine, the size only applies to queue pools"""
+        engine_args = {"pool_pre_ping": True, "pool_recycle": DB_ENGINE_POOL_RECYCLE}
+        url = make_url(database_uri)
+        if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+            engine_args["pool_size"] = pool_size or DB_ENGINE_POOL_SIZE
+            engine_args["max_overflow"] = DB_ENGINE_MAX_OVERFLOW
+        return engine_args
+
+    def is_healthy(self) -> bool:
+        try:
+            with self._engine.connect():
+                return True
+        except Exception as e:
+            logger.warning(f"Unable to connect with a registered engine: {e}")
+            metrics.increment("db_engines.health_check_failures")
+            return False
+
     @classmethod
     def get_sql_engine(
         cls, database_info: DatabaseConnection, refresh_connection=False
     ) -> "SQLDatabase":
+        """Returns the registered engine of the db connection or creates it, with
+        refresh_connection the engine is replaced when it can not connect"""
         logger.info(f"Connecting db: {database_info.id}")
+        fernet_encrypt = FernetEncrypt()
         try:
-            if (
-                database_info.id
-                and database_info.id in DBConnections.db_connections
-                and not refresh_connection
-            ):
-                sql_database = DBConnections.db_connections[database_info.id]
-                sql_database.engine.connect()
+            db_uri = unquote(fernet_encrypt.decrypt(database_info.connection_uri))
+        except Exception as e:
+            raise InvalidDBConnectionError(
+                f"Unable to connect to db: {database_info.alias}", description=str(e)
+            ) from e
+        key = DBConnections.get_key(database_info, db_uri)
+        sql_database = DBConnections.get(key)
+        if sql_database is not None:
+            if not refresh_connection or sql_database.is_healthy():
+                sql_database.apply_settings(database_info)
                 return sql_database
-        except OperationalError:
-            pass
+            DBConnections.discard(key)
 
-        fernet_encrypt = FernetEncrypt()
         try:
             if database_info.use_ssh:
                 engine = cls.from_uri_ssh(database_info)
-                DBConnections.add(database_info.id, engine)
+                engine.apply_settings(database_info)
+                DBConnections.add(key, database_info.id, engine)
                 return engine
         except Exception as e:
             raise SSHInvalidDatabaseConnectionError(
                 "Invalid SSH connection", description=str(e)
             ) from e
         try:
-            db_uri = unquote(fernet_encrypt.decrypt(database_info.connection_uri))
-
             file_path = database_info.path_to_credentials_file
             if file_path and file_path.lower().startswith("s3"):
                 s3 = S3()
@@ -104,9 +473,13 @@ class SQLDatabase:
             if db_uri.lower().startswith("bigquery"):
                 db_uri = db_uri + f"?credentials_path={file_path}"
 
-            engine = cls.from_uri(db_uri)
-            engine.engine.connect()
-            DBConnections.add(database_info.id, engine)
+            engine = cls.from_uri(
+                db_uri, cls.get_engine_args(db_uri, database_info.pool_size)
+            )
+            engine.apply_settings(database_info)
+            with engine.engine.connect():
+                pass
+            DBConnections.add(key, database_info.id, engine)
         except Exception as e:
             raise InvalidDBConnectionError(  # noqa: B904
                 f"Unable to connect to db: {database_info.alias}", description=str(e)
@@ -143,35 +516,30 @@ class SQLDatabase:
 
     @classmethod
     def from_uri_ssh(cls, database_info: DatabaseConnection):
-        file_path = database_info.path_to_credentials_file
-        if file_path.lower().startswith("s3"):
-            s3 = S3()
-            file_path = s3.download(file_path)
-
         fernet_encrypt = FernetEncrypt()
         db_uri = unquote(fernet_encrypt.decrypt(database_info.connection_uri))
         db_uri_obj = cls.extract_parameters(db_uri)
-        ssh = database_info.ssh_settings
-
-        server = SSHTunnelForwarder(
-            (ssh.host, 22 if not ssh.port else int(ssh.port)),
-            ssh_username=ssh.username,
-            ssh_password=fernet_encrypt.decrypt(ssh.password),
-            ssh_pkey=file_path,
-            ssh_private_key_password=fernet_encrypt.decrypt(ssh.private_key_password),
-            remote_bind_address=(
-                db_uri_obj["host"],
-                5432 if not db_uri_obj["port"] else int(db_uri_obj["port"]),
-            ),
+        ssh_tunnel, local_host, local_port = SSHTunnels.acquire(
+            database_info,
+            db_uri_obj["host"],
+            5432 if not db_uri_obj["port"] else int(db_uri_obj["port"]),
         )
-        server.stop(force=True)
-        server.start()
-        local_port = str(server.local_bind_port)
-        local_host = str(server.local_bind_host)
+        try:
+            tunnel_uri = f"{db_uri_obj['driver']}://{db_uri_obj['user']}:{db_uri_obj['password']}@{local_host}:{local_port}/{db_uri_obj['db']}"
+            sql_database = cls.from_uri(
+                tunnel_uri, cls.get_engine_args(tunnel_uri, database_info.pool_size)
+            )
+        except Exception:
+            SSHTunnels.release(ssh_tunnel)
+            raise
+        sql_database.ssh_tunnel = ssh_tunnel
 
-        return cls.from_uri(
-            f"{db_uri_obj['driver']}://{db_uri_obj['user']}:{db_uri_obj['password']}@{local_host}:{local_port}/{db_uri_obj['db']}"
-        )
+        # The pool opens connections after the tunnel dropped, reconnect it first
+        @event.listens_for(sql_database.engine, "do_connect")
+        def reconnect_tunnel(dialect, conn_rec, cargs, cparams):  # noqa: ARG001
+            SSHTunnels.ensure_active(ssh_tunnel)
+
+        return sql_database
 
     @classmethod
     def parser_to_filter_commands(cls, command: str) -> str:
@@ -202,27 +570,135 @@ class SQLDatabase:
 
         return command
 
-    def run_sql(self, command: str, top_k: int = None) -> tuple[str, dict]:
+    def run_sql(
+        self, command: str, top_k: int = None, timeout: int | None = None
+    ) -> tuple[str, dict]:
         """Execute a SQL statement and return a string representing the results.
 
         If the statement returns rows, a string of the results is returned.
         If the statement returns no rows, an empty string is returned.
+        With a timeout the database stops the statement once it expires and a
+        TimeoutError is raised. Results over SQL_RESULT_MAX_ROWS or
+        SQL_RESULT_MAX_BYTES are cut and flagged as truncated.
         """
+        command = self.parser_to_filter_commands(command)
+        if self.cache_query_results:
+            result = QueryResultCache.lookup(self._engine, command, top_k)
+            if result is not None:
+                return str(result), {"result": result, "truncated": False}
+        response = self._run(
+            lambda connection: self._execute(connection, command, top_k), timeout
+        )
+        if (
+            self.cache_query_results
+            and "result" in response[1]
+            and not response[1]["truncated"]
+        ):
+            QueryResultCache.add(
+                self._engine, command, top_k, response[1]["result"], len(response[0])
+            )
+        return response
+
+    def stream_sql(
+        self, command: str, batch_size: int = 1000
+    ) -> tuple[List[str], Iterator[list]]:
+        """Executes the statement and returns its columns and an iterator over batches
+        of rows read from a server side cursor. The connection stays open until the
+        iterator is exhausted or closed"""
+        command = self.parser_to_filter_commands(command)
+        connection = self._engine.connect()
+        try:
+            cursor = connection.execution_options(stream_results=True).execute(
+                text(command)
+            )
+        except Exception:
+            connection.close()
+            raise
+        if not cursor.returns_rows:
+            connection.close()
+            return [], iter(())
+
+        def batches() -> Iterator[list]:
+            try:
+                while rows := cursor.fetchmany(batch_size):
+                    yield rows
+            finally:
+                cursor.close()
+                connection.close()
+
+        return list(cursor.keys()), batches()
+
+    def validate_sql(self, command: str, timeout: int | None = None) -> None:
+        """Raises the database error when the statement is not valid, checking it the
+        way set in the db connection sql_validation_mode instead of running all of it"""
+        command = self.parser_to_filter_commands(command)
+        self._run(
+            lambda connection: validate(connection, command, self.validation_mode),
+            timeout,
+        )
+
+    def _run(self, func: Callable[[Connection], Any], timeout: int | None) -> Any:
         with self._engine.connect() as connection:
-            command = self.parser_to_filter_commands(command)
-            cursor = connection.execute(text(command))
-            if cursor.returns_rows and top_k:
-                result = cursor.fetchmany(top_k)
-                return str(result), {"result": result}
-            if cursor.returns_rows:
-                result = cursor.fetchall()
-                return str(result), {"result": result}
-        return "", {}
+            if not timeout:
+                return func(connection)
+            with StatementTimeout(connection, timeout) as statement_timeout:
+                try:
+                    return func(connection)
+                except Exception as e:
+                    if statement_timeout.expired():
+                        raise TimeoutError(
+                            "The query execution exceeded the timeout"
+                        ) from e
+                    raise
+
+    def _execute(
+        self, connection: Connection, command: str, top_k: int = None
+    ) -> tuple[str, dict]:
+        """Reads at most top_k rows from a server side cursor, without top_k or over
+        SQL_RESULT_MAX_ROWS it stops at SQL_RESULT_MAX_ROWS. It also stops before the
+        rows take more than SQL_RESULT_MAX_BYTES, truncated is set when rows were left
+        out because of these limits"""
+        cursor = connection.execution_options(stream_results=True).execute(
+            text(command)
+        )
+        if not cursor.returns_rows:
+            return "", {}
+        max_rows = min(top_k, SQL_RESULT_MAX_ROWS) if top_k else SQL_RESULT_MAX_ROWS
+        result = []
+        size = 0
+        truncated = False
+        while not truncated and len(result) < max_rows:
+            rows = cursor.fetchmany(min(SQL_FETCH_BATCH_SIZE, max_rows - len(result)))
+            if not rows:
+                break
+            for row in rows:
+                size += len(str(row))
+                if size > SQL_RESULT_MAX_BYTES:
+                    truncated = True
+                    break
+                result.append(row)
+        if (
+            not truncated
+            and len(result) == SQL_RESULT_MAX_ROWS
+            and (not top_k or top_k > SQL_RESULT_MAX_ROWS)
+        ):
+            truncated = cursor.fetchone() is not None
+        cursor.close()
+        if truncated:
+            logger.warning(
+                f"Query result truncated to {len(result)} rows and {size} bytes"
+            )
+        return str(result), {"result": result, "truncated": truncated}
+
+    def get_metadata(self, table_names: List[str], refresh: bool = False) -> MetaData:
+        """Returns the reflected tables, reflecting only the given ones. With refresh the
+        cached tables are reflected again"""
+        if refresh:
+            MetadataCache.invalidate(self._engine, table_names)
+        return MetadataCache.get_metadata(self._engine, table_names)
 
     def get_tables_and_views(self) -> List[str]:
         inspector = inspect(self._engine)
-        meta = MetaData(bind=self._engine)
-        MetaData.reflect(meta, views=True)
         rows = inspector.get_table_names() + inspector.get_view_names()
         if len(rows) == 0:
             raise EmptyDBError("The db is empty it could be a permission issue")
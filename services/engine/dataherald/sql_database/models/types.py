@@ -6,8 +6,18 @@ from typing import Any
 
 from pydantic import BaseModel, BaseSettings, Extra, Field, validator
 
+from dataherald.sql_database.validation import SQLValidationMode
 from dataherald.utils.encrypt import FernetEncrypt
 
+# Upper bound of the pool_size a db connection can set
+DB_ENGINE_MAX_POOL_SIZE = int(os.environ.get("DB_ENGINE_MAX_POOL_SIZE", "50"))
+
+
+def validate_pool_size(value: int | None) -> int | None:
+    if value is not None and not 0 < value <= DB_ENGINE_MAX_POOL_SIZE:
+        raise ValueError(f"pool_size must be between 1 and {DB_ENGINE_MAX_POOL_SIZE}")
+    return value
+
 
 class LLMCredentials(BaseSettings):
     organization_id: str | None
@@ -101,6 +111,9 @@ class DatabaseConnection(BaseModel):
     llm_api_key: str | None = None
     ssh_settings: SSHSettings | None = None
     file_storage: FileStorage | None = None
+    sql_validation_mode: str | None = None
+    cache_query_results: bool = True
+    pool_size: int | None = None
     metadata: dict | None
     created_at: datetime = Field(default_factory=datetime.now)
 
@@ -130,6 +143,16 @@ class DatabaseConnection(BaseModel):
             value = fernet_encrypt.encrypt(value)
         return value
 
+    @validator("sql_validation_mode")
+    def sql_validation_mode_format(cls, value: str | None):
+        if value is not None:
+            value = SQLValidationMode(value.lower()).value
+        return value
+
+    @validator("pool_size")
+    def pool_size_range(cls, value: int | None):
+        return validate_pool_size(value)
+
     @validator("llm_api_key", pre=True, always=True)
     def llm_api_key_encrypt(cls, value: str):
         fernet_encrypt = FernetEncrypt()
@@ -11,6 +11,7 @@ from dataherald.sql_database.models.types import DatabaseConnection
 from dataherald.types import DatabaseConnectionRequest
 from dataherald.utils.encrypt import FernetEncrypt
 from dataherald.utils.error_codes import CustomError
+from dataherald.utils.s3 import CredentialFileCache
 
 
 class SchemaNotSupportedError(CustomError):
@@ -92,6 +93,10 @@ class DatabaseConnectionService:
     def create(
         self, database_connection_request: DatabaseConnectionRequest
     ) -> DatabaseConnection:
+        # A file uploaded again under a cached path is downloaded again
+        CredentialFileCache.invalidate(
+            database_connection_request.path_to_credentials_file
+        )
         database_connection = DatabaseConnection(
             alias=database_connection_request.alias,
             connection_uri=database_connection_request.connection_uri.strip(),
@@ -101,6 +106,9 @@ class DatabaseConnectionService:
             use_ssh=database_connection_request.use_ssh,
             ssh_settings=database_connection_request.ssh_settings,
             file_storage=database_connection_request.file_storage,
+            sql_validation_mode=database_connection_request.sql_validation_mode,
+            cache_query_results=database_connection_request.cache_query_results,
+            pool_size=database_connection_request.pool_size,
             metadata=database_connection_request.metadata,
         )
         if database_connection.schemas and database_connection.dialect in [
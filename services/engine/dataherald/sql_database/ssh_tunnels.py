@@ -0,0 +1,133 @@
+import logging
+import os
+from threading import Lock
+
+from sshtunnel import SSHTunnelForwarder
+
+from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.utils import metrics
+from dataherald.utils.encrypt import FernetEncrypt
+from dataherald.utils.s3 import S3
+
+# Seconds between the keepalive packets sent through each tunnel
+SSH_TUNNEL_KEEPALIVE = float(os.environ.get("SSH_TUNNEL_KEEPALIVE", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+class SSHTunnels:
+    """One SSH tunnel per db connection and remote database, shared by the engines that
+    use it. Tunnels are started by the first engine, restarted on the same local port
+    when they go down and stopped once the last engine releases them"""
+
+    tunnels = {}
+    lock = Lock()
+
+    @staticmethod
+    def get_key(database_info: DatabaseConnection, host: str, port: int) -> str:
+        ssh = database_info.ssh_settings
+        return f"{database_info.id}:{ssh.username}@{ssh.host}:{ssh.port}->{host}:{port}"
+
+    @staticmethod
+    def acquire(
+        database_info: DatabaseConnection, host: str, port: int
+    ) -> tuple[str, str, int]:
+        """Returns the key of the tunnel and its local address, starting it if needed"""
+        key = SSHTunnels.get_key(database_info, host, port)
+        with SSHTunnels.lock:
+            entry = SSHTunnels.tunnels.get(key)
+            if entry is None:
+                entry = {"lock": Lock(), "server": None, "users": 0}
+                SSHTunnels.tunnels[key] = entry
+            entry["users"] += 1
+        try:
+            with entry["lock"]:
+                if entry["server"] is None:
+                    entry["settings"] = SSHTunnels.get_settings(
+                        database_info, host, port
+                    )
+                    entry["server"] = SSHTunnels.start(entry["settings"])
+                    metrics.increment("ssh_tunnels.started")
+                elif not entry["server"].is_active:
+                    SSHTunnels.restart(key, entry)
+                else:
+                    metrics.increment("ssh_tunnels.reused")
+                server = entry["server"]
+                return key, str(server.local_bind_host), server.local_bind_port
+        except Exception:
+            SSHTunnels.release(key)
+            raise
+
+    @staticmethod
+    def get_settings(database_info: DatabaseConnection, host: str, port: int) -> dict:
+        fernet_encrypt = FernetEncrypt()
+        ssh = database_info.ssh_settings
+        key_file = database_info.path_to_credentials_file
+        if key_file and key_file.lower().startswith("s3"):
+            # Loaded once, the tunnel reuses the key when it restarts after the
+            # downloaded file is deleted
+            key_file = SSHTunnelForwarder.read_private_key_file(
+                S3().download(key_file),
+                fernet_encrypt.decrypt(ssh.private_key_password),
+            )
+        return {
+            "ssh_address_or_host": (ssh.host, 22 if not ssh.port else int(ssh.port)),
+            "ssh_username": ssh.username,
+            "ssh_password": fernet_encrypt.decrypt(ssh.password),
+            "ssh_pkey": key_file,
+            "ssh_private_key_password": fernet_encrypt.decrypt(
+                ssh.private_key_password
+            ),
+            "remote_bind_address": (host, port),
+            "set_keepalive": SSH_TUNNEL_KEEPALIVE,
+        }
+
+    @staticmethod
+    def start(settings: dict) -> SSHTunnelForwarder:
+        server = SSHTunnelForwarder(**settings)
+        server.start()
+        return server
+
+    @staticmethod
+    def restart(key: str, entry: dict) -> None:
+        """Called with the lock of the entry, keeps the local port so the engines
+        using the tunnel do not change"""
+        logger.warning(f"SSH tunnel {key} is down, reconnecting")
+        previous = entry["server"]
+        previous.stop(force=True)
+        entry["server"] = SSHTunnels.start(
+            {
+                **entry["settings"],
+                "local_bind_address": (
+                    str(previous.local_bind_host),
+                    previous.local_bind_port,
+                ),
+            }
+        )
+        metrics.increment("ssh_tunnels.reconnected")
+
+    @staticmethod
+    def ensure_active(key: str) -> None:
+        """Restarts the tunnel when it is down, runs before each new db connection"""
+        entry = SSHTunnels.tunnels.get(key)
+        if entry is None:
+            return
+        with entry["lock"]:
+            if entry["server"] is not None and not entry["server"].is_active:
+                SSHTunnels.restart(key, entry)
+
+    @staticmethod
+    def release(key: str) -> None:
+        """Stops the tunnel once no engine uses it"""
+        with SSHTunnels.lock:
+            entry = SSHTunnels.tunnels.get(key)
+            if entry is None:
+                return
+            entry["users"] -= 1
+            if entry["users"] > 0:
+                return
+            del SSHTunnels.tunnels[key]
+        with entry["lock"]:
+            if entry["server"] is not None:
+                entry["server"].stop(force=True)
+                metrics.increment("ssh_tunnels.stopped")
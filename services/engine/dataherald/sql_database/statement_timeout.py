@@ -0,0 +1,193 @@
+"""Server side statement timeouts and cancellation of running statements"""
+
+import heapq
+import itertools
+import logging
+import time
+from threading import Condition, Lock, Thread
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+# Statements that make the database stop the query by itself once the timeout expires,
+# they only last for the current transaction or are unset by RESET_STATEMENTS
+SET_STATEMENTS = {
+    "postgresql": "SET LOCAL statement_timeout = {milliseconds}",
+    "redshift": "SET statement_timeout = {milliseconds}",
+    "snowflake": "ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = {seconds}",
+    "mysql": "SET SESSION MAX_EXECUTION_TIME = {milliseconds}",
+}
+RESET_STATEMENTS = {
+    "redshift": "RESET statement_timeout",
+    "snowflake": "ALTER SESSION UNSET STATEMENT_TIMEOUT_IN_SECONDS",
+    "mysql": "SET SESSION MAX_EXECUTION_TIME = DEFAULT",
+}
+
+
+class StatementWatchdog:
+    """A single daemon thread that cancels the statements whose timeout expired, the
+    statements are kept in a heap ordered by deadline. Finished statements stay in the
+    heap until their deadline and are skipped"""
+
+    deadlines = []
+    counter = itertools.count()
+    condition = Condition()
+    thread: Thread | None = None
+
+    @staticmethod
+    def add(statement_timeout: "StatementTimeout", deadline: float) -> None:
+        with StatementWatchdog.condition:
+            heapq.heappush(
+                StatementWatchdog.deadlines,
+                (deadline, next(StatementWatchdog.counter), statement_timeout),
+            )
+            if StatementWatchdog.thread is None:
+                StatementWatchdog.thread = Thread(
+                    target=StatementWatchdog.run,
+                    name="statement-watchdog",
+                    daemon=True,
+                )
+                StatementWatchdog.thread.start()
+            StatementWatchdog.condition.notify()
+
+    @staticmethod
+    def run() -> None:
+        while True:
+            with StatementWatchdog.condition:
+                while not StatementWatchdog.deadlines:
+                    StatementWatchdog.condition.wait()
+                deadline, _, statement_timeout = StatementWatchdog.deadlines[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    StatementWatchdog.condition.wait(remaining)
+                    continue
+                heapq.heappop(StatementWatchdog.deadlines)
+            if not statement_timeout.finished:
+                statement_timeout.cancel()
+
+
+class StatementTimeout:
+    """Applies the dialect native statement timeout to a connection and cancels the
+    running statement from the StatementWatchdog when it expires, so the query does not
+    keep running in the warehouse after the caller gave up on it"""
+
+    def __init__(self, connection: Connection, timeout: int):
+        self.connection = connection
+        self.timeout = timeout
+        self.dialect = connection.dialect.name
+        self.dbapi_connection = connection.connection.dbapi_connection
+        self.cursor = None
+        self.cancelled = False
+        self.started_at = None
+        self.finished = False
+        self.lock = Lock()
+
+    def __enter__(self) -> "StatementTimeout":
+        self.set_timeout()
+        event.listen(self.connection, "before_cursor_execute", self.track_cursor)
+        self.started_at = time.monotonic()
+        StatementWatchdog.add(self, self.started_at + self.timeout)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # Waits for a running cancel, none can start once the connection is released
+        with self.lock:
+            self.finished = True
+            self.cursor = None
+        event.remove(self.connection, "before_cursor_execute", self.track_cursor)
+        self.reset_timeout()
+
+    def expired(self) -> bool:
+        return self.cancelled or (
+            self.started_at is not None
+            and time.monotonic() - self.started_at >= self.timeout
+        )
+
+    def track_cursor(self, conn, cursor, *args) -> None:  # noqa: ARG002
+        """before_cursor_execute listener, also receives the statement, parameters,
+        context and executemany"""
+        with self.lock:
+            self.cursor = cursor
+
+    def set_timeout(self) -> None:
+        if self.dialect == "mssql":
+            self.set_mssql_query_timeout(self.timeout)
+            return
+        statement = SET_STATEMENTS.get(self.dialect)
+        if statement is None:
+            return
+        try:
+            self.connection.execute(
+                text(
+                    statement.format(
+                        seconds=self.timeout, milliseconds=self.timeout * 1000
+                    )
+                )
+            )
+        except Exception as e:
+            logger.warning(
+                f"Unable to set the statement timeout on {self.dialect}: {e}"
+            )
+
+    def set_mssql_query_timeout(self, seconds: int) -> None:
+        """The driver sends it as the query timeout of every statement, 0 disables it"""
+        try:
+            if hasattr(self.dbapi_connection, "_conn"):
+                # pymssql keeps it in the underlying _mssql connection
+                self.dbapi_connection._conn.query_timeout = seconds
+            else:
+                # pyodbc
+                self.dbapi_connection.timeout = seconds
+        except Exception as e:
+            logger.warning(f"Unable to set the query timeout on mssql: {e}")
+
+    def reset_timeout(self) -> None:
+        if self.dialect == "mssql":
+            self.set_mssql_query_timeout(0)
+            return
+        statement = RESET_STATEMENTS.get(self.dialect)
+        if statement is None:
+            return
+        try:
+            self.connection.execute(text(statement))
+        except Exception as e:
+            # Do not give the session back to the pool with the timeout still set
+            logger.warning(f"Unable to reset the statement timeout: {e}")
+            self.connection.invalidate()
+
+    def cancel(self) -> None:
+        """Runs in the watchdog thread, asks the database to stop the running statement"""
+        # Holds the lock so the statement can not finish and give the connection back
+        # to the pool, where the cancel would stop the query of the next request
+        with self.lock:
+            if self.finished or self.cursor is None:
+                return
+            self.cancelled = True
+            logger.info(f"Cancelling a {self.dialect} statement after {self.timeout}s")
+            try:
+                self.cancel_statement(self.cursor)
+            except Exception as e:
+                logger.warning(f"Unable to cancel the {self.dialect} statement: {e}")
+
+    def cancel_statement(self, cursor) -> None:
+        if self.dialect == "bigquery":
+            query_job = getattr(cursor, "_query_job", None)
+            if query_job is not None:
+                query_job.cancel()
+        elif self.dialect == "snowflake":
+            if cursor.sfqid:
+                cursor.abort_query(cursor.sfqid)
+        elif hasattr(self.dbapi_connection, "cancel"):
+            # psycopg2 connections of postgres and redshift
+            self.dbapi_connection.cancel()
+        elif hasattr(self.dbapi_connection, "interrupt"):
+            # sqlite and duckdb
+            self.dbapi_connection.interrupt()
+        elif hasattr(cursor, "cancel"):
+            # pyodbc, databricks
+            cursor.cancel()
+        elif hasattr(self.dbapi_connection, "_conn"):
+            # pymssql
+            self.dbapi_connection._conn.cancel()
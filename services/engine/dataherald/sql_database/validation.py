@@ -0,0 +1,122 @@
+"""Checks that a generated query is valid without running all of it"""
+
+import logging
+import os
+from enum import Enum
+
+from google.cloud.bigquery import QueryJobConfig
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+
+class SQLValidationMode(Enum):
+    EXPLAIN = "explain"
+    LIMIT = "limit"
+    EXECUTE = "execute"
+
+
+# Used by the db connections that do not set sql_validation_mode
+SQL_VALIDATION_MODE = os.environ.get(
+    "SQL_VALIDATION_MODE", SQLValidationMode.EXPLAIN.value
+)
+
+EXPLAIN_PREFIXES = {
+    "postgresql": "EXPLAIN",
+    "redshift": "EXPLAIN",
+    "mysql": "EXPLAIN",
+    "sqlite": "EXPLAIN QUERY PLAN",
+    "duckdb": "EXPLAIN",
+    "clickhouse": "EXPLAIN",
+    "awsathena": "EXPLAIN",
+    "snowflake": "EXPLAIN USING TEXT",
+}
+# Databricks returns the planning errors as the text of the plan instead of raising them,
+# so it is validated in limit mode
+
+# Dialects whose limit mode caps the rows with a session setting instead of wrapping the
+# query: MSSQL does not accept CTEs or an ORDER BY without TOP in a subquery and MySQL
+# rejects subqueries with duplicate column names, as two joined tables with an id column
+LIMIT_SETTINGS = {
+    "mssql": ("SET ROWCOUNT 1", "SET ROWCOUNT 0"),
+    "mysql": (
+        "SET SESSION sql_select_limit = 1",
+        "SET SESSION sql_select_limit = DEFAULT",
+    ),
+}
+
+
+def strip_query(query: str) -> str:
+    return query.strip().rstrip(";").strip()
+
+
+def get_limit_query(query: str) -> str:
+    # The line break keeps a trailing comment from hiding the closing parenthesis
+    # Wrapping adds no input of its own, the query is the one the caller would run anyway
+    return f"SELECT * FROM (\n{strip_query(query)}\n) AS validation_query LIMIT 1"  # noqa: S608
+
+
+def explain(connection: Connection, query: str) -> None:
+    """Asks the database to plan the query, which fails for invalid syntax, tables or
+    columns without reading any data"""
+    dialect = connection.dialect.name
+    query = strip_query(query)
+    if dialect == "bigquery":
+        cursor = connection.connection.cursor()
+        cursor.execute(
+            query, job_config=QueryJobConfig(dry_run=True, use_query_cache=False)
+        )
+        return
+    if dialect == "mssql":
+        connection.execute(text("SET SHOWPLAN_TEXT ON"))
+        try:
+            connection.execute(text(query)).fetchall()
+        finally:
+            try:
+                connection.execute(text("SET SHOWPLAN_TEXT OFF"))
+            except Exception as e:
+                # A session left in showplan mode plans every query instead of running it
+                logger.warning(f"Unable to reset the validation showplan: {e}")
+                connection.invalidate()
+        return
+    if dialect in EXPLAIN_PREFIXES:
+        connection.execute(text(f"{EXPLAIN_PREFIXES[dialect]} {query}")).fetchall()
+        return
+    validate_with_limit(connection, query)
+
+
+def validate_with_limit(connection: Connection, query: str) -> None:
+    """Runs the query reading at most one row. Outside of LIMIT_SETTINGS the query is
+    wrapped in a subquery, so it must be a single SELECT that the dialect accepts as a
+    derived table"""
+    settings = LIMIT_SETTINGS.get(connection.dialect.name)
+    if settings is None:
+        connection.execute(text(get_limit_query(query))).fetchall()
+        return
+    set_limit, reset_limit = settings
+    connection.execute(text(set_limit))
+    try:
+        connection.execute(text(strip_query(query))).fetchall()
+    finally:
+        try:
+            connection.execute(text(reset_limit))
+        except Exception as e:
+            # Do not give the session back to the pool with the row limit still set
+            logger.warning(f"Unable to reset the validation row limit: {e}")
+            connection.invalidate()
+
+
+def validate(connection: Connection, query: str, mode: str | None = None) -> None:
+    """Raises the database error when the query is not valid"""
+    mode = mode or SQL_VALIDATION_MODE
+    if mode == SQLValidationMode.EXPLAIN.value:
+        explain(connection, query)
+    elif mode == SQLValidationMode.LIMIT.value:
+        validate_with_limit(connection, query)
+    else:
+        # The rows are read and dropped batch by batch
+        result = connection.execution_options(stream_results=True).execute(text(query))
+        if result.returns_rows:
+            while result.fetchmany(1000):
+                pass
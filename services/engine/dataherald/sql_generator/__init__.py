@@ -1,5 +1,6 @@
 """Base class that all sql generation classes inherit from."""
 
+import asyncio
 import datetime
 import logging
 import os
@@ -180,6 +181,23 @@ class SQLGenerator(Component, ABC):
         """Generates a response to a user question."""
         pass
 
+    async def agenerate_response(
+        self,
+        user_prompt: Prompt,
+        database_connection: DatabaseConnection,
+        context: List[dict] = None,
+        metadata: dict = None,
+    ) -> SQLGeneration:
+        """Generates a response to a user question without blocking the event loop,
+        generators without an async agent run generate_response in a worker thread."""
+        return await asyncio.to_thread(
+            self.generate_response,
+            user_prompt,
+            database_connection,
+            context=context,
+            metadata=metadata,
+        )
+
     def stream_agent_steps(  # noqa: PLR0912, C901
         self,
         question: str,
@@ -29,12 +29,14 @@ def create_sql_query_status(
         sql_generation.status = "INVALID"
         sql_generation.error = "Sorry, we couldn't generate an SQL from your prompt"
     else:
+        timeout = int(os.getenv("SQL_EXECUTION_TIMEOUT", "60"))
         try:
             query = db.parser_to_filter_commands(query)
             run_with_timeout(
-                db.run_sql,
+                db.validate_sql,
                 args=(query,),
-                timeout_duration=int(os.getenv("SQL_EXECUTION_TIMEOUT", "60")),
+                kwargs={"timeout": timeout},
+                timeout_duration=timeout,
             )
             sql_generation.status = "VALID"
             sql_generation.error = None
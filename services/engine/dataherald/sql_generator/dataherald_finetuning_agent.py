@@ -1,14 +1,12 @@
+import asyncio
 import datetime
 import logging
 import os
 from functools import wraps
 from queue import Queue
-from threading import Thread
 from typing import Any, Callable, Dict, List, Type
 
-import numpy as np
 import openai
-import pandas as pd
 from google.api_core.exceptions import GoogleAPIError
 from langchain.agents.agent import AgentExecutor
 from langchain.agents.agent_toolkits.base import BaseToolkit
@@ -21,8 +19,8 @@ from langchain.callbacks.manager import (
 from langchain.chains.llm import LLMChain
 from langchain.tools.base import BaseTool
 from langchain_community.callbacks import get_openai_callback
-from langchain_openai import AzureOpenAIEmbeddings, OpenAIEmbeddings
-from openai import OpenAI
+from langchain_core.embeddings import Embeddings
+from openai import AsyncOpenAI, OpenAI
 from overrides import override
 from pydantic import BaseModel, Field
 from sql_metadata import Parser
@@ -30,13 +28,14 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from dataherald.context_store import ContextStore
 from dataherald.db import DB
-from dataherald.db_scanner.models.types import TableDescription, TableDescriptionStatus
-from dataherald.db_scanner.repository.base import TableDescriptionRepository
+from dataherald.db_scanner.models.types import TableDescription
 from dataherald.finetuning.openai_finetuning import OpenAIFineTuning
 from dataherald.repositories.finetunings import FinetuningsRepository
 from dataherald.repositories.sql_generations import (
     SQLGenerationRepository,
 )
+from dataherald.services.context_snapshots import ContextSnapshots
+from dataherald.services.table_embeddings import TableEmbeddingService
 from dataherald.sql_database.base import SQLDatabase, SQLInjectionError
 from dataherald.sql_database.models.types import (
     DatabaseConnection,
@@ -51,14 +50,16 @@ from dataherald.utils.agent_prompts import (
     FINETUNING_SYSTEM_INFORMATION,
     FORMAT_INSTRUCTIONS,
 )
+from dataherald.utils.embeddings import EmbeddingClients
 from dataherald.utils.models_context_window import OPENAI_FINETUNING_MODELS_WINDOW_SIZES
+from dataherald.utils.scheduler import GenerationScheduler
 from dataherald.utils.timeout_utils import run_with_timeout
 
 logger = logging.getLogger(__name__)
 
 
 TOP_K = SQLGenerator.get_upper_bound_limit()
-EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL","text-embedding-3-large")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-large")
 TOP_TABLES = 20
 
 
@@ -74,31 +75,49 @@ def replace_unprocessable_characters(text: str) -> str:
     return text.replace(r"\_", "_")
 
 
-def catch_exceptions():  # noqa: C901
-    def decorator(fn: Callable[[str], str]) -> Callable[[str], str]:  # noqa: C901
+def error_message(error: Exception) -> str:  # noqa: PLR0911
+    try:
+        raise error
+    except openai.AuthenticationError as e:
+        # Handle authentication error here
+        return f"OpenAI API authentication error: {e}"
+    except openai.RateLimitError as e:
+        # Handle API error here, e.g. retry or log
+        return f"OpenAI API request exceeded rate limit: {e}"
+    except openai.BadRequestError as e:
+        # Handle connection error here
+        return f"OpenAI API request timed out: {e}"
+    except openai.APIResponseValidationError as e:
+        # Handle rate limit error (we recommend using exponential backoff)
+        return f"OpenAI API response is invalid: {e}"
+    except openai.OpenAIError as e:
+        # Handle timeout error (we recommend using exponential backoff)
+        return f"OpenAI API returned an error: {e}"
+    except GoogleAPIError as e:
+        return f"Google API returned an error: {e}"
+    except SQLAlchemyError as e:
+        return f"Error: {e}"
+
+
+def catch_exceptions():
+    def decorator(fn: Callable[[str], str]) -> Callable[[str], str]:
+        if asyncio.iscoroutinefunction(fn):
+
+            @wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception as e:
+                    return error_message(e)
+
+            return async_wrapper
+
         @wraps(fn)
-        def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: PLR0911
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
             try:
                 return fn(*args, **kwargs)
-            except openai.AuthenticationError as e:
-                # Handle authentication error here
-                return f"OpenAI API authentication error: {e}"
-            except openai.RateLimitError as e:
-                # Handle API error here, e.g. retry or log
-                return f"OpenAI API request exceeded rate limit: {e}"
-            except openai.BadRequestError as e:
-                # Handle connection error here
-                return f"OpenAI API request timed out: {e}"
-            except openai.APIResponseValidationError as e:
-                # Handle rate limit error (we recommend using exponential backoff)
-                return f"OpenAI API response is invalid: {e}"
-            except openai.OpenAIError as e:
-                # Handle timeout error (we recommend using exponential backoff)
-                return f"OpenAI API returned an error: {e}"
-            except GoogleAPIError as e:
-                return f"Google API returned an error: {e}"
-            except SQLAlchemyError as e:
-                return f"Error: {e}"
+            except Exception as e:
+                return error_message(e)
 
         return wrapper
 
@@ -148,9 +167,9 @@ class SystemTime(BaseSQLDatabaseTool, BaseTool):
     async def _arun(
         self,
         tool_input: str = "",
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("SystemTime tool does not support async")
+        return self._run(tool_input)
 
 
 class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
@@ -163,7 +182,8 @@ class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
     Use this tool to identify the relevant tables for the given question.
     """
     db_scan: List[TableDescription]
-    embedding: OpenAIEmbeddings
+    embedding: Embeddings
+    table_embedding_service: TableEmbeddingService
     few_shot_examples: List[dict] | None = Field(exclude=True, default=None)
 
     def get_embedding(
@@ -173,16 +193,10 @@ class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
         text = text.replace("\n", " ")
         return self.embedding.embed_query(text)
 
-    def get_docs_embedding(
-        self,
-        docs: List[str],
-    ) -> List[List[float]]:
-        return self.embedding.embed_documents(docs)
-
-    def cosine_similarity(self, a: List[float], b: List[float]) -> float:
-        return round(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)), 4)
-
-    def similar_tables_based_on_few_shot_examples(self, df: pd.DataFrame) -> List[str]:
+    def similar_tables_based_on_few_shot_examples(
+        self, ranked_tables: List[tuple]
+    ) -> set:
+        """Moves the top tables used by the few-shot examples out of ranked_tables"""
         most_similar_tables = set()
         if self.few_shot_examples is not None:
             for example in self.few_shot_examples:
@@ -190,76 +204,75 @@ class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
                     tables = Parser(example["sql"]).tables
                 except Exception as e:
                     logger.error(f"Error parsing SQL: {str(e)}")
+                    continue
                 for table in tables:
-                    found_tables = df[df.table_name == table]
-                    for _, row in found_tables.iterrows():
-                        most_similar_tables.add((row["schema_name"], row["table_name"]))
-            df.drop(
-                df[
-                    df.table_name.isin([table[1] for table in most_similar_tables])
-                ].index,
-                inplace=True,
-            )
+                    for schema_name, table_name, _ in ranked_tables:
+                        if table_name == table:
+                            most_similar_tables.add((schema_name, table_name))
+            ranked_tables[:] = [
+                row
+                for row in ranked_tables
+                if row[1] not in {table[1] for table in most_similar_tables}
+            ]
         return most_similar_tables
 
-    @catch_exceptions()
-    def _run(  # noqa: PLR0912
-        self,
-        user_question: str,
-        run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
-    ) -> str:
-        """Use the concatenation of table name, columns names, and the description of the table as the table representation"""
-        question_embedding = self.get_embedding(user_question)
-        table_representations = []
-        for table in self.db_scan:
-            col_rep = ""
-            for column in table.columns:
-                if column.description:
-                    col_rep += f"{column.name}: {column.description}, "
-                else:
-                    col_rep += f"{column.name}, "
-            if table.description:
-                table_rep = f"Table {table.table_name} contain columns: [{col_rep}], this tables has: {table.description}"
-            else:
-                table_rep = f"Table {table.table_name} contain columns: [{col_rep}]"
-            table_representations.append(
-                [table.schema_name, table.table_name, table_rep]
+    def rank_tables(self, question_embedding: List[float]) -> str:
+        table_ranker = self.table_embedding_service.get_ranker(self.db_scan)
+        indexes, similarities = table_ranker.top_k(question_embedding, TOP_TABLES)
+        ranked_tables = [
+            (
+                self.db_scan[index].schema_name,
+                self.db_scan[index].table_name,
+                round(float(similarity), 4),
             )
-        df = pd.DataFrame(
-            table_representations,
-            columns=["schema_name", "table_name", "table_representation"],
-        )
-        df["table_embedding"] = self.get_docs_embedding(df.table_representation)
-        df["similarities"] = df.table_embedding.apply(
-            lambda x: self.cosine_similarity(x, question_embedding)
+            for index, similarity in zip(indexes, similarities, strict=True)
+        ]
+        top_similarity = ranked_tables[0][2] if ranked_tables else 0.0
+        most_similar_tables = self.similar_tables_based_on_few_shot_examples(
+            ranked_tables
         )
-        df = df.sort_values(by="similarities", ascending=True)
-        df = df.tail(TOP_TABLES)
-        most_similar_tables = self.similar_tables_based_on_few_shot_examples(df)
+        # Least relevant tables first, the most relevant ones are closest to the question
+        ranked_tables.reverse()
         table_relevance = ""
-        for _, row in df.iterrows():
-            if row["schema_name"] is not None:
-                table_name = row["schema_name"] + "." + row["table_name"]
+        for schema_name, name, similarity in ranked_tables:
+            if schema_name is not None:
+                table_name = schema_name + "." + name
             else:
-                table_name = row["table_name"]
-            table_relevance += (
-                f'Table: `{table_name}`, relevance score: {row["similarities"]}\n'
-            )
+                table_name = name
+            table_relevance += f"Table: `{table_name}`, relevance score: {similarity}\n"
         if len(most_similar_tables) > 0:
+            max_similarity = max(
+                (row[2] for row in ranked_tables), default=top_similarity
+            )
             for table in most_similar_tables:
                 if table[0] is not None:
                     table_name = table[0] + "." + table[1]
                 else:
                     table_name = table[1]
-                table_relevance += f"Table: `{table_name}`, relevance score: {max(df['similarities'])}\n"
+                table_relevance += (
+                    f"Table: `{table_name}`, relevance score: {max_similarity}\n"
+                )
         return table_relevance
 
+    @catch_exceptions()
+    def _run(
+        self,
+        user_question: str,
+        run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
+    ) -> str:
+        """Use the concatenation of table name, columns names, and the description of the table as the table representation"""
+        return self.rank_tables(self.get_embedding(user_question))
+
+    @catch_exceptions()
     async def _arun(
         self,
         user_question: str = "",
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("TablesSQLDatabaseTool does not support async")
+        question_embedding = await self.embedding.aembed_query(
+            user_question.replace("\n", " ")
+        )
+        return await asyncio.to_thread(self.rank_tables, question_embedding)
 
 
 class QuerySQLDataBaseTool(BaseSQLDatabaseTool, BaseTool):
@@ -285,12 +298,13 @@ class QuerySQLDataBaseTool(BaseSQLDatabaseTool, BaseTool):
         if "```sql" in query:
             query = query.replace("```sql", "").replace("```", "")
 
+        timeout = int(os.getenv("SQL_EXECUTION_TIMEOUT", "60"))
         try:
             return run_with_timeout(
                 self.db.run_sql,
                 args=(query,),
-                kwargs={"top_k": TOP_K},
-                timeout_duration=int(os.getenv("SQL_EXECUTION_TIMEOUT", "60")),
+                kwargs={"top_k": TOP_K, "timeout": timeout},
+                timeout_duration=timeout,
             )[0]
         except TimeoutError:
             return "SQL query execution time exceeded, proceed without query execution"
@@ -298,9 +312,9 @@ class QuerySQLDataBaseTool(BaseSQLDatabaseTool, BaseTool):
     async def _arun(
         self,
         query: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("QuerySQLDataBaseTool does not support async")
+        return await asyncio.to_thread(self._run, query)
 
 
 class GenerateSQL(BaseSQLDatabaseTool, BaseTool):
@@ -319,49 +333,59 @@ class GenerateSQL(BaseSQLDatabaseTool, BaseTool):
     db_scan: List[TableDescription]
     api_key: str = Field(exclude=True)
     openai_fine_tuning: OpenAIFineTuning = Field(exclude=True)
-    embedding: OpenAIEmbeddings = Field(exclude=True)
+    embedding: Embeddings = Field(exclude=True)
 
-    @catch_exceptions()
-    def _run(
-        self,
-        question: str = "",
-        run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
-    ) -> str:
-        """Execute the query, return the results or an error message."""
-        table_representations = []
-        for table in self.db_scan:
-            table_representations.append(
-                self.openai_fine_tuning.create_table_representation(table)
-            )
-        table_embeddings = self.embedding.embed_documents(table_representations)
+    def create_messages(self, question: str) -> List[dict]:
+        table_ranker = self.openai_fine_tuning.table_embedding_service.get_ranker(
+            self.db_scan
+        )
         system_prompt = (
             FINETUNING_SYSTEM_INFORMATION
             + self.openai_fine_tuning.format_dataset(
                 self.db_scan,
-                table_embeddings,
+                table_ranker,
                 question,
                 OPENAI_FINETUNING_MODELS_WINDOW_SIZES[self.model_name] - 500,
             )
         )
         user_prompt = "User Question: " + question + "\n SQL: "
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+
+    @catch_exceptions()
+    def _run(
+        self,
+        question: str = "",
+        run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
+    ) -> str:
+        """Execute the query, return the results or an error message."""
         client = OpenAI(api_key=self.api_key)
         response = client.chat.completions.create(
             model=self.finetuning_model_id,
             temperature=0.0,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
+            messages=self.create_messages(question),
         )
         returned_sql = response.choices[0].message.content
         return f"```sql\n{returned_sql}```"
 
+    @catch_exceptions()
     async def _arun(
         self,
-        tool_input: str = "",
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        question: str = "",
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("GenerateSQL tool does not support async")
+        """Execute the query, return the results or an error message."""
+        messages = await asyncio.to_thread(self.create_messages, question)
+        client = AsyncOpenAI(api_key=self.api_key)
+        response = await client.chat.completions.create(
+            model=self.finetuning_model_id,
+            temperature=0.0,
+            messages=messages,
+        )
+        returned_sql = response.choices[0].message.content
+        return f"```sql\n{returned_sql}```"
 
 
 class SchemaSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
@@ -418,9 +442,9 @@ class SchemaSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
     async def _arun(
         self,
         table_name: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("SchemaSQLDatabaseTool does not support async")
+        return self._run(table_name)
 
 
 class SQLDatabaseToolkit(BaseToolkit):
@@ -434,7 +458,7 @@ class SQLDatabaseToolkit(BaseToolkit):
     use_finetuned_model_only: bool = Field(exclude=True, default=None)
     model_name: str = Field(exclude=True)
     openai_fine_tuning: OpenAIFineTuning = Field(exclude=True)
-    embedding: OpenAIEmbeddings = Field(exclude=True)
+    embedding: Embeddings = Field(exclude=True)
     few_shot_examples: List[dict] | None = Field(exclude=True, default=None)
 
     @property
@@ -458,6 +482,7 @@ class SQLDatabaseToolkit(BaseToolkit):
                     db=self.db,
                     db_scan=self.db_scan,
                     embedding=self.embedding,
+                    table_embedding_service=self.openai_fine_tuning.table_embedding_service,
                     few_shot_examples=self.few_shot_examples,
                 )
             )
@@ -537,47 +562,21 @@ class DataheraldFinetuningAgent(SQLGenerator):
             **(agent_executor_kwargs or {}),
         )
 
-    @override
-    def generate_response(
+    def create_agent_executor(
         self,
         user_prompt: Prompt,
         database_connection: DatabaseConnection,
-        context: List[dict] = None,  # noqa: ARG002
-        metadata: dict = None,
-    ) -> SQLGeneration:
-        """
-        generate_response generates a response to a user question using a Finetuning model.
-
-        Args:
-            user_question (Question): The user question to generate a response to.
-            database_connection (DatabaseConnection): The database connection to use.
-            context (List[dict], optional): The context to use. Defaults to None.
-            generate_csv (bool, optional): Whether to generate a CSV. Defaults to False.
-
-        Returns:
-            Response: The response to the user question.
-        """
+    ) -> AgentExecutor:
         context_store = self.system.instance(ContextStore)
         storage = self.system.instance(DB)
-        response = SQLGeneration(
-            prompt_id=user_prompt.id,
-            created_at=datetime.datetime.now(),
-            llm_config=self.llm_config,
-            finetuning_id=self.finetuning_id,
-        )
         self.llm = self.model.get_model(
             database_connection=database_connection,
             temperature=0,
             model_name=self.llm_config.llm_name,
             api_base=self.llm_config.api_base,
         )
-        repository = TableDescriptionRepository(storage)
-        db_scan = repository.get_all_tables_by_db(
-            {
-                "db_connection_id": str(database_connection.id),
-                "status": TableDescriptionStatus.SCANNED.value,
-            }
-        )
+        snapshot = ContextSnapshots.get(storage, database_connection.id)
+        db_scan = list(snapshot.tables)
         if not db_scan:
             raise ValueError("No scanned tables found for database")
         db_scan = SQLGenerator.filter_tables_by_schema(
@@ -589,6 +588,9 @@ class DataheraldFinetuningAgent(SQLGenerator):
         finetunings_repository = FinetuningsRepository(storage)
         finetuning = finetunings_repository.find_by_id(self.finetuning_id)
         openai_fine_tuning = OpenAIFineTuning(self.system, storage, finetuning)
+        openai_fine_tuning.table_embedding_service.table_representations = (
+            snapshot.table_representations
+        )
         finetuning = openai_fine_tuning.retrieve_finetuning_job()
         if finetuning.status != FineTuningStatus.SUCCEEDED.value:
             raise FinetuningNotAvailableError(
@@ -596,16 +598,11 @@ class DataheraldFinetuningAgent(SQLGenerator):
                 f"Finetuning should have the status {FineTuningStatus.SUCCEEDED.value} to generate SQL queries."
             )
         self.database = SQLDatabase.get_sql_engine(database_connection)
-        if self.system.settings["azure_api_key"] is not None:
-            embedding = AzureOpenAIEmbeddings(
-                openai_api_key=database_connection.decrypt_api_key(),
-                model=EMBEDDING_MODEL,
-            )
-        else:
-            embedding = OpenAIEmbeddings(
-                openai_api_key=database_connection.decrypt_api_key(),
-                model=EMBEDDING_MODEL,
-            )
+        embedding = EmbeddingClients.get(
+            database_connection.decrypt_api_key(),
+            EMBEDDING_MODEL,
+            azure=self.system.settings["azure_api_key"] is not None,
+        )
         toolkit = SQLDatabaseToolkit(
             db=self.database,
             instructions=instructions,
@@ -625,6 +622,58 @@ class DataheraldFinetuningAgent(SQLGenerator):
         )
         agent_executor.return_intermediate_steps = True
         agent_executor.handle_parsing_errors = ERROR_PARSING_MESSAGE
+        return agent_executor
+
+    def complete_response(
+        self, response: SQLGeneration, result: dict, cb: Any
+    ) -> SQLGeneration:
+        sql_query = ""
+        if "```sql" in result["output"]:
+            sql_query = self.remove_markdown(result["output"])
+        else:
+            sql_query = self.extract_query_from_intermediate_steps(
+                result["intermediate_steps"]
+            )
+        logger.info(f"cost: {str(cb.total_cost)} tokens: {str(cb.total_tokens)}")
+        response.sql = replace_unprocessable_characters(sql_query)
+        response.tokens_used = cb.total_tokens
+        response.completed_at = datetime.datetime.now()
+        response.intermediate_steps = self.construct_intermediate_steps(
+            result["intermediate_steps"], FINETUNING_AGENT_SUFFIX
+        )
+        return self.create_sql_query_status(
+            self.database,
+            response.sql,
+            response,
+        )
+
+    @override
+    def generate_response(
+        self,
+        user_prompt: Prompt,
+        database_connection: DatabaseConnection,
+        context: List[dict] = None,  # noqa: ARG002
+        metadata: dict = None,
+    ) -> SQLGeneration:
+        """
+        generate_response generates a response to a user question using a Finetuning model.
+
+        Args:
+            user_question (Question): The user question to generate a response to.
+            database_connection (DatabaseConnection): The database connection to use.
+            context (List[dict], optional): The context to use. Defaults to None.
+            generate_csv (bool, optional): Whether to generate a CSV. Defaults to False.
+
+        Returns:
+            Response: The response to the user question.
+        """
+        response = SQLGeneration(
+            prompt_id=user_prompt.id,
+            created_at=datetime.datetime.now(),
+            llm_config=self.llm_config,
+            finetuning_id=self.finetuning_id,
+        )
+        agent_executor = self.create_agent_executor(user_prompt, database_connection)
         with get_openai_callback() as cb:
             try:
                 result = agent_executor.invoke(
@@ -645,25 +694,46 @@ class DataheraldFinetuningAgent(SQLGenerator):
                     status="INVALID",
                     error=str(e),
                 )
-        sql_query = ""
-        if "```sql" in result["output"]:
-            sql_query = self.remove_markdown(result["output"])
-        else:
-            sql_query = self.extract_query_from_intermediate_steps(
-                result["intermediate_steps"]
-            )
-        logger.info(f"cost: {str(cb.total_cost)} tokens: {str(cb.total_tokens)}")
-        response.sql = replace_unprocessable_characters(sql_query)
-        response.tokens_used = cb.total_tokens
-        response.completed_at = datetime.datetime.now()
-        response.intermediate_steps = self.construct_intermediate_steps(
-            result["intermediate_steps"], FINETUNING_AGENT_SUFFIX
+        return self.complete_response(response, result, cb)
+
+    @override
+    async def agenerate_response(
+        self,
+        user_prompt: Prompt,
+        database_connection: DatabaseConnection,
+        context: List[dict] = None,  # noqa: ARG002
+        metadata: dict = None,
+    ) -> SQLGeneration:
+        response = SQLGeneration(
+            prompt_id=user_prompt.id,
+            created_at=datetime.datetime.now(),
+            llm_config=self.llm_config,
+            finetuning_id=self.finetuning_id,
         )
-        return self.create_sql_query_status(
-            self.database,
-            response.sql,
-            response,
+        agent_executor = await asyncio.to_thread(
+            self.create_agent_executor, user_prompt, database_connection
         )
+        with get_openai_callback() as cb:
+            try:
+                result = await agent_executor.ainvoke(
+                    {"input": user_prompt.text}, {"metadata": metadata}
+                )
+                result = self.check_for_time_out_or_tool_limit(result)
+            except SQLInjectionError as e:
+                raise SQLInjectionError(e) from e
+            except EngineTimeOutORItemLimitError as e:
+                raise EngineTimeOutORItemLimitError(e) from e
+            except Exception as e:
+                return SQLGeneration(
+                    prompt_id=user_prompt.id,
+                    tokens_used=cb.total_tokens,
+                    finetuning_id=self.finetuning_id,
+                    completed_at=datetime.datetime.now(),
+                    sql="",
+                    status="INVALID",
+                    error=str(e),
+                )
+        return await asyncio.to_thread(self.complete_response, response, result, cb)
 
     @override
     def stream_response(
@@ -684,13 +754,8 @@ class DataheraldFinetuningAgent(SQLGenerator):
             api_base=self.llm_config.api_base,
             streaming=True,
         )
-        repository = TableDescriptionRepository(storage)
-        db_scan = repository.get_all_tables_by_db(
-            {
-                "db_connection_id": str(database_connection.id),
-                "status": TableDescriptionStatus.SCANNED.value,
-            }
-        )
+        snapshot = ContextSnapshots.get(storage, database_connection.id)
+        db_scan = list(snapshot.tables)
         if not db_scan:
             raise ValueError("No scanned tables found for database")
         db_scan = SQLGenerator.filter_tables_by_schema(
@@ -702,6 +767,9 @@ class DataheraldFinetuningAgent(SQLGenerator):
         finetunings_repository = FinetuningsRepository(storage)
         finetuning = finetunings_repository.find_by_id(self.finetuning_id)
         openai_fine_tuning = OpenAIFineTuning(self.system, storage, finetuning)
+        openai_fine_tuning.table_embedding_service.table_representations = (
+            snapshot.table_representations
+        )
         finetuning = openai_fine_tuning.retrieve_finetuning_job()
         if finetuning.status != FineTuningStatus.SUCCEEDED.value:
             raise FinetuningNotAvailableError(
@@ -709,16 +777,11 @@ class DataheraldFinetuningAgent(SQLGenerator):
                 f"Finetuning should have the status {FineTuningStatus.SUCCEEDED.value} to generate SQL queries."
             )
         self.database = SQLDatabase.get_sql_engine(database_connection)
-        if self.system.settings["azure_api_key"] is not None:
-            embedding = AzureOpenAIEmbeddings(
-                openai_api_key=database_connection.decrypt_api_key(),
-                model=EMBEDDING_MODEL,
-            )
-        else:
-            embedding = OpenAIEmbeddings(
-                openai_api_key=database_connection.decrypt_api_key(),
-                model=EMBEDDING_MODEL,
-            )
+        embedding = EmbeddingClients.get(
+            database_connection.decrypt_api_key(),
+            EMBEDDING_MODEL,
+            azure=self.system.settings["azure_api_key"] is not None,
+        )
         toolkit = SQLDatabaseToolkit(
             db=self.database,
             instructions=instructions,
@@ -737,15 +800,12 @@ class DataheraldFinetuningAgent(SQLGenerator):
         )
         agent_executor.return_intermediate_steps = True
         agent_executor.handle_parsing_errors = ERROR_PARSING_MESSAGE
-        thread = Thread(
-            target=self.stream_agent_steps,
-            args=(
-                user_prompt.text,
-                agent_executor,
-                response,
-                sql_generation_repository,
-                queue,
-                metadata,
-            ),
+        GenerationScheduler.get().submit(
+            self.stream_agent_steps,
+            user_prompt.text,
+            agent_executor,
+            response,
+            sql_generation_repository,
+            queue,
+            metadata,
         )
-        thread.start()
@@ -1,15 +1,13 @@
+import asyncio
 import datetime
 import difflib
 import logging
 import os
 from functools import wraps
 from queue import Queue
-from threading import Thread
 from typing import Any, Callable, Dict, List
 
-import numpy as np
 import openai
-import pandas as pd
 from google.api_core.exceptions import GoogleAPIError
 from langchain.agents.agent import AgentExecutor
 from langchain.agents.agent_toolkits.base import BaseToolkit
@@ -22,7 +20,7 @@ from langchain.callbacks.manager import (
 from langchain.chains.llm import LLMChain
 from langchain.tools.base import BaseTool
 from langchain_community.callbacks import get_openai_callback
-from langchain_openai import AzureOpenAIEmbeddings, OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
 from overrides import override
 from pydantic import BaseModel, Field
 from sql_metadata import Parser
@@ -30,11 +28,12 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from dataherald.context_store import ContextStore
 from dataherald.db import DB
-from dataherald.db_scanner.models.types import TableDescription, TableDescriptionStatus
-from dataherald.db_scanner.repository.base import TableDescriptionRepository
+from dataherald.db_scanner.models.types import TableDescription
 from dataherald.repositories.sql_generations import (
     SQLGenerationRepository,
 )
+from dataherald.services.context_snapshots import ContextSnapshots
+from dataherald.services.table_embeddings import TableEmbeddingService
 from dataherald.sql_database.base import SQLDatabase, SQLInjectionError
 from dataherald.sql_database.models.types import (
     DatabaseConnection,
@@ -52,43 +51,63 @@ from dataherald.utils.agent_prompts import (
     SUFFIX_WITH_FEW_SHOT_SAMPLES,
     SUFFIX_WITHOUT_FEW_SHOT_SAMPLES,
 )
+from dataherald.utils.embeddings import EmbeddingClients
+from dataherald.utils.scheduler import GenerationScheduler
 from dataherald.utils.timeout_utils import run_with_timeout
 
 logger = logging.getLogger(__name__)
 
 
 TOP_K = SQLGenerator.get_upper_bound_limit()
-EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL","text-embedding-3-large")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-large")
 TOP_TABLES = 20
 
 
-def catch_exceptions():  # noqa: C901
-    def decorator(fn: Callable[[str], str]) -> Callable[[str], str]:  # noqa: C901
+def error_message(error: Exception) -> str:  # noqa: PLR0911
+    try:
+        raise error
+    except openai.AuthenticationError as e:
+        # Handle authentication error here
+        return f"OpenAI API authentication error: {e}"
+    except openai.RateLimitError as e:
+        # Handle API error here, e.g. retry or log
+        return f"OpenAI API request exceeded rate limit: {e}"
+    except openai.BadRequestError as e:
+        # Handle connection error here
+        return f"OpenAI API request timed out: {e}"
+    except openai.APIResponseValidationError as e:
+        # Handle rate limit error (we recommend using exponential backoff)
+        return f"OpenAI API response is invalid: {e}"
+    except openai.OpenAIError as e:
+        # Handle timeout error (we recommend using exponential backoff)
+        return f"OpenAI API returned an error: {e}"
+    except GoogleAPIError as e:
+        return f"Google API returned an error: {e}"
+    except SQLAlchemyError as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error: {e}"
+
+
+def catch_exceptions():
+    def decorator(fn: Callable[[str], str]) -> Callable[[str], str]:
+        if asyncio.iscoroutinefunction(fn):
+
+            @wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception as e:
+                    return error_message(e)
+
+            return async_wrapper
+
         @wraps(fn)
-        def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: PLR0911
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
             try:
                 return fn(*args, **kwargs)
-            except openai.AuthenticationError as e:
-                # Handle authentication error here
-                return f"OpenAI API authentication error: {e}"
-            except openai.RateLimitError as e:
-                # Handle API error here, e.g. retry or log
-                return f"OpenAI API request exceeded rate limit: {e}"
-            except openai.BadRequestError as e:
-                # Handle connection error here
-                return f"OpenAI API request timed out: {e}"
-            except openai.APIResponseValidationError as e:
-                # Handle rate limit error (we recommend using exponential backoff)
-                return f"OpenAI API response is invalid: {e}"
-            except openai.OpenAIError as e:
-                # Handle timeout error (we recommend using exponential backoff)
-                return f"OpenAI API returned an error: {e}"
-            except GoogleAPIError as e:
-                return f"Google API returned an error: {e}"
-            except SQLAlchemyError as e:
-                return f"Error: {e}"
             except Exception as e:
-                return f"Error: {e}"
+                return error_message(e)
 
         return wrapper
 
@@ -137,9 +156,9 @@ class SystemTime(BaseSQLDatabaseTool, BaseTool):
     async def _arun(
         self,
         tool_input: str = "",
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("GetCurrentTimeTool does not support async")
+        return self._run(tool_input)
 
 
 class QuerySQLDataBaseTool(BaseSQLDatabaseTool, BaseTool):
@@ -166,12 +185,13 @@ class QuerySQLDataBaseTool(BaseSQLDatabaseTool, BaseTool):
         if "```sql" in query:
             query = query.replace("```sql", "").replace("```", "")
 
+        timeout = int(os.getenv("SQL_EXECUTION_TIMEOUT", "60"))
         try:
             return run_with_timeout(
                 self.db.run_sql,
                 args=(query,),
-                kwargs={"top_k": top_k},
-                timeout_duration=int(os.getenv("SQL_EXECUTION_TIMEOUT", "60")),
+                kwargs={"top_k": top_k, "timeout": timeout},
+                timeout_duration=timeout,
             )[0]
         except TimeoutError:
             return "SQL query execution time exceeded, proceed without query execution"
@@ -179,9 +199,9 @@ class QuerySQLDataBaseTool(BaseSQLDatabaseTool, BaseTool):
     async def _arun(
         self,
         query: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("QuerySQLDataBaseTool does not support async")
+        return await asyncio.to_thread(self._run, query)
 
 
 class GetUserInstructions(BaseSQLDatabaseTool, BaseTool):
@@ -208,10 +228,10 @@ class GetUserInstructions(BaseSQLDatabaseTool, BaseTool):
 
     async def _arun(
         self,
-        tool_input: str = "",  # noqa: ARG002
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        tool_input: str = "",
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("GetUserInstructions does not support async")
+        return self._run(tool_input)
 
 
 class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
@@ -224,7 +244,8 @@ class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
     Use this tool to identify the relevant tables for the given question.
     """
     db_scan: List[TableDescription]
-    embedding: OpenAIEmbeddings
+    embedding: Embeddings
+    table_embedding_service: TableEmbeddingService
     few_shot_examples: List[dict] | None = Field(exclude=True, default=None)
 
     def get_embedding(
@@ -234,16 +255,10 @@ class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
         text = text.replace("\n", " ")
         return self.embedding.embed_query(text)
 
-    def get_docs_embedding(
-        self,
-        docs: List[str],
-    ) -> List[List[float]]:
-        return self.embedding.embed_documents(docs)
-
-    def cosine_similarity(self, a: List[float], b: List[float]) -> float:
-        return round(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)), 4)
-
-    def similar_tables_based_on_few_shot_examples(self, df: pd.DataFrame) -> List[str]:
+    def similar_tables_based_on_few_shot_examples(
+        self, ranked_tables: List[tuple]
+    ) -> set:
+        """Moves the top tables used by the few-shot examples out of ranked_tables"""
         most_similar_tables = set()
         if self.few_shot_examples is not None:
             for example in self.few_shot_examples:
@@ -251,76 +266,73 @@ class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
                     tables = Parser(example["sql"]).tables
                 except Exception as e:
                     logger.error(f"Error parsing SQL: {str(e)}")
+                    continue
                 for table in tables:
-                    found_tables = df[df.table_name == table]
-                    for _, row in found_tables.iterrows():
-                        most_similar_tables.add((row["schema_name"], row["table_name"]))
-            df.drop(
-                df[
-                    df.table_name.isin([table[1] for table in most_similar_tables])
-                ].index,
-                inplace=True,
-            )
+                    for schema_name, table_name, _ in ranked_tables:
+                        if table_name == table:
+                            most_similar_tables.add((schema_name, table_name))
+            ranked_tables[:] = [
+                row
+                for row in ranked_tables
+                if row[1] not in {table[1] for table in most_similar_tables}
+            ]
         return most_similar_tables
 
-    @catch_exceptions()
-    def _run(  # noqa: PLR0912
-        self,
-        user_question: str,
-        run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
-    ) -> str:
-        """Use the concatenation of table name, columns names, and the description of the table as the table representation"""
-        question_embedding = self.get_embedding(user_question)
-        table_representations = []
-        for table in self.db_scan:
-            col_rep = ""
-            for column in table.columns:
-                if column.description is not None:
-                    col_rep += f"{column.name}: {column.description}, "
-                else:
-                    col_rep += f"{column.name}, "
-            if table.description is not None:
-                table_rep = f"Table {table.table_name} contain columns: [{col_rep}], this tables has: {table.description}"
-            else:
-                table_rep = f"Table {table.table_name} contain columns: [{col_rep}]"
-            table_representations.append(
-                [table.schema_name, table.table_name, table_rep]
+    def rank_tables(self, question_embedding: List[float]) -> str:
+        table_ranker = self.table_embedding_service.get_ranker(self.db_scan)
+        indexes, similarities = table_ranker.top_k(question_embedding, TOP_TABLES)
+        ranked_tables = [
+            (
+                self.db_scan[index].schema_name,
+                self.db_scan[index].table_name,
+                round(float(similarity), 4),
             )
-        df = pd.DataFrame(
-            table_representations,
-            columns=["schema_name", "table_name", "table_representation"],
-        )
-        df["table_embedding"] = self.get_docs_embedding(df.table_representation)
-        df["similarities"] = df.table_embedding.apply(
-            lambda x: self.cosine_similarity(x, question_embedding)
+            for index, similarity in zip(indexes, similarities, strict=True)
+        ]
+        top_similarity = ranked_tables[0][2] if ranked_tables else 0.0
+        most_similar_tables = self.similar_tables_based_on_few_shot_examples(
+            ranked_tables
         )
-        df = df.sort_values(by="similarities", ascending=False)
-        df = df.head(TOP_TABLES)
-        most_similar_tables = self.similar_tables_based_on_few_shot_examples(df)
         table_relevance = ""
-        for _, row in df.iterrows():
-            if row["schema_name"] is not None:
-                table_name = row["schema_name"] + "." + row["table_name"]
+        for schema_name, name, similarity in ranked_tables:
+            if schema_name is not None:
+                table_name = schema_name + "." + name
             else:
-                table_name = row["table_name"]
-            table_relevance += (
-                f'Table: `{table_name}`, relevance score: {row["similarities"]}\n'
-            )
+                table_name = name
+            table_relevance += f"Table: `{table_name}`, relevance score: {similarity}\n"
         if len(most_similar_tables) > 0:
+            max_similarity = max(
+                (row[2] for row in ranked_tables), default=top_similarity
+            )
             for table in most_similar_tables:
                 if table[0] is not None:
                     table_name = table[0] + "." + table[1]
                 else:
                     table_name = table[1]
-                table_relevance += f"Table: `{table_name}`, relevance score: {max(df['similarities'])}\n"
+                table_relevance += (
+                    f"Table: `{table_name}`, relevance score: {max_similarity}\n"
+                )
         return table_relevance
 
+    @catch_exceptions()
+    def _run(
+        self,
+        user_question: str,
+        run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
+    ) -> str:
+        """Use the concatenation of table name, columns names, and the description of the table as the table representation"""
+        return self.rank_tables(self.get_embedding(user_question))
+
+    @catch_exceptions()
     async def _arun(
         self,
         user_question: str = "",
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("TablesSQLDatabaseTool does not support async")
+        question_embedding = await self.embedding.aembed_query(
+            user_question.replace("\n", " ")
+        )
+        return await asyncio.to_thread(self.rank_tables, question_embedding)
 
 
 class ColumnEntityChecker(BaseSQLDatabaseTool, BaseTool):
@@ -395,9 +407,9 @@ class ColumnEntityChecker(BaseSQLDatabaseTool, BaseTool):
     async def _arun(
         self,
         tool_input: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("ColumnEntityChecker does not support async")
+        return await asyncio.to_thread(self._run, tool_input)
 
 
 class SchemaSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
@@ -454,9 +466,9 @@ class SchemaSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
     async def _arun(
         self,
         table_name: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("SchemaSQLDatabaseTool does not support async")
+        return self._run(table_name)
 
 
 class InfoRelevantColumns(BaseSQLDatabaseTool, BaseTool):
@@ -517,9 +529,9 @@ class InfoRelevantColumns(BaseSQLDatabaseTool, BaseTool):
     async def _arun(
         self,
         table_name: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("InfoRelevantColumnsTool does not support async")
+        return self._run(table_name)
 
 
 class GetFewShotExamples(BaseSQLDatabaseTool, BaseTool):
@@ -558,9 +570,9 @@ class GetFewShotExamples(BaseSQLDatabaseTool, BaseTool):
     async def _arun(
         self,
         number_of_samples: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("GetFewShotExamplesTool does not support async")
+        return self._run(number_of_samples)
 
 
 class SQLDatabaseToolkit(BaseToolkit):
@@ -571,7 +583,8 @@ class SQLDatabaseToolkit(BaseToolkit):
     few_shot_examples: List[dict] | None = Field(exclude=True, default=None)
     instructions: List[dict] | None = Field(exclude=True, default=None)
     db_scan: List[TableDescription] = Field(exclude=True)
-    embedding: OpenAIEmbeddings = Field(exclude=True)
+    embedding: Embeddings = Field(exclude=True)
+    table_embedding_service: TableEmbeddingService = Field(exclude=True)
     is_multiple_schema: bool = False
 
     @property
@@ -602,6 +615,7 @@ class SQLDatabaseToolkit(BaseToolkit):
             context=self.context,
             db_scan=self.db_scan,
             embedding=self.embedding,
+            table_embedding_service=self.table_embedding_service,
             few_shot_examples=self.few_shot_examples,
         )
         tools.append(tables_sql_db_tool)
@@ -634,6 +648,7 @@ class DataheraldSQLAgent(SQLGenerator):
     """Dataherald SQL agent"""
 
     max_number_of_examples: int = 5  # maximum number of question/SQL pairs
+    number_of_samples: int = 0
     llm: Any = None
 
     def remove_duplicate_examples(self, fewshot_exmaples: List[dict]) -> List[dict]:
@@ -710,34 +725,22 @@ class DataheraldSQLAgent(SQLGenerator):
             **(agent_executor_kwargs or {}),
         )
 
-    @override
-    def generate_response(  # noqa: PLR0912
+    def create_agent_executor(
         self,
         user_prompt: Prompt,
         database_connection: DatabaseConnection,
         context: List[dict] = None,
-        metadata: dict = None,
-    ) -> SQLGeneration:  # noqa: PLR0912
+    ) -> AgentExecutor:
         context_store = self.system.instance(ContextStore)
         storage = self.system.instance(DB)
-        response = SQLGeneration(
-            prompt_id=user_prompt.id,
-            llm_config=self.llm_config,
-            created_at=datetime.datetime.now(),
-        )
         self.llm = self.model.get_model(
             database_connection=database_connection,
             temperature=0,
             model_name=self.llm_config.llm_name,
             api_base=self.llm_config.api_base,
         )
-        repository = TableDescriptionRepository(storage)
-        db_scan = repository.get_all_tables_by_db(
-            {
-                "db_connection_id": str(database_connection.id),
-                "status": TableDescriptionStatus.SCANNED.value,
-            }
-        )
+        snapshot = ContextSnapshots.get(storage, database_connection.id)
+        db_scan = list(snapshot.tables)
         if not db_scan:
             raise ValueError("No scanned tables found for database")
         db_scan = SQLGenerator.filter_tables_by_schema(
@@ -748,67 +751,46 @@ class DataheraldSQLAgent(SQLGenerator):
         )
         if few_shot_examples is not None:
             new_fewshot_examples = self.remove_duplicate_examples(few_shot_examples)
-            number_of_samples = len(new_fewshot_examples)
+            self.number_of_samples = len(new_fewshot_examples)
         else:
             new_fewshot_examples = None
-            number_of_samples = 0
+            self.number_of_samples = 0
         logger.info(f"Generating SQL response to question: {str(user_prompt.dict())}")
         self.database = SQLDatabase.get_sql_engine(database_connection)
         # Set Embeddings class depending on azure / not azure
-        if self.system.settings["azure_api_key"] is not None:
-            toolkit = SQLDatabaseToolkit(
-                db=self.database,
-                context=context,
-                few_shot_examples=new_fewshot_examples,
-                instructions=instructions,
-                is_multiple_schema=True if user_prompt.schemas else False,
-                db_scan=db_scan,
-                embedding=AzureOpenAIEmbeddings(
-                    openai_api_key=database_connection.decrypt_api_key(),
-                    model=EMBEDDING_MODEL,
-                ),
-            )
-        else:
-            toolkit = SQLDatabaseToolkit(
-                db=self.database,
-                context=context,
-                few_shot_examples=new_fewshot_examples,
-                instructions=instructions,
-                is_multiple_schema=True if user_prompt.schemas else False,
-                db_scan=db_scan,
-                embedding=OpenAIEmbeddings(
-                    openai_api_key=database_connection.decrypt_api_key(),
-                    model=EMBEDDING_MODEL,
-                ),
-            )
+        embedding = EmbeddingClients.get(
+            database_connection.decrypt_api_key(),
+            EMBEDDING_MODEL,
+            azure=self.system.settings["azure_api_key"] is not None,
+        )
+        toolkit = SQLDatabaseToolkit(
+            db=self.database,
+            context=context,
+            few_shot_examples=new_fewshot_examples,
+            instructions=instructions,
+            is_multiple_schema=True if user_prompt.schemas else False,
+            db_scan=db_scan,
+            embedding=embedding,
+            table_embedding_service=TableEmbeddingService(
+                storage,
+                embedding,
+                table_representations=snapshot.table_representations,
+            ),
+        )
         agent_executor = self.create_sql_agent(
             toolkit=toolkit,
             verbose=True,
-            max_examples=number_of_samples,
+            max_examples=self.number_of_samples,
             number_of_instructions=len(instructions) if instructions is not None else 0,
             max_execution_time=int(os.environ.get("DH_ENGINE_TIMEOUT", 150)),
         )
         agent_executor.return_intermediate_steps = True
         agent_executor.handle_parsing_errors = ERROR_PARSING_MESSAGE
-        with get_openai_callback() as cb:
-            try:
-                result = agent_executor.invoke(
-                    {"input": user_prompt.text}, {"metadata": metadata}
-                )
-                result = self.check_for_time_out_or_tool_limit(result)
-            except SQLInjectionError as e:
-                raise SQLInjectionError(e) from e
-            except EngineTimeOutORItemLimitError as e:
-                raise EngineTimeOutORItemLimitError(e) from e
-            except Exception as e:
-                return SQLGeneration(
-                    prompt_id=user_prompt.id,
-                    tokens_used=cb.total_tokens,
-                    completed_at=datetime.datetime.now(),
-                    sql="",
-                    status="INVALID",
-                    error=str(e),
-                )
+        return agent_executor
+
+    def complete_response(
+        self, response: SQLGeneration, result: dict, cb: Any
+    ) -> SQLGeneration:
         sql_query = ""
         if "```sql" in result["output"]:
             sql_query = self.remove_markdown(result["output"])
@@ -820,7 +802,7 @@ class DataheraldSQLAgent(SQLGenerator):
         response.sql = replace_unprocessable_characters(sql_query)
         response.tokens_used = cb.total_tokens
         response.completed_at = datetime.datetime.now()
-        if number_of_samples > 0:
+        if self.number_of_samples > 0:
             suffix = SUFFIX_WITH_FEW_SHOT_SAMPLES
         else:
             suffix = SUFFIX_WITHOUT_FEW_SHOT_SAMPLES
@@ -833,6 +815,80 @@ class DataheraldSQLAgent(SQLGenerator):
             response,
         )
 
+    @override
+    def generate_response(
+        self,
+        user_prompt: Prompt,
+        database_connection: DatabaseConnection,
+        context: List[dict] = None,
+        metadata: dict = None,
+    ) -> SQLGeneration:
+        response = SQLGeneration(
+            prompt_id=user_prompt.id,
+            llm_config=self.llm_config,
+            created_at=datetime.datetime.now(),
+        )
+        agent_executor = self.create_agent_executor(
+            user_prompt, database_connection, context
+        )
+        with get_openai_callback() as cb:
+            try:
+                result = agent_executor.invoke(
+                    {"input": user_prompt.text}, {"metadata": metadata}
+                )
+                result = self.check_for_time_out_or_tool_limit(result)
+            except SQLInjectionError as e:
+                raise SQLInjectionError(e) from e
+            except EngineTimeOutORItemLimitError as e:
+                raise EngineTimeOutORItemLimitError(e) from e
+            except Exception as e:
+                return SQLGeneration(
+                    prompt_id=user_prompt.id,
+                    tokens_used=cb.total_tokens,
+                    completed_at=datetime.datetime.now(),
+                    sql="",
+                    status="INVALID",
+                    error=str(e),
+                )
+        return self.complete_response(response, result, cb)
+
+    @override
+    async def agenerate_response(
+        self,
+        user_prompt: Prompt,
+        database_connection: DatabaseConnection,
+        context: List[dict] = None,
+        metadata: dict = None,
+    ) -> SQLGeneration:
+        response = SQLGeneration(
+            prompt_id=user_prompt.id,
+            llm_config=self.llm_config,
+            created_at=datetime.datetime.now(),
+        )
+        agent_executor = await asyncio.to_thread(
+            self.create_agent_executor, user_prompt, database_connection, context
+        )
+        with get_openai_callback() as cb:
+            try:
+                result = await agent_executor.ainvoke(
+                    {"input": user_prompt.text}, {"metadata": metadata}
+                )
+                result = self.check_for_time_out_or_tool_limit(result)
+            except SQLInjectionError as e:
+                raise SQLInjectionError(e) from e
+            except EngineTimeOutORItemLimitError as e:
+                raise EngineTimeOutORItemLimitError(e) from e
+            except Exception as e:
+                return SQLGeneration(
+                    prompt_id=user_prompt.id,
+                    tokens_used=cb.total_tokens,
+                    completed_at=datetime.datetime.now(),
+                    sql="",
+                    status="INVALID",
+                    error=str(e),
+                )
+        return await asyncio.to_thread(self.complete_response, response, result, cb)
+
     @override
     def stream_response(
         self,
@@ -852,13 +908,8 @@ class DataheraldSQLAgent(SQLGenerator):
             api_base=self.llm_config.api_base,
             streaming=True,
         )
-        repository = TableDescriptionRepository(storage)
-        db_scan = repository.get_all_tables_by_db(
-            {
-                "db_connection_id": str(database_connection.id),
-                "status": TableDescriptionStatus.SCANNED.value,
-            }
-        )
+        snapshot = ContextSnapshots.get(storage, database_connection.id)
+        db_scan = list(snapshot.tables)
         if not db_scan:
             raise ValueError("No scanned tables found for database")
         db_scan = SQLGenerator.filter_tables_by_schema(
@@ -875,26 +926,26 @@ class DataheraldSQLAgent(SQLGenerator):
             number_of_samples = 0
         self.database = SQLDatabase.get_sql_engine(database_connection)
         # Set Embeddings class depending on azure / not azure
-        if self.system.settings["azure_api_key"] is not None:
-            embedding = AzureOpenAIEmbeddings(
-                openai_api_key=database_connection.decrypt_api_key(),
-                model=EMBEDDING_MODEL,
-            )
-        else:
-            embedding = OpenAIEmbeddings(
-                openai_api_key=database_connection.decrypt_api_key(),
-                model=EMBEDDING_MODEL,
-            )
-            toolkit = SQLDatabaseToolkit(
-                queuer=queue,
-                db=self.database,
-                context=[{}],
-                few_shot_examples=new_fewshot_examples,
-                instructions=instructions,
-                is_multiple_schema=True if user_prompt.schemas else False,
-                db_scan=db_scan,
-                embedding=embedding,
-            )
+        embedding = EmbeddingClients.get(
+            database_connection.decrypt_api_key(),
+            EMBEDDING_MODEL,
+            azure=self.system.settings["azure_api_key"] is not None,
+        )
+        toolkit = SQLDatabaseToolkit(
+            queuer=queue,
+            db=self.database,
+            context=[{}],
+            few_shot_examples=new_fewshot_examples,
+            instructions=instructions,
+            is_multiple_schema=True if user_prompt.schemas else False,
+            db_scan=db_scan,
+            embedding=embedding,
+            table_embedding_service=TableEmbeddingService(
+                storage,
+                embedding,
+                table_representations=snapshot.table_representations,
+            ),
+        )
         agent_executor = self.create_sql_agent(
             toolkit=toolkit,
             verbose=True,
@@ -904,15 +955,12 @@ class DataheraldSQLAgent(SQLGenerator):
         )
         agent_executor.return_intermediate_steps = True
         agent_executor.handle_parsing_errors = ERROR_PARSING_MESSAGE
-        thread = Thread(
-            target=self.stream_agent_steps,
-            args=(
-                user_prompt.text,
-                agent_executor,
-                response,
-                sql_generation_repository,
-                queue,
-                metadata,
-            ),
+        GenerationScheduler.get().submit(
+            self.stream_agent_steps,
+            user_prompt.text,
+            agent_executor,
+            response,
+            sql_generation_repository,
+            queue,
+            metadata,
         )
-        thread.start()
@@ -1,3 +1,4 @@
+import logging
 from datetime import date, datetime
 from decimal import Decimal
 
@@ -6,7 +7,6 @@ from langchain.prompts.chat import (
     ChatPromptTemplate,
     HumanMessagePromptTemplate,
 )
-from sqlalchemy import text
 
 from dataherald.model.chat_model import ChatModel
 from dataherald.repositories.database_connections import DatabaseConnectionRepository
@@ -14,6 +14,8 @@ from dataherald.repositories.prompts import PromptRepository
 from dataherald.sql_database.base import SQLDatabase, SQLInjectionError
 from dataherald.types import LLMConfig, NLGeneration, SQLGeneration
 
+logger = logging.getLogger(__name__)
+
 HUMAN_TEMPLATE = """Given a Question, a Sql query and the sql query result try to answer the question
 If the sql query result doesn't answer the question just say 'I don't know'
 Answer the question given the sql query and the sql query result.
@@ -58,10 +60,8 @@ class GeneratesNlAnswer:
             )
 
         try:
-            query = database.parser_to_filter_commands(sql_generation.sql)
-            with database._engine.connect() as connection:
-                execution = connection.execute(text(query))
-                result = execution.fetchmany(top_k)
+            response = database.run_sql(sql_generation.sql, top_k)[1]
+            result = response.get("result", [])
             rows = []
             for row in result:
                 modified_row = {}
@@ -84,6 +84,15 @@ class GeneratesNlAnswer:
                 "Sensitive SQL keyword detected in the query."
             ) from e
 
+        sql_query_result = "\n".join([str(row) for row in rows])
+        if response.get("truncated"):
+            logger.warning(
+                f"NL answer of sql generation {sql_generation.id} uses {len(rows)} "
+                "truncated rows"
+            )
+            sql_query_result += (
+                "\n(The result was truncated, these are only the first rows)"
+            )
         human_message_prompt = HumanMessagePromptTemplate.from_template(HUMAN_TEMPLATE)
         chat_prompt = ChatPromptTemplate.from_messages([human_message_prompt])
         chain = LLMChain(llm=self.llm, prompt=chat_prompt)
@@ -91,7 +100,7 @@ class GeneratesNlAnswer:
             {
                 "prompt": prompt.text,
                 "sql_query": sql_generation.sql,
-                "sql_query_result": "\n".join([str(row) for row in rows]),
+                "sql_query_result": sql_query_result,
             }
         )
         return NLGeneration(
@@ -71,10 +71,24 @@ class TestDB(DB):
     def update_or_create(self, collection: str, query: dict, obj: dict) -> int:
         return self.insert_one(collection, obj)
 
+    @override
+    def count(self, collection: str, query: dict) -> int:  # noqa: ARG002
+        return len(self.memory.get(collection, []))
+
     @override
     def find_all(self, collection: str, page: int = 0, limit: int = 0) -> list:
         return self.memory[collection]
 
+    @override
+    def create_index(
+        self, collection: str, keys: list, **options  # noqa: ARG002
+    ) -> str:
+        return ""
+
+    @override
+    def get_indexes(self, collection: str) -> list:  # noqa: ARG002
+        return []
+
     @override
     def delete_by_id(self, collection: str, id: str) -> int:
         try:
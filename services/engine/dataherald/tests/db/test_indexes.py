@@ -0,0 +1,42 @@
+from dataherald.db.indexes import INDEXES, ensure_indexes, get_missing_indexes
+
+
+class Storage:
+    def __init__(self):
+        self.indexes = {
+            "golden_sqls": [([("_id", 1)], {}), ([("db_connection_id", 1)], {})],
+            "context_versions": [([("db_connection_id", 1)], {})],
+        }
+        self.options = {}
+
+    def get_indexes(self, collection: str) -> list:
+        return self.indexes.get(collection, [])
+
+    def create_index(self, collection: str, keys: list, **options) -> str:
+        if collection == "nl_generations":
+            raise ValueError("index build failed")
+        self.options[(collection, tuple(keys))] = options
+        self.indexes.setdefault(collection, []).append((keys, options))
+        return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def test_only_the_missing_indexes_are_created(caplog):
+    storage = Storage()
+    created = ensure_indexes(storage)
+    assert ("golden_sqls", [("db_connection_id", 1)], {}) not in created
+    assert len(created) == sum(len(indexes) for indexes in INDEXES.values()) - 3
+    assert "Unable to create index" in caplog.text
+    assert get_missing_indexes(storage) == [
+        ("nl_generations", [("sql_generation_id", 1)], {})
+    ]
+    assert storage.options[("sql_generation_cache", (("expires_at", 1),))] == {
+        "expireAfterSeconds": 0
+    }
+    assert storage.options[("sql_generation_cache", (("key", 1),))] == {"unique": True}
+
+
+def test_indexes_with_other_options_are_reported(caplog):
+    storage = Storage()
+    ensure_indexes(storage)
+    assert ("context_versions", (("db_connection_id", 1),)) not in storage.options
+    assert "Index [('db_connection_id', 1)] on context_versions" in caplog.text
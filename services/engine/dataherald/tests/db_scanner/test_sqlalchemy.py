@@ -0,0 +1,227 @@
+import time
+from threading import Lock, Thread
+from types import SimpleNamespace
+
+from sqlalchemy import Column, MetaData, Table, create_engine, func, inspect, text
+
+from dataherald.db_scanner import sqlalchemy
+from dataherald.db_scanner.models.types import TableDescription
+from dataherald.db_scanner.services.base_scanner import BaseScanner
+from dataherald.db_scanner.services.postgre_sql_scanner import PostgreSqlScanner
+from dataherald.db_scanner.services.snowflake_scanner import SnowflakeScanner
+from dataherald.db_scanner.sqlalchemy import SqlAlchemyScanner
+from dataherald.sql_database.base import SQLDatabase
+
+SCANNER_PARALLELISM = 2
+
+
+class Repository:
+    def save_table_info(self, table_description: TableDescription):
+        return table_description
+
+
+def test_scans_of_a_db_connection_share_the_parallelism_limit(monkeypatch):
+    monkeypatch.setattr(sqlalchemy, "SCANNER_PARALLELISM", SCANNER_PARALLELISM)
+    monkeypatch.setattr(SqlAlchemyScanner, "_scan_semaphores", {})
+    scanner = SqlAlchemyScanner(None)
+    running = {"a": 0, "b": 0}
+    peaks = {"a": 0, "b": 0}
+    lock = Lock()
+
+    def scan_single_table(db_connection_id, **kwargs):  # noqa: ARG001
+        with lock:
+            running[db_connection_id] += 1
+            peaks[db_connection_id] = max(
+                peaks[db_connection_id], running[db_connection_id]
+            )
+        time.sleep(0.02)
+        with lock:
+            running[db_connection_id] -= 1
+
+    monkeypatch.setattr(scanner, "get_table_fingerprint", lambda **kwargs: None)
+    monkeypatch.setattr(scanner, "scan_single_table", scan_single_table)
+    monkeypatch.setattr(scanner, "get_table_embedding_service", lambda *args: None)
+    db_engine = SimpleNamespace(
+        engine=SimpleNamespace(dialect=SimpleNamespace(name="sqlite")),
+        get_metadata=lambda tables, refresh: None,  # noqa: ARG005
+    )
+    monkeypatch.setattr(
+        sqlalchemy, "BaseScanner", lambda: SimpleNamespace(get_logs=lambda *args: [])
+    )
+
+    def scan(db_connection_id: str):
+        scanner.scan(
+            db_engine,
+            [
+                TableDescription(db_connection_id=db_connection_id, table_name=f"t{i}")
+                for i in range(4)
+            ],
+            Repository(),
+            None,
+        )
+
+    # Two background scans of the same connection and one of another connection
+    threads = [Thread(target=scan, args=(id,)) for id in ["a", "a", "b"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peaks["a"] == SCANNER_PARALLELISM
+    assert peaks["b"] <= SCANNER_PARALLELISM
+
+
+def get_profiled_database() -> tuple[SQLDatabase, MetaData]:
+    engine = create_engine("sqlite://")
+    engine.execute("CREATE TABLE orders (id INTEGER, status TEXT, note TEXT)")
+    for index in range(120):
+        engine.execute(
+            "INSERT INTO orders VALUES (?, ?, ?)",
+            index,
+            ["open", "closed"][index % 2],
+            "x" * 60,
+        )
+    meta = MetaData()
+    meta.reflect(bind=engine)
+    return SQLDatabase(engine), meta
+
+
+def test_table_and_column_profiling_find_the_same_categories():
+    db_engine, meta = get_profiled_database()
+    scanner = SqlAlchemyScanner(None)
+    columns = inspect(db_engine.engine).get_columns("orders")
+
+    by_table = scanner.get_column_categories(
+        meta, "orders", columns, db_engine, BaseScanner()
+    )
+    by_column = {
+        column["name"]: scanner.get_processed_column(
+            meta, "orders", column, db_engine, BaseScanner()
+        ).categories
+        for column in columns
+    }
+    assert sorted(by_table["status"]) == ["closed", "open"]
+    assert by_table["id"] is None
+    assert by_table["note"] is None
+    assert {name: value and sorted(value) for name, value in by_table.items()} == {
+        name: value and sorted(value) for name, value in by_column.items()
+    }
+
+
+def test_table_profiling_falls_back_to_columns_when_it_fails():
+    db_engine, meta = get_profiled_database()
+
+    class FailingScanner(BaseScanner):
+        def distinct_count_expression(self, column):  # noqa: ARG002
+            return func.NOT_A_FUNCTION(column)
+
+    columns = inspect(db_engine.engine).get_columns("orders")
+    assert (
+        SqlAlchemyScanner(None).get_column_categories(
+            meta, "orders", columns, db_engine, FailingScanner()
+        )
+        is None
+    )
+
+
+def test_postgres_profiling_reads_the_stats_of_the_table_schema():
+    executed = []
+
+    def execute(query, **params):
+        executed.append((str(query), params))
+        return SimpleNamespace(
+            fetchall=lambda: [
+                {"attname": "status", "n_distinct": 2, "most_common_vals": ["a", "b"]},
+                {"attname": "id", "n_distinct": -1, "most_common_vals": None},
+            ]
+        )
+
+    db_engine = SimpleNamespace(engine=SimpleNamespace(execute=execute))
+    table = Table("orders", MetaData(), Column("id"), Column("status"), schema="sales")
+    categories = PostgreSqlScanner().profile_columns(
+        table, list(table.columns), db_engine, 50
+    )
+    assert categories == {"id": None, "status": ["a", "b"]}
+    assert "schemaname" in executed[0][0]
+    assert executed[0][1] == {"table": "orders", "schema": "sales"}
+
+
+def test_incremental_scan_skips_unchanged_tables_and_rescans_changed_ones(
+    monkeypatch,
+):
+    _, meta = get_profiled_database()
+    change_metadata = {"row_count": 120}
+    executed = []
+
+    def execute(query, **params):
+        executed.append(params)
+        return SimpleNamespace(
+            fetchall=lambda: [(change_metadata["row_count"], "2024-01-01")]
+        )
+
+    db_engine = SimpleNamespace(engine=SimpleNamespace(execute=execute))
+    scanner = SqlAlchemyScanner(None)
+    scanned = []
+    monkeypatch.setattr(
+        scanner, "scan_single_table", lambda **kwargs: scanned.append(kwargs)
+    )
+    scan_kwargs = {
+        "meta": meta,
+        "db_engine": db_engine,
+        "repository": Repository(),
+        "query_history_repository": None,
+        "scanner_service": SnowflakeScanner(),
+        "incremental": True,
+    }
+    fingerprint = scanner.get_table_fingerprint(
+        meta, "orders", db_engine, SnowflakeScanner(), "PUBLIC"
+    )
+    assert executed[-1] == {"table": "orders", "schema": "PUBLIC"}
+    table = TableDescription(
+        db_connection_id="a",
+        table_name="orders",
+        schema_name="PUBLIC",
+        fingerprint=fingerprint,
+    )
+
+    assert scanner.scan_table_and_logs(table=table, **scan_kwargs).endswith(
+        "(unchanged)"
+    )
+    assert scanned == []
+
+    change_metadata["row_count"] = 121
+    assert scanner.scan_table_and_logs(table=table, **scan_kwargs) == "SCANNED"
+    assert scanned[0]["fingerprint"] != fingerprint
+
+
+def test_incremental_scan_reflects_the_altered_tables_again(monkeypatch, tmp_path):
+    db_engine = SQLDatabase(create_engine(f"sqlite:///{tmp_path}/altered.db"))
+    with db_engine.engine.begin() as connection:
+        connection.execute(text("CREATE TABLE orders (id INTEGER)"))
+    scanner = SqlAlchemyScanner(None)
+    fingerprint = scanner.get_table_fingerprint(
+        db_engine.get_metadata(["orders"]), "orders", db_engine, BaseScanner()
+    )
+    with db_engine.engine.begin() as connection:
+        connection.execute(text("ALTER TABLE orders ADD COLUMN status TEXT"))
+    scanned = []
+    monkeypatch.setattr(
+        scanner, "scan_single_table", lambda **kwargs: scanned.append(kwargs)
+    )
+    monkeypatch.setattr(scanner, "get_table_embedding_service", lambda *args: None)
+
+    scanner.scan(
+        db_engine,
+        [
+            TableDescription(
+                db_connection_id="a",
+                table_name="orders",
+                fingerprint=fingerprint,
+                status="SCANNED",
+            )
+        ],
+        Repository(),
+        None,
+        incremental=True,
+    )
+    assert [kwargs["table"] for kwargs in scanned] == ["orders"]
+    assert "status" in scanned[0]["meta"].tables["orders"].columns
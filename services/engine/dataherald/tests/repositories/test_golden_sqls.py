@@ -0,0 +1,38 @@
+from bson.objectid import ObjectId
+
+from dataherald.repositories.golden_sqls import GoldenSQLRepository
+
+
+class Storage:
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.queries = []
+
+    def find(self, collection: str, query: dict) -> list:  # noqa: ARG002
+        self.queries.append(query)
+        return [dict(row) for row in self.rows if row["_id"] in query["_id"]["$in"]]
+
+
+def test_find_by_ids_keeps_the_order_of_the_ids():
+    ids = [str(ObjectId()) for _ in range(3)]
+    missing = str(ObjectId())
+    storage = Storage(
+        [
+            {
+                "_id": ObjectId(id),
+                "prompt_text": f"question {index}",
+                "sql": "SELECT 1",
+                "db_connection_id": ObjectId("64dfa0e103f5134086f7090c"),
+            }
+            for index, id in enumerate(ids)
+        ]
+    )
+
+    golden_sqls = GoldenSQLRepository(storage).find_by_ids(
+        [ids[2], missing, ids[0], ids[1]]
+    )
+    assert [golden_sql.id for golden_sql in golden_sqls] == [ids[2], ids[0], ids[1]]
+    assert golden_sqls[0].db_connection_id == "64dfa0e103f5134086f7090c"
+    assert len(storage.queries) == 1
+    assert GoldenSQLRepository(storage).find_by_ids([]) == []
+    assert len(storage.queries) == 1
@@ -0,0 +1,65 @@
+from bson.objectid import ObjectId
+
+from dataherald.repositories.instructions import InstructionRepository
+from dataherald.services.context_snapshots import ContextSnapshots
+from dataherald.types import Instruction
+
+
+class Storage:
+    def __init__(self):
+        self.collections = {}
+        self.finds = 0
+
+    def matches(self, row: dict, query: dict) -> bool:
+        return all(row.get(key) == value for key, value in query.items())
+
+    def insert_one(self, collection: str, obj: dict) -> ObjectId:
+        obj["_id"] = ObjectId()
+        self.collections.setdefault(collection, []).append(obj)
+        return obj["_id"]
+
+    def find_one(self, collection: str, query: dict) -> dict | None:
+        rows = self.find(collection, query)
+        return rows[0] if rows else None
+
+    def find(self, collection: str, query: dict, **kwargs) -> list:  # noqa: ARG002
+        self.finds += 1
+        return [
+            row
+            for row in self.collections.get(collection, [])
+            if self.matches(row, query)
+        ]
+
+    def count(self, collection: str, query: dict) -> int:
+        return len(self.find(collection, query))
+
+    def update_or_create(self, collection: str, query: dict, obj: dict):
+        row = self.find_one(collection, query)
+        if row:
+            row.update(obj)
+            return row["_id"]
+        return self.insert_one(collection, obj)
+
+
+def test_snapshot_is_reused_until_the_context_version_changes():
+    storage = Storage()
+    db_connection_id = "64dfa0e103f5134086f7090f"
+    instruction_repository = InstructionRepository(storage)
+    instruction_repository.insert(
+        Instruction(instruction="use utc", db_connection_id=db_connection_id)
+    )
+    snapshot = ContextSnapshots.get(storage, db_connection_id)
+    assert snapshot.instructions == [{"instruction": "use utc"}]
+
+    finds = storage.finds
+    assert ContextSnapshots.get(storage, db_connection_id) is snapshot
+    # Only the context version is read
+    assert storage.finds == finds + 1
+
+    instruction_repository.insert(
+        Instruction(instruction="dates are iso", db_connection_id=db_connection_id)
+    )
+    assert ContextSnapshots.get(storage, db_connection_id).instructions == [
+        {"instruction": "use utc"},
+        {"instruction": "dates are iso"},
+    ]
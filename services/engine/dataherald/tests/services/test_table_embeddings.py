@@ -0,0 +1,103 @@
+from collections import OrderedDict
+from typing import List
+
+from bson.objectid import ObjectId
+from langchain_core.embeddings import Embeddings
+
+from dataherald.db_scanner.models.types import ColumnDetail, TableDescription
+from dataherald.services import table_embeddings
+from dataherald.services.table_embeddings import TableEmbeddingService
+
+
+class Storage:
+    def __init__(self):
+        self.collections = {}
+
+    def matches(self, row: dict, query: dict) -> bool:
+        for key, value in query.items():
+            if isinstance(value, dict) and "$in" in value:
+                if row.get(key) not in value["$in"]:
+                    return False
+            elif row.get(key) != value:
+                return False
+        return True
+
+    def find(self, collection: str, query: dict, **kwargs) -> list:  # noqa: ARG002
+        return [
+            dict(row)
+            for row in self.collections.get(collection, [])
+            if self.matches(row, query)
+        ]
+
+    def update_or_create(self, collection: str, query: dict, obj: dict):
+        for row in self.collections.get(collection, []):
+            if self.matches(row, query):
+                row.update(obj)
+                return row["_id"]
+        obj["_id"] = ObjectId()
+        self.collections.setdefault(collection, []).append(obj)
+        return obj["_id"]
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def get_table(table_id: str, description: str | None = None) -> TableDescription:
+    return TableDescription(
+        id=table_id,
+        db_connection_id="64dfa0e103f5134086f7090f",
+        table_name=f"table_{table_id}",
+        description=description,
+        columns=[ColumnDetail(name="id", data_type="INTEGER")],
+    )
+
+
+def test_stored_embeddings_are_reused():
+    storage = Storage()
+    embedding = CountingEmbeddings()
+    service = TableEmbeddingService(storage, embedding, "model")
+    tables = [get_table("a"), get_table("b")]
+
+    first = service.get_embeddings(tables)
+    assert len(embedding.texts) == len(tables)
+
+    second = TableEmbeddingService(storage, embedding, "model").get_embeddings(tables)
+    assert second == first
+    assert len(embedding.texts) == len(tables)
+
+
+def test_tables_are_embedded_again_when_their_content_changes():
+    storage = Storage()
+    embedding = CountingEmbeddings()
+    service = TableEmbeddingService(storage, embedding, "model")
+    tables = [get_table("a"), get_table("b")]
+    service.get_embeddings(tables)
+
+    service.get_embeddings([get_table("a", "orders by day"), get_table("b")])
+    # Only the changed table is embedded again and its stored embedding is replaced
+    assert len(embedding.texts) == len(tables) + 1
+    assert "orders by day" in embedding.texts[-1]
+    assert len(storage.collections["table_embeddings"]) == len(tables)
+
+
+def test_rankers_are_bounded(monkeypatch):
+    monkeypatch.setattr(table_embeddings, "TABLE_RANKER_MAX_COUNT", 1)
+    monkeypatch.setattr(TableEmbeddingService, "_rankers", OrderedDict())
+    embedding = CountingEmbeddings()
+    service = TableEmbeddingService(Storage(), embedding, "model")
+    tables = [get_table("a")]
+
+    ranker = service.get_ranker(tables)
+    assert service.get_ranker(tables) is ranker
+    service.get_ranker([get_table("b").copy(update={"db_connection_id": "other"})])
+    assert len(TableEmbeddingService._rankers) == 1
+    assert service.get_ranker(tables) is not ranker
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from bson.objectid import ObjectId
+
+from dataherald.api.types.requests import SQLGenerationRequest
+from dataherald.repositories.context_versions import ContextVersionRepository
+from dataherald.services import sql_generations
+from dataherald.services.sql_generations import SQLGenerationService
+from dataherald.smart_cache.semantic import SemanticCache
+from dataherald.types import LLMConfig, Prompt
+from dataherald.utils import metrics
+
+DB_CONNECTION_ID = "64dfa0e103f5134086f7090f"
+SIMILARITY = 0.97
+
+
+class Storage:
+    def __init__(self):
+        self.collections = {}
+
+    def find_one(self, collection: str, query: dict) -> dict | None:
+        for row in self.collections.get(collection, []):
+            if all(row.get(key) == value for key, value in query.items()):
+                return dict(row)
+        return None
+
+    def insert_one(self, collection: str, obj: dict) -> ObjectId:
+        obj["_id"] = ObjectId()
+        self.collections.setdefault(collection, []).append(obj)
+        return obj["_id"]
+
+    def update_or_create(self, collection: str, query: dict, obj: dict):
+        for row in self.collections.get(collection, []):
+            if all(row.get(key) == value for key, value in query.items()):
+                row.update(obj)
+                return row["_id"]
+        return self.insert_one(collection, obj)
+
+
+class VectorStore:
+    def __init__(self):
+        self.results = []
+
+    def query(self, **kwargs) -> list:  # noqa: ARG002
+        return self.results
+
+    def get_similarity(self, score: float) -> float:
+        return score
+
+
+def get_cache(**sql_generation) -> tuple[SemanticCache, Storage, VectorStore, str]:
+    """Stores an earlier prompt and its generation, which the vector store returns"""
+    storage = Storage()
+    vector_store = VectorStore()
+    prompt_id = storage.insert_one(
+        "prompts",
+        {"text": "how many users", "db_connection_id": DB_CONNECTION_ID, "schemas": []},
+    )
+    sql_generation_id = storage.insert_one(
+        "sql_generations",
+        {
+            "prompt_id": str(prompt_id),
+            "sql": "SELECT COUNT(*) FROM users",
+            "status": "VALID",
+            "completed_at": datetime.now(),
+            **sql_generation,
+        },
+    )
+    vector_store.results = [{"id": str(sql_generation_id), "score": SIMILARITY}]
+    cache = SemanticCache(SimpleNamespace(instance=lambda _: vector_store), storage)
+    return cache, storage, vector_store, str(sql_generation_id)
+
+
+def get_prompt(**kwargs) -> Prompt:
+    return Prompt(text="count the users", db_connection_id=DB_CONNECTION_ID, **kwargs)
+
+
+def test_only_prompts_over_the_threshold_are_reused():
+    cache, _, vector_store, sql_generation_id = get_cache()
+    sql_generation, similarity = cache.lookup(get_prompt(), SQLGenerationRequest())
+    assert sql_generation.id == sql_generation_id
+    assert similarity == SIMILARITY
+
+    vector_store.results[0]["score"] = 0.9
+    assert cache.lookup(get_prompt(), SQLGenerationRequest()) is None
+
+
+def test_generations_with_other_settings_are_not_reused():
+    cache, _, _, _ = get_cache(llm_config={"llm_name": "gpt-4o"})
+    assert cache.lookup(get_prompt(), SQLGenerationRequest()) is None
+    assert (
+        cache.lookup(
+            get_prompt(),
+            SQLGenerationRequest(llm_config=LLMConfig(llm_name="gpt-4o")),
+        )
+        is not None
+    )
+
+    cache, _, _, _ = get_cache()
+    assert cache.lookup(get_prompt(schemas=["sales"]), SQLGenerationRequest()) is None
+
+
+def test_generations_older_than_the_context_are_not_reused():
+    cache, storage, _, _ = get_cache(completed_at=datetime.now() - timedelta(hours=1))
+    ContextVersionRepository(storage).bump(DB_CONNECTION_ID)
+    assert cache.lookup(get_prompt(), SQLGenerationRequest()) is None
+
+    cache, storage, _, _ = get_cache(completed_at=datetime.now() + timedelta(hours=1))
+    ContextVersionRepository(storage).bump(DB_CONNECTION_ID)
+    assert cache.lookup(get_prompt(), SQLGenerationRequest()) is not None
+
+
+def test_reused_generations_are_revalidated(monkeypatch):
+    cache, storage, vector_store, _ = get_cache()
+    monkeypatch.setattr(sql_generations, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(sql_generations, "SEMANTIC_CACHE_REVALIDATE", True)
+    monkeypatch.setattr(sql_generations.SQLDatabase, "get_sql_engine", lambda *_: None)
+    status = {"value": "INVALID"}
+
+    def create_sql_query_status(db, query, sql_generation):  # noqa: ARG001
+        return sql_generation.copy(update={"status": status["value"]})
+
+    monkeypatch.setattr(
+        sql_generations, "create_sql_query_status", create_sql_query_status
+    )
+    service = SQLGenerationService(
+        SimpleNamespace(instance=lambda _: vector_store), storage
+    )
+    invalid = metrics.get_counters().get("sql_generation_cache.semantic_invalid", 0)
+    assert (
+        service.lookup_cache(get_prompt(), SQLGenerationRequest(), None, None) is None
+    )
+    assert (
+        metrics.get_counters()["sql_generation_cache.semantic_invalid"] == invalid + 1
+    )
+
+    status["value"] = "VALID"
+    _, details = service.lookup_cache(get_prompt(), SQLGenerationRequest(), None, None)
+    assert details["type"] == "semantic"
@@ -0,0 +1,98 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+import bson
+from bson.codec_options import CodecOptions
+from bson.objectid import ObjectId
+
+from dataherald.db_scanner.models.types import TableDescription
+from dataherald.db_scanner.repository.base import TableDescriptionRepository
+from dataherald.repositories.context_versions import ContextVersionRepository
+from dataherald.smart_cache.in_memory import InMemoryCache
+from dataherald.smart_cache.mongo import MongoCache
+from dataherald.types import SQLGeneration
+
+
+class Storage:
+    """Keeps the rows as BSON and decodes them like a tz_aware MongoClient"""
+
+    def __init__(self):
+        self.collections = {}
+
+    def matches(self, row: dict, query: dict) -> bool:
+        for key, value in query.items():
+            if isinstance(value, dict) and "$gt" in value:
+                if key not in row or not row[key] > value["$gt"]:
+                    return False
+            elif row.get(key) != value:
+                return False
+        return True
+
+    def find(self, collection: str, query: dict) -> list:
+        rows = [
+            bson.decode(data, codec_options=CodecOptions(tz_aware=True))
+            for data in self.collections.get(collection, [])
+        ]
+        return [row for row in rows if self.matches(row, query)]
+
+    def find_one(self, collection: str, query: dict) -> dict | None:
+        rows = self.find(collection, query)
+        return rows[0] if rows else None
+
+    def update_or_create(self, collection: str, query: dict, obj: dict):
+        rows = self.collections.setdefault(collection, [])
+        for index, row in enumerate(self.find(collection, {})):
+            if self.matches(row, query):
+                rows[index] = bson.encode({**row, **obj})
+                return row["_id"]
+        obj = {**obj, "_id": ObjectId()}
+        rows.append(bson.encode(obj))
+        return obj["_id"]
+
+
+def get_sql_generation(sql: str) -> SQLGeneration:
+    return SQLGeneration(prompt_id="651f2d76275132d5b65175eb", sql=sql, status="VALID")
+
+
+def test_mongo_cache_round_trips_tz_aware_expiry_dates():
+    storage = Storage()
+    cache = MongoCache(SimpleNamespace(instance=lambda _: storage))
+    cache.add("key", get_sql_generation("SELECT 1"))
+    assert cache.lookup("key").sql == "SELECT 1"
+    assert cache.lookup("other") is None
+
+    row = storage.find_one("sql_generation_cache", {"key": "key"})
+    assert row["expires_at"].tzinfo is not None
+    assert "last_used_at" not in row
+
+    cache.ttl = timedelta(seconds=-1)
+    cache.add("key", get_sql_generation("SELECT 2"))
+    assert cache.lookup("key") is None
+
+
+def test_in_memory_cache_evicts_the_least_recently_used_entries():
+    cache = InMemoryCache(None)
+    cache.max_size = 2
+    cache.add("a", get_sql_generation("SELECT 1"))
+    cache.add("b", get_sql_generation("SELECT 2"))
+    assert cache.lookup("a").sql == "SELECT 1"
+    cache.add("c", get_sql_generation("SELECT 3"))
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") is not None
+
+    cache.ttl = timedelta(seconds=-1)
+    assert cache.lookup("c") is None
+
+
+def test_saving_a_table_description_changes_the_context_version():
+    storage = Storage()
+    versions = ContextVersionRepository(storage)
+    TableDescriptionRepository(storage).save_table_info(
+        TableDescription(db_connection_id="a", table_name="orders")
+    )
+    version = versions.get("a")
+    assert version != ""
+    TableDescriptionRepository(storage).save_table_info(
+        TableDescription(db_connection_id="a", table_name="orders", description="x")
+    )
+    assert versions.get("a") != version
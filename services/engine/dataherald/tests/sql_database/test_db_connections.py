@@ -0,0 +1,103 @@
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+
+from dataherald.sql_database import base, ssh_tunnels
+from dataherald.sql_database.base import DBConnections, SQLDatabase
+from dataherald.sql_database.models.types import (
+    DB_ENGINE_MAX_POOL_SIZE,
+    DatabaseConnection,
+    SSHSettings,
+)
+from dataherald.sql_database.ssh_tunnels import SSHTunnels
+from dataherald.types import DatabaseConnectionRequest
+
+POOL_SIZE = 10
+
+
+def test_get_sql_engine_reuses_the_engine_until_it_is_invalidated():
+    database_connection = DatabaseConnection(
+        id="64dfa0e103f5134086f7090d",
+        alias="registry",
+        connection_uri="sqlite:///:memory:",
+    )
+    sql_database = SQLDatabase.get_sql_engine(database_connection)
+    assert SQLDatabase.get_sql_engine(database_connection, True) is sql_database
+
+    DBConnections.invalidate(database_connection.id)
+    assert SQLDatabase.get_sql_engine(database_connection) is not sql_database
+    DBConnections.invalidate(database_connection.id)
+    assert not [
+        stats
+        for stats in DBConnections.get_stats()
+        if stats["db_connection_id"] == database_connection.id and not stats["retired"]
+    ]
+
+
+class FakeForwarder:
+    def __init__(self, **settings):  # noqa: ARG002
+        self.local_bind_host = "127.0.0.1"
+        self.local_bind_port = 40000
+        self.is_active = False
+
+    def start(self):
+        self.is_active = True
+
+    def stop(self, force=False):  # noqa: ARG002
+        self.is_active = False
+
+
+def test_engines_are_disposed_once_no_request_holds_them(monkeypatch):
+    monkeypatch.setattr(ssh_tunnels, "SSHTunnelForwarder", FakeForwarder)
+    monkeypatch.setattr(base, "DB_ENGINE_MAX_COUNT", 1)
+    database_connection = DatabaseConnection(
+        id="64dfa0e103f5134086f7090e",
+        alias="tunnel",
+        connection_uri="postgresql://user:pass@db:5432/db",
+        use_ssh=True,
+        ssh_settings=SSHSettings(host="bastion", username="user"),
+    )
+    ssh_tunnel, _, _ = SSHTunnels.acquire(database_connection, "db", 5432)
+    sql_database = SQLDatabase(create_engine("sqlite://", poolclass=QueuePool))
+    sql_database.ssh_tunnel = ssh_tunnel
+    DBConnections.add("held", database_connection.id, sql_database)
+
+    # An agent keeps the engine between its queries while another one evicts it
+    DBConnections.add("other", None, SQLDatabase(create_engine("sqlite://")))
+    assert "held" not in DBConnections.db_connections
+    assert SSHTunnels.tunnels[ssh_tunnel]["server"].is_active
+    assert [
+        stats["retired"]
+        for stats in DBConnections.get_stats()
+        if stats["db_connection_id"] == database_connection.id
+    ] == [True]
+    with sql_database.engine.connect() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+
+    server = SSHTunnels.tunnels[ssh_tunnel]["server"]
+    del sql_database
+    DBConnections.get_stats()
+    assert ssh_tunnel not in SSHTunnels.tunnels
+    assert not server.is_active
+    assert not DBConnections.retired
+    DBConnections.discard("other")
+
+
+def test_pool_size_must_be_in_range():
+    with pytest.raises(ValidationError, match="pool_size must be between 1 and"):
+        DatabaseConnection(
+            alias="pool", connection_uri="sqlite:///:memory:", pool_size=0
+        )
+    with pytest.raises(ValidationError, match="pool_size must be between 1 and"):
+        DatabaseConnectionRequest(
+            alias="pool",
+            connection_uri="sqlite:///:memory:",
+            pool_size=DB_ENGINE_MAX_POOL_SIZE + 1,
+        )
+    assert (
+        DatabaseConnectionRequest(
+            alias="pool", connection_uri="sqlite:///:memory:", pool_size=POOL_SIZE
+        ).pool_size
+        == POOL_SIZE
+    )
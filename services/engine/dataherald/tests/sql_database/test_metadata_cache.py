@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+from sqlalchemy import create_engine
+
+from dataherald.sql_database.base import MetadataCache
+
+
+def test_stale_tables_are_reflected_into_a_new_metadata(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'shop.db'}")
+    engine.execute("CREATE TABLE orders (id INTEGER)")
+    engine.execute("CREATE TABLE users (id INTEGER)")
+    try:
+        metadata = MetadataCache.get_metadata(engine, ["orders"])
+        assert MetadataCache.get_metadata(engine, ["orders"]) is metadata
+
+        engine.execute("ALTER TABLE orders ADD COLUMN total INTEGER")
+        MetadataCache.invalidate(engine, ["orders"])
+        refreshed = MetadataCache.get_metadata(engine, ["orders", "users"])
+
+        # The metadata returned before is left as it was
+        assert refreshed is not metadata
+        assert list(metadata.tables) == ["orders"]
+        assert list(metadata.tables["orders"].columns.keys()) == ["id"]
+        assert list(refreshed.tables["orders"].columns.keys()) == ["id", "total"]
+        assert "users" in refreshed.tables
+    finally:
+        MetadataCache.invalidate(engine)
+
+
+def test_metadata_of_the_least_recently_used_databases_is_evicted(
+    monkeypatch, tmp_path
+):
+    monkeypatch.setattr("dataherald.sql_database.base.REFLECTION_CACHE_MAX_COUNT", 2)
+    monkeypatch.setattr(MetadataCache, "entries", OrderedDict())
+    engines = [
+        create_engine(f"sqlite:///{tmp_path / f'{name}.db'}")
+        for name in ["a", "b", "c"]
+    ]
+    for engine in engines:
+        engine.execute("CREATE TABLE orders (id INTEGER)")
+    first = MetadataCache.get_metadata(engines[0], ["orders"])
+    MetadataCache.get_metadata(engines[1], ["orders"])
+    assert MetadataCache.get_metadata(engines[0], ["orders"]) is first
+
+    MetadataCache.get_metadata(engines[2], ["orders"])
+    assert list(MetadataCache.entries) == [str(engines[0].url), str(engines[2].url)]
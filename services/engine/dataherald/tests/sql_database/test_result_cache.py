@@ -0,0 +1,39 @@
+from dataherald.sql_database.base import QueryResultCache, SQLDatabase
+
+ROW_COUNT = 3
+
+
+def test_run_sql_reuses_the_rows_of_the_same_query():
+    db = SQLDatabase.from_uri("sqlite:///:memory:")
+    db.engine.execute("CREATE TABLE orders (id INTEGER)")
+    db.engine.execute("INSERT INTO orders VALUES (1), (2), (3)")
+    try:
+        assert len(db.run_sql("SELECT id FROM orders", 10)[1]["result"]) == ROW_COUNT
+        db.engine.execute("INSERT INTO orders VALUES (4)")
+        # The complete result of the first query serves any row limit
+        assert db.run_sql("SELECT  id\nFROM orders;", 2)[1]["result"] == [(1,), (2,)]
+        assert len(db.run_sql("SELECT id FROM orders")[1]["result"]) == ROW_COUNT
+
+        db.cache_query_results = False
+        assert len(db.run_sql("SELECT id FROM orders")[1]["result"]) == ROW_COUNT + 1
+    finally:
+        QueryResultCache.invalidate(db.engine)
+
+
+def test_run_sql_truncates_results_over_the_limits(monkeypatch):
+    monkeypatch.setattr("dataherald.sql_database.base.SQL_RESULT_MAX_ROWS", 2)
+    db = SQLDatabase.from_uri("sqlite:///:memory:")
+    db.cache_query_results = False
+    db.engine.execute("CREATE TABLE orders (id INTEGER)")
+    db.engine.execute("INSERT INTO orders VALUES (1), (2), (3)")
+    assert db.run_sql("SELECT id FROM orders")[1] == {
+        "result": [(1,), (2,)],
+        "truncated": True,
+    }
+    assert db.run_sql("SELECT id FROM orders", 2)[1]["truncated"] is False
+
+    monkeypatch.setattr("dataherald.sql_database.base.SQL_RESULT_MAX_BYTES", 6)
+    assert db.run_sql("SELECT id FROM orders", 2)[1] == {
+        "result": [(1,)],
+        "truncated": True,
+    }
@@ -0,0 +1,51 @@
+from dataherald.sql_database import ssh_tunnels
+from dataherald.sql_database.models.types import DatabaseConnection, SSHSettings
+from dataherald.sql_database.ssh_tunnels import SSHTunnels
+
+
+class FakeForwarder:
+    started = 0
+
+    def __init__(self, **settings):
+        self.local_bind_host = "127.0.0.1"
+        self.local_bind_port = settings.get("local_bind_address", ("", 40000))[1]
+        self.is_active = False
+
+    def start(self):
+        FakeForwarder.started += 1
+        self.is_active = True
+
+    def stop(self, force=False):  # noqa: ARG002
+        self.is_active = False
+
+
+def test_tunnels_are_shared_reconnected_and_stopped(monkeypatch):
+    monkeypatch.setattr(ssh_tunnels, "SSHTunnelForwarder", FakeForwarder)
+    database_connection = DatabaseConnection(
+        id="64dfa0e103f5134086f7090e",
+        alias="tunnel",
+        connection_uri="postgresql://user:pass@db:5432/db",
+        use_ssh=True,
+        ssh_settings=SSHSettings(host="bastion", username="user"),
+    )
+    key, _, port = SSHTunnels.acquire(database_connection, "db", 5432)
+    assert SSHTunnels.acquire(database_connection, "db", 5432) == (
+        key,
+        "127.0.0.1",
+        port,
+    )
+    assert FakeForwarder.started == 1
+
+    server = SSHTunnels.tunnels[key]["server"]
+    server.is_active = False
+    started = FakeForwarder.started
+    SSHTunnels.ensure_active(key)
+    assert FakeForwarder.started == started + 1
+    assert SSHTunnels.tunnels[key]["server"].local_bind_port == port
+
+    SSHTunnels.release(key)
+    assert SSHTunnels.tunnels[key]["server"].is_active
+    server = SSHTunnels.tunnels[key]["server"]
+    SSHTunnels.release(key)
+    assert key not in SSHTunnels.tunnels
+    assert not server.is_active
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from dataherald.sql_database.base import SQLDatabase
+from dataherald.sql_database.statement_timeout import StatementTimeout
+
+ENDLESS_QUERY = (
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) "
+    "SELECT count(*) FROM c"
+)
+# Seconds a cancelled statement may take to stop
+CANCEL_SECONDS = 5
+
+
+def test_run_sql_cancels_the_statement_after_the_timeout():
+    db = SQLDatabase.from_uri("sqlite:///:memory:")
+    started_at = time.monotonic()
+    with pytest.raises(TimeoutError):
+        db.run_sql(ENDLESS_QUERY, timeout=1)
+    assert time.monotonic() - started_at < CANCEL_SECONDS
+    assert db.run_sql("SELECT 1", timeout=1)[1]["result"] == [(1,)]
+
+
+def test_statements_share_one_watchdog_thread(tmp_path):
+    db = SQLDatabase.from_uri(f"sqlite:///{tmp_path / 'watchdog.db'}")
+    db.cache_query_results = False
+    errors = []
+
+    def run(timeout: int):
+        try:
+            db.run_sql(ENDLESS_QUERY, timeout=timeout)
+        except TimeoutError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(timeout,)) for timeout in [2, 1]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(errors) == len(threads)
+    for _ in range(3):
+        db.run_sql("SELECT 1", timeout=5)
+    assert [
+        thread.name
+        for thread in threading.enumerate()
+        if thread.name == "statement-watchdog"
+    ] == ["statement-watchdog"]
+
+
+def test_statements_are_not_cancelled_after_they_finish(monkeypatch):
+    db = SQLDatabase.from_uri("sqlite:///:memory:")
+    cancelling = threading.Event()
+    release = threading.Event()
+    cancelled = []
+
+    def cancel_statement(self, cursor):  # noqa: ARG001
+        cancelling.set()
+        release.wait(5)
+        cancelled.append(cursor)
+
+    monkeypatch.setattr(StatementTimeout, "cancel_statement", cancel_statement)
+    with db.engine.connect() as connection:
+        statement_timeout = StatementTimeout(connection, 60).__enter__()
+        statement_timeout.cursor = "cursor"
+        cancel = threading.Thread(target=statement_timeout.cancel)
+        cancel.start()
+        cancelling.wait(5)
+        finish = threading.Thread(
+            target=statement_timeout.__exit__, args=(None, None, None)
+        )
+        finish.start()
+        finish.join(0.1)
+        # The statement finishes once the running cancel returns
+        assert finish.is_alive()
+        release.set()
+        finish.join(5)
+        cancel.join(5)
+        assert cancelled == ["cursor"]
+
+        statement_timeout.cursor = "next"
+        statement_timeout.cancel()
+        assert cancelled == ["cursor"]
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from dataherald.sql_database.base import SQLDatabase
+from dataherald.sql_database.validation import (
+    explain,
+    get_limit_query,
+    validate_with_limit,
+)
+
+# The limit setting, the query and the reset
+LIMIT_MODE_STATEMENTS = 3
+
+
+@pytest.fixture
+def db() -> SQLDatabase:
+    db = SQLDatabase.from_uri("sqlite:///:memory:")
+    db.engine.execute("CREATE TABLE orders (id INTEGER, amount REAL)")
+    return db
+
+
+@pytest.mark.parametrize("mode", ["explain", "limit", "execute"])
+def test_validate_sql(db: SQLDatabase, mode: str):
+    db.validation_mode = mode
+    db.validate_sql("SELECT id, sum(amount) FROM orders GROUP BY id;")
+    with pytest.raises(OperationalError):
+        db.validate_sql("SELECT missing_column FROM orders")
+
+
+def test_limit_query_keeps_trailing_comments_out_of_the_subquery():
+    assert get_limit_query("SELECT 1 -- one") == (
+        "SELECT * FROM (\nSELECT 1 -- one\n) AS validation_query LIMIT 1"
+    )
+
+
+@pytest.mark.parametrize("dialect", ["mssql", "mysql"])
+def test_limit_mode_caps_the_rows_of_queries_that_can_not_be_wrapped(dialect: str):
+    executed = []
+    connection = SimpleNamespace(
+        dialect=SimpleNamespace(name=dialect),
+        execute=lambda query: executed.append(str(query))
+        or SimpleNamespace(fetchall=list),
+    )
+    query = "WITH t AS (SELECT 1 AS id) SELECT t.id, t.id FROM t ORDER BY id"
+    validate_with_limit(connection, f"{query};")
+    assert len(executed) == LIMIT_MODE_STATEMENTS
+    assert executed[1] == query
+
+
+def test_explain_invalidates_the_mssql_session_when_showplan_can_not_be_reset():
+    invalidated = []
+
+    def execute(query):
+        if str(query) == "SET SHOWPLAN_TEXT OFF":
+            raise OperationalError(str(query), {}, Exception("connection lost"))
+        return SimpleNamespace(fetchall=list)
+
+    connection = SimpleNamespace(
+        dialect=SimpleNamespace(name="mssql"),
+        execute=execute,
+        invalidate=lambda: invalidated.append(True),
+    )
+    explain(connection, "SELECT 1")
+    assert invalidated == [True]
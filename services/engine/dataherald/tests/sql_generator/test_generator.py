@@ -1,10 +1,19 @@
+import asyncio
+import threading
+from queue import Queue
 from typing import List
 
 from overrides import override
 
 from dataherald.config import System
+from dataherald.sql_database.base import SQLDatabase
 from dataherald.sql_database.models.types import DatabaseConnection
 from dataherald.sql_generator import SQLGenerator
+from dataherald.sql_generator.dataherald_sqlagent import (
+    GetUserInstructions,
+    QuerySQLDataBaseTool,
+    catch_exceptions,
+)
 from dataherald.types import Prompt, SQLGeneration
 
 
@@ -25,3 +34,64 @@ class TestGenerator(SQLGenerator):
             sql="Foo response",
             status="bar",
         )
+
+
+class ThreadGenerator(SQLGenerator):
+    def __init__(self):
+        self.threads = []
+
+    @override
+    def generate_response(
+        self,
+        user_prompt: Prompt,
+        database_connection: DatabaseConnection,  # noqa: ARG002
+        context: List[dict] = None,  # noqa: ARG002
+        metadata: dict = None,  # noqa: ARG002
+    ) -> SQLGeneration:
+        self.threads.append(threading.get_ident())
+        return SQLGeneration(prompt_id=user_prompt.id, sql="SELECT 1", status="VALID")
+
+    @override
+    def stream_response(
+        self,
+        user_prompt: Prompt,
+        database_connection: DatabaseConnection,
+        response: SQLGeneration,
+        queue: Queue,
+        metadata: dict = None,
+    ):
+        pass
+
+
+def test_agenerate_response_runs_generate_response_in_a_thread():
+    generator = ThreadGenerator()
+    sql_generation = asyncio.run(
+        generator.agenerate_response(
+            Prompt(id="1", text="how many users", db_connection_id="a"), None
+        )
+    )
+    assert sql_generation.sql == "SELECT 1"
+    assert generator.threads != [threading.get_ident()]
+
+
+def test_catch_exceptions_returns_the_error_of_coroutines():
+    @catch_exceptions()
+    async def fail() -> str:
+        raise ValueError("no such table")
+
+    assert asyncio.iscoroutinefunction(fail)
+    assert asyncio.run(fail()) == "Error: no such table"
+
+
+def test_tools_run_the_same_query_on_the_event_loop(tmp_path):
+    db = SQLDatabase.from_uri(f"sqlite:///{tmp_path / 'users.db'}")
+    db.cache_query_results = False
+    db.engine.execute("CREATE TABLE users (id INTEGER)")
+    db.engine.execute("INSERT INTO users VALUES (1), (2)")
+    tool = QuerySQLDataBaseTool(db=db)
+    query = "```sql\nSELECT COUNT(*) FROM users\n```"
+    assert asyncio.run(tool._arun(query)) == tool._run(query)
+    assert "2" in tool._run(query)
+
+    instructions = GetUserInstructions(db=db, instructions=[{"instruction": "utc"}])
+    assert asyncio.run(instructions._arun("")) == instructions._run("")
@@ -1,6 +1,7 @@
 from fastapi.testclient import TestClient
 
 from dataherald.app import app
+from dataherald.services.sql_generations import SQLGenerationService
 
 client = TestClient(app)
 
@@ -12,3 +13,24 @@ HTTP_404_CODE = 404
 def test_heartbeat():
     response = client.get("/api/v1/heartbeat")
     assert response.status_code == HTTP_200_CODE
+
+
+def test_metrics():
+    response = client.get("/api/v1/metrics")
+    assert response.status_code == HTTP_200_CODE
+    assert isinstance(response.json()["counters"], dict)
+
+
+def test_execute_sql_query_flags_truncated_results(monkeypatch):
+    monkeypatch.setattr(
+        SQLGenerationService,
+        "execute",
+        lambda self, sql_generation_id, max_rows: (  # noqa: ARG005
+            "[(1,)]",
+            {"result": [{"id": 1}], "truncated": True},
+        ),
+    )
+    response = client.get("/api/v1/sql-generations/651f2d76275132d5b65175eb/execute")
+    assert response.status_code == HTTP_200_CODE
+    assert response.json() == [{"id": 1}]
+    assert response.headers["X-Result-Truncated"] == "true"
@@ -0,0 +1,48 @@
+import os
+import stat
+
+from dataherald.utils import s3
+from dataherald.utils.s3 import CredentialFileCache
+
+PRIVATE_FILE_MODE = 0o600
+PRIVATE_DIRECTORY_MODE = 0o700
+
+
+def test_credential_files_are_stored_by_content_and_private(monkeypatch, tmp_path):
+    monkeypatch.setattr(s3, "CREDENTIAL_FILE_CACHE_DIR", str(tmp_path / "credentials"))
+    file_location = CredentialFileCache.add("s3://bucket/a/key.json", b"{}")
+    assert CredentialFileCache.add("s3://bucket/b/key.json", b"{}") == file_location
+    assert CredentialFileCache.get("s3://bucket/a/key.json") == file_location
+    assert file_location.endswith(".json")
+    assert stat.S_IMODE(os.stat(file_location).st_mode) == PRIVATE_FILE_MODE
+    assert (
+        stat.S_IMODE(os.stat(tmp_path / "credentials").st_mode)
+        == PRIVATE_DIRECTORY_MODE
+    )
+
+    monkeypatch.setitem(
+        CredentialFileCache.files, "s3://bucket/a/key.json", (file_location, 0)
+    )
+    assert CredentialFileCache.get("s3://bucket/a/key.json") is None
+
+
+def test_credential_files_are_deleted_once_no_path_uses_them(monkeypatch, tmp_path):
+    monkeypatch.setattr(s3, "CREDENTIAL_FILE_CACHE_DIR", str(tmp_path / "credentials"))
+    monkeypatch.setattr(CredentialFileCache, "files", {})
+    shared = CredentialFileCache.add("s3://bucket/a/key.json", b"{}")
+    CredentialFileCache.add("s3://bucket/b/key.json", b"{}")
+
+    CredentialFileCache.invalidate("s3://bucket/a/key.json")
+    assert os.path.exists(shared)
+    assert CredentialFileCache.get("s3://bucket/a/key.json") is None
+
+    uploaded_again = CredentialFileCache.add("s3://bucket/b/key.json", b'{"a": 1}')
+    assert not os.path.exists(shared)
+    assert CredentialFileCache.get("s3://bucket/b/key.json") == uploaded_again
+
+    monkeypatch.setitem(
+        CredentialFileCache.files, "s3://bucket/b/key.json", (uploaded_again, 0)
+    )
+    CredentialFileCache.add("s3://bucket/c/key.json", b"[]")
+    assert not os.path.exists(uploaded_again)
+    assert list(CredentialFileCache.files) == ["s3://bucket/c/key.json"]
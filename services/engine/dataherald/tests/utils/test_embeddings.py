@@ -0,0 +1,98 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from dataherald.utils import embeddings
+from dataherald.utils.embeddings import CachedEmbeddings, EmbeddingCache
+
+
+class SlowEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = []
+        self.release = Event()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(texts)
+        self.release.wait(5)
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def test_texts_are_embedded_once_across_concurrent_requests():
+    client = SlowEmbeddings()
+    embedding = CachedEmbeddings(client, "test-embeddings")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(embedding.embed_query, "how many users?") for _ in range(4)
+        ]
+        client.release.set()
+        assert [future.result() for future in futures] == [[15.0]] * 4
+
+    assert embedding.embed_documents(["how many users?", "orders", "orders"]) == [
+        [15.0],
+        [6.0],
+        [6.0],
+    ]
+    assert client.calls == [["how many users?"], ["orders"]]
+
+
+class InterruptedEmbeddings(Embeddings):
+    def __init__(self):
+        self.started = Event()
+        self.release = Event()
+        self.calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.calls == 1:
+            self.started.set()
+            self.release.wait(5)
+            raise KeyboardInterrupt
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def test_requests_waiting_for_an_interrupted_embedding_do_not_hang(monkeypatch):
+    client = InterruptedEmbeddings()
+    embedding = CachedEmbeddings(client, "interrupted-embeddings")
+    reserve = EmbeddingCache.reserve
+    reserved = Event()
+
+    def reserve_and_notify(keys: list) -> tuple:
+        result = reserve(keys)
+        reserved.set()
+        return result
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        interrupted = executor.submit(embedding.embed_query, "revenue")
+        client.started.wait(5)
+        monkeypatch.setattr(EmbeddingCache, "reserve", reserve_and_notify)
+        waiting = executor.submit(embedding.embed_query, "revenue")
+        reserved.wait(5)
+        client.release.set()
+        with pytest.raises(KeyboardInterrupt):
+            interrupted.result()
+        with pytest.raises(RuntimeError, match="interrupted"):
+            waiting.result(timeout=5)
+    assert embedding.embed_query("revenue") == [7.0]
+
+
+def test_requests_embed_the_texts_themselves_after_waiting(monkeypatch):
+    monkeypatch.setattr(embeddings, "EMBEDDING_CACHE_WAIT", 0.01)
+    client = SlowEmbeddings()
+    embedding = CachedEmbeddings(client, "waited-embeddings")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        slow = executor.submit(embedding.embed_query, "orders")
+        while not client.calls:
+            time.sleep(0.001)
+        client.release.set()
+        assert embedding.embed_query("orders") == [6.0]
+        assert slow.result() == [6.0]
@@ -0,0 +1,54 @@
+import gzip
+import io
+
+import pyarrow.parquet as pq
+
+from dataherald.sql_database.arrow import fetch_arrow_batches
+from dataherald.sql_database.base import SQLDatabase
+from dataherald.utils.result_stream import (
+    encode_csv,
+    encode_jsonl,
+    encode_parquet,
+    limit_batches,
+)
+
+# The header, then the three rows read two at a time
+CSV_CHUNKS = 3
+
+
+def get_database() -> SQLDatabase:
+    db = SQLDatabase.from_uri("sqlite:///:memory:")
+    db.engine.execute("CREATE TABLE orders (id INTEGER, name TEXT)")
+    db.engine.execute("INSERT INTO orders VALUES (1, 'a,b'), (2, NULL), (3, 'c')")
+    return db
+
+
+def test_encode_csv_streams_the_rows_in_batches():
+    columns, batches = get_database().stream_sql(
+        "SELECT id, name FROM orders", batch_size=2
+    )
+    chunks = list(encode_csv(columns, batches))
+    assert len(chunks) == CSV_CHUNKS
+    assert b"".join(chunks).decode() == 'id,name\r\n1,"a,b"\r\n2,\r\n3,c\r\n'
+
+
+def test_encode_csv_compressed():
+    columns, batches = get_database().stream_sql("SELECT id, name FROM orders")
+    content = b"".join(encode_csv(columns, batches, compress=True))
+    assert gzip.decompress(content).decode().startswith("id,name\r\n1,")
+
+
+def test_encode_jsonl_stops_after_max_rows():
+    columns, batches = get_database().stream_sql(
+        "SELECT id, name FROM orders", batch_size=2
+    )
+    content = b"".join(encode_jsonl(columns, limit_batches(batches, 2)))
+    assert content.decode() == '{"id": 1, "name": "a,b"}\n{"id": 2, "name": null}\n'
+
+
+def test_encode_parquet():
+    columns, batches = fetch_arrow_batches(
+        get_database(), "SELECT id, name FROM orders", batch_size=2
+    )
+    table = pq.read_table(io.BytesIO(b"".join(encode_parquet(columns, batches))))
+    assert table.to_pydict() == {"id": [1, 2, 3], "name": ["a,b", None, "c"]}
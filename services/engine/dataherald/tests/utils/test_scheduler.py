@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+import pytest
+
+from dataherald.utils import scheduler
+from dataherald.utils.scheduler import (
+    GenerationQueueFullError,
+    GenerationScheduler,
+    StreamQueue,
+)
+
+
+def test_admit_queues_and_rejects(monkeypatch):
+    monkeypatch.setattr(scheduler, "GENERATION_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(scheduler, "GENERATION_MAX_PER_CONNECTION", 1)
+    monkeypatch.setattr(scheduler, "GENERATION_QUEUE_SIZE", 1)
+    generation_scheduler = GenerationScheduler()
+    started = []
+
+    async def generate(db_connection_id: str):
+        async with generation_scheduler.admit(db_connection_id):
+            started.append(db_connection_id)
+            await asyncio.sleep(0.05)
+
+    async def run():
+        return await asyncio.gather(
+            generate("a"),
+            generate("a"),
+            generate("a"),
+            generate("b"),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert isinstance(results[2], GenerationQueueFullError)
+    assert sorted(started) == ["a", "a", "b"]
+    assert generation_scheduler.running == 0
+    assert generation_scheduler.queued == 0
+
+
+def test_get_tenant_id():
+    assert scheduler.get_tenant_id(None) is None
+    assert scheduler.get_tenant_id({"dh_internal": {"organization_id": "org"}}) == "org"
+
+
+@pytest.mark.parametrize("metadata", [{}, {"dh_internal": None}])
+def test_get_tenant_id_without_organization(metadata):
+    assert scheduler.get_tenant_id(metadata) is None
+
+
+def test_stream_queue_hands_thread_items_to_the_event_loop():
+    async def run():
+        queue = StreamQueue(asyncio.get_running_loop())
+        thread = threading.Thread(
+            target=lambda: [queue.put(item) for item in ["a", "b", None]]
+        )
+        thread.start()
+        items = []
+        while (item := await queue.aget()) is not None:
+            items.append(item)
+        thread.join()
+        return items
+
+    assert asyncio.run(run()) == ["a", "b"]
+
+
+def test_acquire_release_is_idempotent():
+    generation_scheduler = GenerationScheduler()
+
+    async def run():
+        release = await generation_scheduler.acquire("a", None)
+        assert generation_scheduler.running == 1
+        await release()
+        await release()
+
+    asyncio.run(run())
+    assert generation_scheduler.running == 0
@@ -0,0 +1,23 @@
+from dataherald.utils.table_ranking import TableRanker
+
+SQRT_HALF = 0.7071
+
+
+def test_top_k_sorted_by_cosine_similarity():
+    ranker = TableRanker([[1.0, 0.0], [10.0, 10.0], [0.0, 3.0], [-1.0, 0.0]])
+    indexes, similarities = ranker.top_k([0.0, 1.0], 2)
+    assert list(indexes) == [2, 1]
+    assert round(float(similarities[0]), 4) == 1.0
+    assert round(float(similarities[1]), 4) == SQRT_HALF
+
+
+def test_top_k_with_more_than_available_tables():
+    ranker = TableRanker([[1.0, 0.0], [0.0, 1.0]])
+    indexes, _ = ranker.top_k([1.0, 0.0], 20)
+    assert list(indexes) == [0, 1]
+
+
+def test_top_k_without_tables():
+    indexes, similarities = TableRanker([]).top_k([1.0, 0.0], 20)
+    assert len(indexes) == 0
+    assert len(similarities) == 0
@@ -0,0 +1,55 @@
+from dataherald.types import GoldenSQL
+from dataherald.vector_store import chroma
+from dataherald.vector_store.chroma import Chroma
+
+
+class FakeCollection:
+    def __init__(self):
+        self.rows = {}
+        self.upserts = []
+
+    def get(self, ids: list, include: list) -> dict:  # noqa: ARG002
+        return {"ids": [id for id in ids if id in self.rows]}
+
+    def upsert(self, ids: list, documents: list, metadatas: list):
+        self.upserts.append(ids)
+        self.rows.update(zip(ids, zip(documents, metadatas, strict=True), strict=True))
+
+
+class FakeClient:
+    def __init__(self, path: str):  # noqa: ARG002
+        self.collection = FakeCollection()
+
+    def get_or_create_collection(
+        self, collection: str
+    ) -> FakeCollection:  # noqa: ARG002
+        return self.collection
+
+
+def test_add_records_upserts_the_new_records_in_batches(monkeypatch):
+    monkeypatch.setattr(chroma.chromadb, "PersistentClient", FakeClient)
+    monkeypatch.setattr(chroma, "CHROMA_BATCH_SIZE", 2)
+    vector_store = Chroma(None)
+    collection = vector_store.chroma_client.collection
+    collection.rows["2"] = ("stored", {})
+    golden_sqls = [
+        GoldenSQL(
+            id=str(index),
+            prompt_text=f"question {index}",
+            sql="SELECT id FROM users",
+            db_connection_id="a",
+        )
+        for index in range(1, 6)
+    ]
+
+    vector_store.add_records(golden_sqls, "golden-sqls")
+    assert collection.upserts == [["1"], ["3", "4"], ["5"]]
+    assert collection.rows["2"] == ("stored", {})
+    assert collection.rows["3"] == (
+        "question 3",
+        {"tables_used": "users", "db_connection_id": "a"},
+    )
+
+    upserts = len(collection.upserts)
+    vector_store.add_records(golden_sqls, "golden-sqls")
+    assert len(collection.upserts) == upserts
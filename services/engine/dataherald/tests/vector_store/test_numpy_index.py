@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from dataherald.types import GoldenSQL
+from dataherald.vector_store.numpy_index import NumpyIndex
+
+RECORDS_PER_PROCESS = 50
+VECTORS = {
+    "how many users": [1.0, 0.0],
+    "count the users": [0.9, 0.1],
+    "total revenue": [0.0, 1.0],
+}
+
+
+class FakeEmbeddings(Embeddings):
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [VECTORS[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return VECTORS[text]
+
+
+def test_numpy_index_filters_by_db_connection_and_deletes(monkeypatch, tmp_path):
+    vector_store = NumpyIndex(None, str(tmp_path))
+    monkeypatch.setattr(vector_store, "get_embedding", lambda _: FakeEmbeddings())
+    vector_store.add_records(
+        [
+            GoldenSQL(
+                id="1", prompt_text="how many users", sql="", db_connection_id="a"
+            ),
+            GoldenSQL(
+                id="2", prompt_text="total revenue", sql="", db_connection_id="a"
+            ),
+            GoldenSQL(
+                id="3", prompt_text="how many users", sql="", db_connection_id="b"
+            ),
+        ],
+        "golden-sqls",
+    )
+    vector_store.add_record("count the users", "a", "golden-sqls", [{}], ["4"])
+
+    results = vector_store.query(["how many users"], "a", "golden-sqls", 2)
+    assert [result["id"] for result in results] == ["1", "4"]
+    assert results[0]["score"] == 1.0
+
+    vector_store.delete_record("golden-sqls", "1")
+    results = vector_store.query(["how many users"], "a", "golden-sqls", 5)
+    assert [result["id"] for result in results] == ["4", "2"]
+    assert vector_store.query(["how many users"], "c", "golden-sqls", 5) == []
+
+    vector_store.delete_record("golden-sqls", "4")
+    vector_store.delete_record("golden-sqls", "2")
+    assert vector_store.query(["how many users"], "a", "golden-sqls", 5) == []
+
+
+def test_numpy_index_keeps_the_loaded_rows_while_the_vectors_are_rewritten(
+    monkeypatch, tmp_path
+):
+    vector_store = NumpyIndex(None, str(tmp_path))
+    monkeypatch.setattr(vector_store, "get_embedding", lambda _: FakeEmbeddings())
+    vector_store.add_record("how many users", "a", "golden-sqls", [{}], ["1"])
+    vector_store.add_record("total revenue", "a", "golden-sqls", [{}], ["2"])
+    results = vector_store.query(["total revenue"], "a", "golden-sqls", 5)
+    assert [result["id"] for result in results] == ["2", "1"]
+
+    # Another process compacted the vectors and has not written the ids yet
+    vectors_path, ids_path = vector_store.get_paths("golden-sqls", "a")
+    with open(f"{vectors_path}.tmp", "wb") as file_object:
+        file_object.write(bytes(2 * 4))
+    os.replace(f"{vectors_path}.tmp", vectors_path)
+    os.utime(ids_path, ns=(0, 0))
+    results = vector_store.query(["total revenue"], "a", "golden-sqls", 5)
+    assert [result["id"] for result in results] == ["2", "1"]
+
+
+def test_numpy_index_deletes_records_added_by_another_process(monkeypatch, tmp_path):
+    writer = NumpyIndex(None, str(tmp_path))
+    monkeypatch.setattr(writer, "get_embedding", lambda _: FakeEmbeddings())
+    writer.add_record("how many users", "a", "golden-sqls", [{}], ["1"])
+    writer.add_record("total revenue", "b", "golden-sqls", [{}], ["2"])
+    writer.add_record("count the users", "b", "golden-sqls", [{}], ["3"])
+
+    vector_store = NumpyIndex(None, str(tmp_path))
+    monkeypatch.setattr(vector_store, "get_embedding", lambda _: FakeEmbeddings())
+    vector_store.delete_record("golden-sqls", "2")
+    assert vector_store.db_connection_ids == {
+        ("golden-sqls", "1"): "a",
+        ("golden-sqls", "3"): "b",
+    }
+    results = vector_store.query(["total revenue"], "b", "golden-sqls", 5)
+    assert [result["id"] for result in results] == ["3"]
+    vector_store.delete_record("golden-sqls", "missing")
+
+
+def append_records(persist_directory: str, first: int):
+    vector_store = NumpyIndex(None, persist_directory)
+    for index in range(first, first + RECORDS_PER_PROCESS):
+        vector_store.append("golden-sqls", "a", [str(index)], [[float(index), 1.0]])
+
+
+def test_numpy_index_processes_append_one_at_a_time(tmp_path):
+    processes = [
+        multiprocessing.get_context("fork").Process(
+            target=append_records, args=(str(tmp_path), first)
+        )
+        for first in (0, RECORDS_PER_PROCESS)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    vector_store = NumpyIndex(None, str(tmp_path))
+    with vector_store.lock:
+        sub_index = vector_store.load("golden-sqls", "a")
+    assert sorted(sub_index["ids"], key=int) == [
+        str(index) for index in range(2 * RECORDS_PER_PROCESS)
+    ]
+    for id, vector in zip(sub_index["ids"], sub_index["vectors"], strict=True):
+        assert np.allclose(vector, [int(id), 1.0] / np.linalg.norm([int(id), 1.0]))
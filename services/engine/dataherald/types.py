@@ -6,7 +6,11 @@ from bson.errors import InvalidId
 from bson.objectid import ObjectId
 from pydantic import BaseModel, Field, validator
 
-from dataherald.sql_database.models.types import FileStorage, SSHSettings
+from dataherald.sql_database.models.types import (
+    FileStorage,
+    SSHSettings,
+    validate_pool_size,
+)
 from dataherald.utils.models_context_window import OPENAI_FINETUNING_MODELS_WINDOW_SIZES
 
 
@@ -81,6 +85,7 @@ class SupportedDatabase(Enum):
 class ScannerRequest(BaseModel):
     ids: list[str] | None
     metadata: dict | None
+    incremental: bool = False
 
     @validator("ids")
     def ids_validation(cls, ids: list = None):
@@ -101,8 +106,15 @@ class DatabaseConnectionRequest(BaseModel):
     llm_api_key: str | None
     ssh_settings: SSHSettings | None
     file_storage: FileStorage | None
+    sql_validation_mode: str | None
+    cache_query_results: bool = True
+    pool_size: int | None
     metadata: dict | None
 
+    @validator("pool_size")
+    def pool_size_range(cls, value: int | None):
+        return validate_pool_size(value)
+
 
 class ForeignKeyDetail(BaseModel):
     field_name: str
@@ -0,0 +1,133 @@
+"""Embedding clients shared by the vector stores and the agents, with a process wide
+cache of the embedded texts"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import AzureOpenAIEmbeddings, OpenAIEmbeddings
+
+from dataherald.utils import metrics
+
+# Number of embeddings kept in memory and seconds they are reused, 0 disables the cache
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_TTL = int(os.environ.get("EMBEDDING_CACHE_TTL", "3600"))
+# Seconds a request waits for the texts another request is embedding before it embeds
+# them itself
+EMBEDDING_CACHE_WAIT = float(os.environ.get("EMBEDDING_CACHE_WAIT", "60"))
+
+
+class EmbeddingCache:
+    """LRU of embeddings keyed by model and hash of the text. Texts that are being
+    embedded are tracked so concurrent requests wait for the same call"""
+
+    entries = OrderedDict()
+    pending = {}
+    lock = Lock()
+
+    @staticmethod
+    def get_key(model: str, text: str) -> tuple:
+        return model, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def reserve(keys: List[tuple]) -> tuple[dict, dict, list]:
+        """Splits the keys in cached vectors, futures of the ones embedded by other
+        requests and the ones the caller has to embed"""
+        vectors, waiting, missing = {}, {}, []
+        now = time.monotonic()
+        with EmbeddingCache.lock:
+            for key in keys:
+                if key in vectors or key in waiting or key in missing:
+                    continue
+                entry = EmbeddingCache.entries.get(key)
+                if entry is not None and entry[1] > now:
+                    EmbeddingCache.entries.move_to_end(key)
+                    vectors[key] = entry[0]
+                elif key in EmbeddingCache.pending:
+                    waiting[key] = EmbeddingCache.pending[key]
+                else:
+                    EmbeddingCache.pending[key] = Future()
+                    missing.append(key)
+        metrics.increment("embedding_cache.hits", len(vectors) + len(waiting))
+        metrics.increment("embedding_cache.misses", len(missing))
+        return vectors, waiting, missing
+
+    @staticmethod
+    def add(keys: List[tuple], vectors: List[List[float]]) -> None:
+        expires_at = time.monotonic() + EMBEDDING_CACHE_TTL
+        with EmbeddingCache.lock:
+            for key, vector in zip(keys, vectors, strict=True):
+                if EMBEDDING_CACHE_SIZE > 0 and EMBEDDING_CACHE_TTL > 0:
+                    EmbeddingCache.entries[key] = (vector, expires_at)
+                    EmbeddingCache.entries.move_to_end(key)
+                EmbeddingCache.pending.pop(key).set_result(vector)
+            while len(EmbeddingCache.entries) > EMBEDDING_CACHE_SIZE:
+                EmbeddingCache.entries.popitem(last=False)
+
+    @staticmethod
+    def fail(keys: List[tuple], error: BaseException) -> None:
+        if not isinstance(error, Exception):
+            # The waiting requests fail without being interrupted themselves
+            error = RuntimeError(f"Embedding was interrupted: {error!r}")
+        with EmbeddingCache.lock:
+            for key in keys:
+                EmbeddingCache.pending.pop(key).set_exception(error)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeds the texts that are not cached in a single call to the client"""
+
+    def __init__(self, client: Embeddings, model: str):
+        self.client = client
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [EmbeddingCache.get_key(self.model, text) for text in texts]
+        vectors, waiting, missing = EmbeddingCache.reserve(keys)
+        texts_by_key = dict(zip(keys, texts, strict=True))
+        if missing:
+            try:
+                embedded = self.client.embed_documents(
+                    [texts_by_key[key] for key in missing]
+                )
+            except BaseException as e:
+                # Interrupts too, the requests waiting for these keys would never return
+                EmbeddingCache.fail(missing, e)
+                raise
+            EmbeddingCache.add(missing, embedded)
+            vectors.update(zip(missing, embedded, strict=True))
+        for key, future in waiting.items():
+            try:
+                vectors[key] = future.result(timeout=EMBEDDING_CACHE_WAIT)
+            except TimeoutError:
+                vectors[key] = self.client.embed_documents([texts_by_key[key]])[0]
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class EmbeddingClients:
+    """One client per api key and model"""
+
+    clients = {}
+    lock = Lock()
+
+    @staticmethod
+    def get(api_key: str | None, model: str, azure: bool = False) -> CachedEmbeddings:
+        key = (hashlib.sha256(f"{api_key}".encode()).hexdigest(), model, azure)
+        with EmbeddingClients.lock:
+            embedding = EmbeddingClients.clients.get(key)
+            if embedding is None:
+                if azure:
+                    client = AzureOpenAIEmbeddings(openai_api_key=api_key, model=model)
+                else:
+                    client = OpenAIEmbeddings(openai_api_key=api_key, model=model)
+                embedding = CachedEmbeddings(client, model)
+                EmbeddingClients.clients[key] = embedding
+            return embedding
@@ -1,12 +1,30 @@
+import os
+from functools import lru_cache
+
 from cryptography.fernet import Fernet
 
 from dataherald.config import Settings
 
+# Decrypted values kept in memory, the same tokens are decrypted on every request
+DECRYPT_CACHE_SIZE = int(os.environ.get("DECRYPT_CACHE_SIZE", "1024"))
+
+
+@lru_cache(maxsize=1)
+def get_fernet() -> Fernet:
+    """The key is read from the settings once per process"""
+    settings = Settings()
+    return Fernet(settings.require("encrypt_key"))
+
+
+@lru_cache(maxsize=DECRYPT_CACHE_SIZE)
+def decrypt_token(token: str) -> str:
+    # Invalid tokens raise and are not cached
+    return get_fernet().decrypt(token).decode("utf-8")
+
 
 class FernetEncrypt:
     def __init__(self):
-        settings = Settings()
-        self.fernet_key = Fernet(settings.require("encrypt_key"))
+        self.fernet_key = get_fernet()
 
     def encrypt(self, input: str) -> str:
         if not input:
@@ -16,4 +34,4 @@ class FernetEncrypt:
     def decrypt(self, input: str) -> str:
         if input == "":
             return ""
-        return self.fernet_key.decrypt(input).decode("utf-8")
+        return decrypt_token(input)
@@ -20,6 +20,7 @@ ERROR_MAPPING = {
     "NLGenerationError": "nl_generation_not_created",
     "MalformedGoldenSQLError": "invalid_golden_sql",
     "SchemaNotSupportedError": "schema_not_supported",
+    "GenerationQueueFullError": "too_many_requests",
 }
 
 
@@ -38,8 +39,10 @@ def error_response(error, detail: dict, default_error_code=""):
 
     detail.pop("metadata", None)
 
+    retry_after = getattr(error, "retry_after", None)
     return JSONResponse(
-        status_code=400,
+        status_code=429 if retry_after else 400,
+        headers={"Retry-After": str(retry_after)} if retry_after else None,
         content={
             "error_code": error_code,
             "message": str(error),
@@ -0,0 +1,16 @@
+from collections import Counter
+from threading import Lock
+from typing import Dict
+
+_counters: Counter = Counter()
+_lock = Lock()
+
+
+def increment(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def get_counters() -> Dict[str, int]:
+    with _lock:
+        return dict(_counters)
@@ -0,0 +1,169 @@
+"""Encoders that turn batches of query results into a stream of bytes, each batch is
+encoded as soon as it is read so only one of them is held in memory"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, List
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+RESULT_FORMATS = ["json", "csv", "jsonl", "arrow", "parquet"]
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def limit_batches(batches: Iterable, max_rows: int | None) -> Iterator:
+    """Stops after max_rows, works for lists of rows and Arrow record batches"""
+    if not max_rows:
+        yield from batches
+        return
+    remaining = max_rows
+    for batch in batches:
+        if len(batch) >= remaining:
+            yield batch[:remaining]
+            break
+        remaining -= len(batch)
+        yield batch
+    if hasattr(batches, "close"):
+        batches.close()
+
+
+def compress_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def encode_csv(
+    columns: List[str], batches: Iterable[list], compress: bool = False
+) -> Iterator[bytes]:
+    """Encodes the header and each batch of rows, optionally as a gzip stream"""
+    if compress:
+        yield from compress_chunks(encode_csv(columns, batches))
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> bytes:
+        chunk = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+
+    writer.writerow(columns)
+    yield flush()
+    for rows in batches:
+        writer.writerows(rows)
+        chunk = flush()
+        if chunk:
+            yield chunk
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_jsonl(
+    columns: List[str], batches: Iterable[list], compress: bool = False
+) -> Iterator[bytes]:
+    """Encodes each row as a JSON object in its own line, optionally as a gzip stream"""
+    if compress:
+        yield from compress_chunks(encode_jsonl(columns, batches))
+        return
+    for rows in batches:
+        lines = [
+            json.dumps(dict(zip(columns, row, strict=True)), default=json_default)
+            for row in rows
+        ]
+        if lines:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def get_schema(
+    columns: List[str], batches: Iterator[pa.RecordBatch]
+) -> tuple[pa.Schema, Iterator[pa.RecordBatch]]:
+    """Schema of the first batch, or columns of unknown type for empty results"""
+    first_batch = next(batches, None)
+    if first_batch is None:
+        return pa.schema([(column, pa.null()) for column in columns]), iter(())
+
+    def all_batches():
+        yield first_batch
+        yield from batches
+
+    return first_batch.schema, all_batches()
+
+
+def to_table(batch: pa.RecordBatch, schema: pa.Schema) -> pa.Table:
+    """Batches converted from rows infer their own types, they are cast to the schema
+    of the first one"""
+    table = pa.Table.from_batches([batch])
+    return table if table.schema == schema else table.cast(schema)
+
+
+class ChunkSink(io.RawIOBase):
+    """Write only file that keeps what was written until it is drained, its position
+    keeps growing so the Parquet footer offsets stay right"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def encode_arrow(
+    columns: List[str], batches: Iterator[pa.RecordBatch]
+) -> Iterator[bytes]:
+    """Encodes the record batches in the Arrow IPC streaming format"""
+    schema, batches = get_schema(columns, iter(batches))
+    sink = ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            writer.write_table(to_table(batch, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def encode_parquet(
+    columns: List[str], batches: Iterator[pa.RecordBatch]
+) -> Iterator[bytes]:
+    """Writes each record batch as a Parquet row group"""
+    schema, batches = get_schema(columns, iter(batches))
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            writer.write_table(to_table(batch, schema))
+            yield sink.drain()
+    yield sink.drain()
@@ -1,11 +1,109 @@
+import hashlib
 import os
+import tempfile
+import time
+from threading import Lock
 
 import boto3
 from cryptography.fernet import InvalidToken
 
 from dataherald.config import Settings
 from dataherald.sql_database.models.types import FileStorage
-from dataherald.utils.encrypt import FernetEncrypt
+from dataherald.utils.encrypt import FernetEncrypt, get_fernet
+
+# Downloaded credential files are reused for this many seconds, 0 disables the cache
+CREDENTIAL_FILE_CACHE_TTL = int(os.environ.get("CREDENTIAL_FILE_CACHE_TTL", "3600"))
+CREDENTIAL_FILE_CACHE_DIR = os.environ.get(
+    "CREDENTIAL_FILE_CACHE_DIR", "tmp/credentials"
+)
+
+
+class CredentialFileCache:
+    """Decrypted files downloaded from S3, stored under the hash of their content and
+    readable only by the owner of the process. Files are deleted once they expire or
+    are invalidated and no other path shares them"""
+
+    files = {}
+    lock = Lock()
+
+    @staticmethod
+    def get(path: str) -> str | None:
+        with CredentialFileCache.lock:
+            entry = CredentialFileCache.files.get(path)
+            if entry is None:
+                return None
+            file_location, expires_at = entry
+            if time.monotonic() >= expires_at or not os.path.exists(file_location):
+                CredentialFileCache._remove(path)
+                return None
+        return file_location
+
+    @staticmethod
+    def add(path: str, content: bytes) -> str:
+        """Writes the content unless a file with the same hash is already there"""
+        os.makedirs(CREDENTIAL_FILE_CACHE_DIR, mode=0o700, exist_ok=True)
+        os.chmod(CREDENTIAL_FILE_CACHE_DIR, 0o700)
+        extension = os.path.splitext(path)[1]
+        file_location = os.path.join(
+            CREDENTIAL_FILE_CACHE_DIR,
+            f"{hashlib.sha256(content).hexdigest()}{extension}",
+        )
+        with CredentialFileCache.lock:
+            # Files of another content under the same path are not used anymore
+            CredentialFileCache._remove(path)
+            if not os.path.exists(file_location):
+                # mkstemp creates the file with 0600, the rename makes it visible
+                # complete
+                descriptor, temp_location = tempfile.mkstemp(
+                    dir=CREDENTIAL_FILE_CACHE_DIR
+                )
+                with os.fdopen(descriptor, "wb") as file_object:
+                    file_object.write(content)
+                os.replace(temp_location, file_location)
+            if CREDENTIAL_FILE_CACHE_TTL > 0:
+                CredentialFileCache.files[path] = (
+                    file_location,
+                    time.monotonic() + CREDENTIAL_FILE_CACHE_TTL,
+                )
+            CredentialFileCache._remove_expired()
+        return file_location
+
+    @staticmethod
+    def invalidate(path: str | None) -> None:
+        """Deletes the file of a path, used when the file is uploaded again"""
+        if not path:
+            return
+        with CredentialFileCache.lock:
+            CredentialFileCache._remove(path)
+
+    @staticmethod
+    def _remove_expired() -> None:
+        """Called with the lock"""
+        now = time.monotonic()
+        expired = [
+            path
+            for path, (_, expires_at) in CredentialFileCache.files.items()
+            if now >= expires_at
+        ]
+        for path in expired:
+            CredentialFileCache._remove(path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        """Called with the lock, keeps the file while another path uses it"""
+        entry = CredentialFileCache.files.pop(path, None)
+        if entry is None:
+            return
+        file_location = entry[0]
+        if any(
+            location == file_location
+            for location, _ in CredentialFileCache.files.values()
+        ):
+            return
+        try:
+            os.remove(file_location)
+        except FileNotFoundError:
+            pass
 
 
 class S3:
@@ -61,10 +159,15 @@ class S3:
             file_location, bucket_name, os.path.basename(file_location)
         )
         os.remove(file_location)
-        return f"s3://{bucket_name}/{file_name}"
+        s3_uri = f"s3://{bucket_name}/{file_name}"
+        CredentialFileCache.invalidate(s3_uri)
+        return s3_uri
 
     def download(self, path: str, file_storage: FileStorage | None = None) -> str:
-        fernet_encrypt = FernetEncrypt()
+        file_location = CredentialFileCache.get(path)
+        if file_location is not None:
+            return file_location
+        s3_uri = path
         path = path.split("/")
         if file_storage:
             fernet_encrypt = FernetEncrypt()
@@ -78,21 +181,25 @@ class S3:
         else:
             s3_client = self._get_client()
 
-        file_location = f"tmp/{path[-1]}"
         s3_path = path[-1]
         if len(s3_path[3:]) > 1:
             s3_path = "/".join(path[3:])
 
-        s3_client.download_file(
-            Bucket=path[2], Key=f"{s3_path}", Filename=file_location
-        )
+        os.makedirs(CREDENTIAL_FILE_CACHE_DIR, mode=0o700, exist_ok=True)
+        descriptor, temp_location = tempfile.mkstemp(dir=CREDENTIAL_FILE_CACHE_DIR)
+        os.close(descriptor)
+        try:
+            s3_client.download_file(
+                Bucket=path[2], Key=f"{s3_path}", Filename=temp_location
+            )
+            with open(temp_location, "rb") as file_object:
+                content = file_object.read()
+        finally:
+            os.remove(temp_location)
         # Decrypt file content if it is encrypted
         try:
-            with open(file_location) as file_object:
-                decrypted_content = fernet_encrypt.decrypt(file_object.read())
-            with open(file_location, "w") as file_object:
-                file_object.write(decrypted_content)
-        except (InvalidToken, UnicodeDecodeError):
+            content = get_fernet().decrypt(content)
+        except InvalidToken:
             pass
 
-        return file_location
+        return CredentialFileCache.add(s3_uri, content)
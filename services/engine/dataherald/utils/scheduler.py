@@ -0,0 +1,161 @@
+import asyncio
+import os
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from queue import Queue
+from threading import Lock
+from typing import Any, AsyncIterator, Awaitable, Callable, List
+
+from dataherald.utils import metrics
+
+GENERATION_MAX_CONCURRENCY = int(os.environ.get("GENERATION_MAX_CONCURRENCY", "32"))
+GENERATION_MAX_PER_CONNECTION = int(
+    os.environ.get("GENERATION_MAX_PER_CONNECTION", "8")
+)
+GENERATION_MAX_PER_TENANT = int(os.environ.get("GENERATION_MAX_PER_TENANT", "16"))
+GENERATION_QUEUE_SIZE = int(os.environ.get("GENERATION_QUEUE_SIZE", "128"))
+GENERATION_RETRY_AFTER = int(os.environ.get("GENERATION_RETRY_AFTER", "10"))
+
+
+class GenerationQueueFullError(Exception):
+    def __init__(self, message: str, retry_after: int = GENERATION_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def get_tenant_id(metadata: dict | None) -> str | None:
+    """Organization of the request, set by the enterprise layer in dh_internal"""
+    if not metadata or not isinstance(metadata.get("dh_internal"), dict):
+        return None
+    organization_id = metadata["dh_internal"].get("organization_id")
+    return str(organization_id) if organization_id else None
+
+
+class StreamQueue(Queue):
+    """Queue the generation threads put the streamed steps in, every item is handed to
+    an asyncio.Queue of the event loop so the response awaits it instead of polling"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        super().__init__()
+        self.loop = loop
+        self.items: asyncio.Queue = asyncio.Queue()
+
+    def put(
+        self,
+        item: Any,
+        block: bool = True,  # noqa: ARG002
+        timeout: float | None = None,  # noqa: ARG002
+    ) -> None:
+        self.loop.call_soon_threadsafe(self.items.put_nowait, item)
+
+    async def aget(self) -> Any:
+        return await self.items.get()
+
+
+class GenerationScheduler:
+    """Admits SQL generations while at most GENERATION_MAX_CONCURRENCY are running, with
+    lower limits per db connection and per tenant. Generations that can not start wait
+    in a queue of GENERATION_QUEUE_SIZE, once it is full they are rejected. Blocking
+    generations run in a worker pool of the same size"""
+
+    _instance: "GenerationScheduler" = None
+    _instance_lock = Lock()
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=GENERATION_MAX_CONCURRENCY, thread_name_prefix="generation"
+        )
+        self.running = 0
+        self.queued = 0
+        self.running_by_key: Counter = Counter()
+        self._condition: asyncio.Condition | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @classmethod
+    def get(cls) -> "GenerationScheduler":
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def get_keys(self, db_connection_id: str, tenant_id: str | None) -> List[str]:
+        keys = [f"connection:{db_connection_id}"]
+        if tenant_id:
+            keys.append(f"tenant:{tenant_id}")
+        return keys
+
+    def can_start(self, keys: List[str]) -> bool:
+        if self.running >= GENERATION_MAX_CONCURRENCY:
+            return False
+        for key in keys:
+            limit = (
+                GENERATION_MAX_PER_CONNECTION
+                if key.startswith("connection:")
+                else GENERATION_MAX_PER_TENANT
+            )
+            if self.running_by_key[key] >= limit:
+                return False
+        return True
+
+    async def acquire(
+        self, db_connection_id: str, tenant_id: str | None = None
+    ) -> Callable[[], Awaitable[None]]:
+        """Waits until the generation can start and returns the function that frees its
+        slot, which can be called more than once. Raises GenerationQueueFullError when
+        it can not start and the queue is full"""
+        keys = self.get_keys(str(db_connection_id), tenant_id)
+        condition = self.get_condition()
+        async with condition:
+            if not self.can_start(keys):
+                if self.queued >= GENERATION_QUEUE_SIZE:
+                    metrics.increment("generation_scheduler.rejected")
+                    raise GenerationQueueFullError(
+                        "Too many SQL generations in progress, retry later"
+                    )
+                self.queued += 1
+                try:
+                    await condition.wait_for(lambda: self.can_start(keys))
+                finally:
+                    self.queued -= 1
+            self.running += 1
+            for key in keys:
+                self.running_by_key[key] += 1
+        metrics.increment("generation_scheduler.admitted")
+        released = False
+
+        async def release() -> None:
+            nonlocal released
+            async with condition:
+                if released:
+                    return
+                released = True
+                self.running -= 1
+                for key in keys:
+                    self.running_by_key[key] -= 1
+                    if self.running_by_key[key] == 0:
+                        del self.running_by_key[key]
+                condition.notify_all()
+
+        return release
+
+    @asynccontextmanager
+    async def admit(
+        self, db_connection_id: str, tenant_id: str | None = None
+    ) -> AsyncIterator[None]:
+        """Runs the block once the generation is admitted, see acquire"""
+        release = await self.acquire(db_connection_id, tenant_id)
+        try:
+            yield
+        finally:
+            await release()
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        return self.executor.submit(fn, *args, **kwargs)
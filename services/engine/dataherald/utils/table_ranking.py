@@ -0,0 +1,43 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+class TableRanker:
+    """Keeps L2-normalized float32 table embeddings so ranking a question against every
+    table is a single matrix-vector product"""
+
+    def __init__(self, embeddings: List[List[float]]):
+        if len(embeddings) == 0:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+            return
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = matrix / norms
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def similarities(self, query_embedding: List[float]) -> np.ndarray:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(len(self), dtype=np.float32)
+        return self.matrix @ (query / norm)
+
+    def top_k(
+        self, query_embedding: List[float], k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the indexes and cosine similarities of the k most similar tables,
+        sorted from the most to the least similar"""
+        if len(self) == 0 or k <= 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        scores = self.similarities(query_embedding)
+        k = min(k, len(scores))
+        if k < len(scores):
+            indexes = np.argpartition(-scores, k - 1)[:k]
+        else:
+            indexes = np.arange(len(scores))
+        indexes = indexes[np.argsort(-scores[indexes], kind="stable")]
+        return indexes, scores[indexes]
@@ -1,24 +1,23 @@
-import threading
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+SQL_EXECUTION_WORKERS = int(os.environ.get("SQL_EXECUTION_WORKERS", "32"))
+
+# Shared by every caller so the number of threads running SQL stays bounded
+_executor = ThreadPoolExecutor(
+    max_workers=SQL_EXECUTION_WORKERS, thread_name_prefix="sql-execution"
+)
 
 
 def run_with_timeout(func, args=(), kwargs=None, timeout_duration=60):
     if kwargs is None:
         kwargs = {}
 
-    def func_wrapper(result_container):
-        try:
-            result_container.append(func(*args, **kwargs))
-        except Exception as e:
-            result_container.append(e)
-
-    result_container = []
-    thread = threading.Thread(target=func_wrapper, args=(result_container,))
-    thread.start()
-    thread.join(timeout=timeout_duration)
-    if thread.is_alive():
-        raise TimeoutError("Function execution exceeded the timeout")
-    if result_container:
-        if isinstance(result_container[0], Exception):
-            raise result_container[0]
-        return result_container[0]
-    raise TimeoutError("Function execution exceeded the timeout")
+    future = _executor.submit(func, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout_duration)
+    except TimeoutError as e:
+        # Only drops the call if it has not started yet, a running query keeps its
+        # worker until the statement timeout of SQLDatabase.run_sql stops it
+        future.cancel()
+        raise TimeoutError("Function execution exceeded the timeout") from e
@@ -1,8 +1,19 @@
+import os
+import time
 from abc import ABC, abstractmethod
 from typing import Any, List
 
+from langchain_core.embeddings import Embeddings
+
 from dataherald.config import Component, System
+from dataherald.db import DB
+from dataherald.repositories.database_connections import DatabaseConnectionRepository
 from dataherald.types import GoldenSQL
+from dataherald.utils.embeddings import EmbeddingClients
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Seconds the api key of a db connection is reused before it is read again
+EMBEDDING_API_KEY_TTL = int(os.environ.get("EMBEDDING_API_KEY_TTL", "300"))
 
 
 class VectorStore(Component, ABC):
@@ -11,6 +22,7 @@ class VectorStore(Component, ABC):
     @abstractmethod
     def __init__(self, system: System):
         self.system = system
+        self.api_keys = {}
 
     @abstractmethod
     def query(
@@ -22,6 +34,25 @@ class VectorStore(Component, ABC):
     ) -> list:
         pass
 
+    def get_embedding(self, db_connection_id: str) -> Embeddings:
+        """Shared embedding client of the api key of the db connection"""
+        api_key, expires_at = self.api_keys.get(db_connection_id, (None, 0))
+        if time.monotonic() >= expires_at:
+            db_connection_repository = DatabaseConnectionRepository(
+                self.system.instance(DB)
+            )
+            database_connection = db_connection_repository.find_by_id(db_connection_id)
+            api_key = database_connection.decrypt_api_key()
+            self.api_keys[db_connection_id] = (
+                api_key,
+                time.monotonic() + EMBEDDING_API_KEY_TTL,
+            )
+        return EmbeddingClients.get(api_key, EMBEDDING_MODEL)
+
+    def get_similarity(self, score: float) -> float:
+        """Converts a score returned by query to a cosine similarity"""
+        return score
+
     @abstractmethod
     def create_collection(self, collection: str):
         pass
@@ -3,18 +3,13 @@ from typing import Any, List
 
 from astrapy.api import APIRequestError
 from astrapy.db import AstraDB
-from langchain_openai import OpenAIEmbeddings
 from overrides import override
 from sql_metadata import Parser
 
 from dataherald.config import System
-from dataherald.db import DB
-from dataherald.repositories.database_connections import DatabaseConnectionRepository
 from dataherald.types import GoldenSQL
 from dataherald.vector_store import VectorStore
 
-EMBEDDING_MODEL = "text-embedding-3-small"
-
 
 class Astra(VectorStore):
     def __init__(self, system: System):
@@ -50,13 +45,7 @@ class Astra(VectorStore):
         if collection not in existing_collections:
             raise ValueError(f"Collection {collection} does not exist")
         astra_collection = self.db.collection(collection)
-        db_connection_repository = DatabaseConnectionRepository(
-            self.system.instance(DB)
-        )
-        database_connection = db_connection_repository.find_by_id(db_connection_id)
-        embedding = OpenAIEmbeddings(
-            openai_api_key=database_connection.decrypt_api_key(), model=EMBEDDING_MODEL
-        )
+        embedding = self.get_embedding(db_connection_id)
         xq = embedding.embed_query(query_texts[0])
         returened_results = astra_collection.vector_find(
             vector=xq,
@@ -66,6 +55,11 @@ class Astra(VectorStore):
         )
         return self.convert_to_pinecone_object_model(returened_results)
 
+    @override
+    def get_similarity(self, score: float) -> float:
+        # Astra scales cosine similarities to [0, 1]
+        return 2 * score - 1
+
     @override
     def add_records(self, golden_sqls: List[GoldenSQL], collection: str):
         collection = self.collection_name_formatter(collection)
@@ -76,15 +70,7 @@ class Astra(VectorStore):
         if collection not in existing_collections:
             self.create_collection(collection)
         astra_collection = self.db.collection(collection)
-        db_connection_repository = DatabaseConnectionRepository(
-            self.system.instance(DB)
-        )
-        database_connection = db_connection_repository.find_by_id(
-            str(golden_sqls[0].db_connection_id)
-        )
-        embedding = OpenAIEmbeddings(
-            openai_api_key=database_connection.decrypt_api_key(), model=EMBEDDING_MODEL
-        )
+        embedding = self.get_embedding(str(golden_sqls[0].db_connection_id))
         embeds = embedding.embed_documents(
             [record.prompt_text for record in golden_sqls]
         )
@@ -123,15 +109,11 @@ class Astra(VectorStore):
         if collection not in existing_collections:
             self.create_collection(collection)
         astra_collection = self.db.collection(collection)
-        db_connection_repository = DatabaseConnectionRepository(
-            self.system.instance(DB)
-        )
-        database_connection = db_connection_repository.find_by_id(db_connection_id)
-        embedding = OpenAIEmbeddings(
-            openai_api_key=database_connection.decrypt_api_key(), model=EMBEDDING_MODEL
-        )
+        embedding = self.get_embedding(db_connection_id)
         embeds = embedding.embed_documents([documents])
-        astra_collection.insert_one({"_id": ids[0], "$vector": embeds, **metadata[0]})
+        astra_collection.insert_one(
+            {"_id": ids[0], "$vector": embeds[0], **metadata[0]}
+        )
 
     @override
     def delete_record(self, collection: str, id: str):
@@ -1,3 +1,4 @@
+import os
 from typing import Any, List
 
 import chromadb
@@ -8,6 +9,16 @@ from dataherald.config import System
 from dataherald.types import GoldenSQL
 from dataherald.vector_store import VectorStore
 
+# Records embedded and written per call, Chroma embeds the documents of a call together
+CHROMA_BATCH_SIZE = int(os.environ.get("CHROMA_BATCH_SIZE", "500"))
+
+
+def get_tables_used(sql: str) -> str:
+    try:
+        return ", ".join(Parser(sql).tables)
+    except Exception:
+        return ""
+
 
 class Chroma(VectorStore):
     def __init__(
@@ -38,24 +49,40 @@ class Chroma(VectorStore):
         )
         return self.convert_to_pinecone_object_model(query_results)
 
+    @override
+    def get_similarity(self, score: float) -> float:
+        # Chroma returns squared L2 distances between normalized embeddings
+        return 1 - score / 2
+
     @override
     def add_records(self, golden_sqls: List[GoldenSQL], collection: str):
-        for golden_sql in golden_sqls:
-            self.add_record(
-                golden_sql.prompt_text,
-                golden_sql.db_connection_id,
-                collection,
-                [
+        """Skips the records that are already stored, the rest are upserted in batches"""
+        target_collection = self.chroma_client.get_or_create_collection(collection)
+        for index in range(0, len(golden_sqls), CHROMA_BATCH_SIZE):
+            golden_sql_batch = golden_sqls[index : index + CHROMA_BATCH_SIZE]
+            existing_ids = set(
+                target_collection.get(
+                    ids=[str(golden_sql.id) for golden_sql in golden_sql_batch],
+                    include=[],
+                )["ids"]
+            )
+            new_golden_sqls = [
+                golden_sql
+                for golden_sql in golden_sql_batch
+                if str(golden_sql.id) not in existing_ids
+            ]
+            if not new_golden_sqls:
+                continue
+            target_collection.upsert(
+                ids=[str(golden_sql.id) for golden_sql in new_golden_sqls],
+                documents=[golden_sql.prompt_text for golden_sql in new_golden_sqls],
+                metadatas=[
                     {
-                        "tables_used": (
-                            ", ".join(Parser(golden_sql.sql))
-                            if isinstance(Parser(golden_sql.sql), list)
-                            else ""
-                        ),
+                        "tables_used": get_tables_used(golden_sql.sql),
                         "db_connection_id": str(golden_sql.db_connection_id),
                     }
+                    for golden_sql in new_golden_sqls
                 ],
-                ids=[str(golden_sql.id)],
             )
 
     @override
@@ -0,0 +1,270 @@
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Iterator, List
+
+import numpy as np
+from overrides import override
+
+from dataherald.config import System
+from dataherald.types import GoldenSQL
+from dataherald.vector_store import VectorStore
+
+NUMPY_INDEX_DIRECTORY = os.environ.get("NUMPY_INDEX_DIRECTORY", "/app/numpy_index")
+# Records embedded per call when golden SQLs are added in bulk
+NUMPY_INDEX_BATCH_SIZE = int(os.environ.get("NUMPY_INDEX_BATCH_SIZE", "500"))
+# Share of deleted rows that makes a sub-index be rewritten without them
+NUMPY_INDEX_COMPACT_RATIO = 0.5
+
+
+class NumpyIndex(VectorStore):
+    """Exact cosine search over the normalized vectors of each db connection, kept in
+    memory-mapped files under NUMPY_INDEX_DIRECTORY/<collection>/. Each db connection
+    has a raw float32 file that new vectors are appended to and a json file with the
+    ids of its rows, deleted rows keep a null id until the file is compacted. Writes hold
+    the lock of the index and an exclusive flock on <collection>.lock, so the engine
+    processes sharing the directory change the files one at a time"""
+
+    def __init__(self, system: System, persist_directory: str = NUMPY_INDEX_DIRECTORY):
+        super().__init__(system)
+        self.persist_directory = persist_directory
+        self.sub_indexes = {}
+        # db connection of each stored id by collection and id, filled as the files load
+        self.db_connection_ids = {}
+        self.lock = Lock()
+
+    def get_paths(self, collection: str, db_connection_id: str) -> tuple[str, str]:
+        path = os.path.join(self.persist_directory, collection, str(db_connection_id))
+        return f"{path}.f32", f"{path}.json"
+
+    @contextmanager
+    def write_lock(self, collection: str) -> Iterator[None]:
+        """Serializes the writes of the threads and of the processes, closing the lock
+        file releases the flock"""
+        with self.lock:
+            os.makedirs(self.persist_directory, exist_ok=True)
+            lock_path = os.path.join(self.persist_directory, f"{collection}.lock")
+            with open(lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def load(self, collection: str, db_connection_id: str) -> dict | None:
+        """Called with the lock, returns the ids and the memory-mapped vectors, reloaded
+        when another process changed the files"""
+        vectors_path, ids_path = self.get_paths(collection, db_connection_id)
+        try:
+            modified_at = os.stat(ids_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        key = (collection, str(db_connection_id))
+        sub_index = self.sub_indexes.get(key)
+        if sub_index is not None and sub_index["modified_at"] == modified_at:
+            return sub_index
+        with open(ids_path) as file_object:
+            loaded = json.load(file_object)
+        rows = len(loaded["ids"])
+        if rows and os.path.getsize(vectors_path) < rows * loaded["dimension"] * 4:
+            # Another process is compacting the files, the previous ids still match
+            # the vectors they mapped
+            return sub_index
+        sub_index = loaded
+        sub_index["vectors"] = (
+            np.memmap(
+                vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(rows, sub_index["dimension"]),
+            )
+            if rows
+            else np.empty((0, sub_index["dimension"]), dtype=np.float32)
+        )
+        sub_index["modified_at"] = modified_at
+        self.sub_indexes[key] = sub_index
+        for id in sub_index["ids"]:
+            if id is not None:
+                self.db_connection_ids[(collection, id)] = str(db_connection_id)
+        return sub_index
+
+    def save_ids(
+        self, collection: str, db_connection_id: str, ids: list, dimension: int
+    ) -> None:
+        """Called with the write lock"""
+        _, ids_path = self.get_paths(collection, db_connection_id)
+        with open(f"{ids_path}.tmp", "w") as file_object:
+            json.dump({"dimension": dimension, "ids": ids}, file_object)
+        os.replace(f"{ids_path}.tmp", ids_path)
+        self.sub_indexes.pop((collection, str(db_connection_id)), None)
+
+    def append(
+        self,
+        collection: str,
+        db_connection_id: str,
+        ids: List[str],
+        vectors: List[List[float]],
+    ):
+        """Appends the rows of the ids that are not stored yet"""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        with self.write_lock(collection):
+            os.makedirs(os.path.join(self.persist_directory, collection), exist_ok=True)
+            sub_index = self.load(collection, db_connection_id)
+            stored_ids = [] if sub_index is None else list(sub_index["ids"])
+            existing_ids = set(stored_ids)
+            rows = [index for index, id in enumerate(ids) if id not in existing_ids]
+            if not rows:
+                return
+            vectors_path, _ = self.get_paths(collection, db_connection_id)
+            # Rows past the ones listed in the json file were left by a failed write, no
+            # reader maps them and compact replaces the file instead of truncating it
+            with open(vectors_path, "ab") as file_object:
+                file_object.truncate(len(stored_ids) * matrix.shape[1] * 4)
+                file_object.write(matrix[rows].tobytes())
+            self.save_ids(
+                collection,
+                db_connection_id,
+                stored_ids + [ids[index] for index in rows],
+                matrix.shape[1],
+            )
+
+    def compact(self, collection: str, db_connection_id: str, sub_index: dict):
+        """Called with the write lock"""
+        rows = [index for index, id in enumerate(sub_index["ids"]) if id is not None]
+        vectors_path, _ = self.get_paths(collection, db_connection_id)
+        vectors = np.array(sub_index["vectors"][rows])
+        with open(f"{vectors_path}.tmp", "wb") as file_object:
+            file_object.write(vectors.tobytes())
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        self.save_ids(
+            collection,
+            db_connection_id,
+            [sub_index["ids"][index] for index in rows],
+            sub_index["dimension"],
+        )
+
+    @override
+    def query(
+        self,
+        query_texts: List[str],
+        db_connection_id: str,
+        collection: str,
+        num_results: int,
+    ) -> list:
+        with self.lock:
+            sub_index = self.load(collection, db_connection_id)
+        if sub_index is None or num_results <= 0:
+            return []
+        query_vector = np.asarray(
+            self.get_embedding(db_connection_id).embed_query(query_texts[0]),
+            dtype=np.float32,
+        )
+        scores = sub_index["vectors"] @ (query_vector / np.linalg.norm(query_vector))
+        deleted = [index for index, id in enumerate(sub_index["ids"]) if id is None]
+        scores[deleted] = -np.inf
+        num_results = min(num_results, len(sub_index["ids"]) - len(deleted))
+        if num_results <= 0:
+            return []
+        top = np.argpartition(-scores, num_results - 1)[:num_results]
+        return [
+            {"id": sub_index["ids"][index], "score": float(scores[index])}
+            for index in top[np.argsort(-scores[top])]
+        ]
+
+    @override
+    def add_records(self, golden_sqls: List[GoldenSQL], collection: str):
+        golden_sqls_by_connection = {}
+        for golden_sql in golden_sqls:
+            golden_sqls_by_connection.setdefault(
+                str(golden_sql.db_connection_id), []
+            ).append(golden_sql)
+        for db_connection_id, records in golden_sqls_by_connection.items():
+            with self.lock:
+                sub_index = self.load(collection, db_connection_id)
+            existing_ids = set() if sub_index is None else set(sub_index["ids"])
+            new_golden_sqls = [
+                golden_sql
+                for golden_sql in records
+                if str(golden_sql.id) not in existing_ids
+            ]
+            embedding = self.get_embedding(db_connection_id)
+            for index in range(0, len(new_golden_sqls), NUMPY_INDEX_BATCH_SIZE):
+                batch = new_golden_sqls[index : index + NUMPY_INDEX_BATCH_SIZE]
+                self.append(
+                    collection,
+                    db_connection_id,
+                    [str(golden_sql.id) for golden_sql in batch],
+                    embedding.embed_documents(
+                        [golden_sql.prompt_text for golden_sql in batch]
+                    ),
+                )
+
+    @override
+    def add_record(
+        self,
+        documents: str,
+        db_connection_id: str,
+        collection: str,
+        metadata: Any,  # noqa: ARG002
+        ids: List,
+    ):
+        embedding = self.get_embedding(db_connection_id)
+        self.append(
+            collection,
+            db_connection_id,
+            [str(ids[0])],
+            embedding.embed_documents([documents]),
+        )
+
+    def find_db_connection_id(self, collection: str, id: str) -> str | None:
+        """Called with the lock, loads the files of the collection when the id was
+        added by another process"""
+        if (collection, id) not in self.db_connection_ids:
+            collection_path = os.path.join(self.persist_directory, collection)
+            if not os.path.isdir(collection_path):
+                return None
+            for file_name in os.listdir(collection_path):
+                if file_name.endswith(".json"):
+                    self.load(collection, file_name[: -len(".json")])
+        return self.db_connection_ids.get((collection, id))
+
+    @override
+    def delete_record(self, collection: str, id: str):
+        with self.write_lock(collection):
+            db_connection_id = self.find_db_connection_id(collection, id)
+            if db_connection_id is None:
+                return
+            self.db_connection_ids.pop((collection, id))
+            sub_index = self.load(collection, db_connection_id)
+            if sub_index is None or id not in sub_index["ids"]:
+                return
+            ids = [
+                None if stored_id == id else stored_id for stored_id in sub_index["ids"]
+            ]
+            if ids.count(None) > len(ids) * NUMPY_INDEX_COMPACT_RATIO:
+                self.compact(collection, db_connection_id, {**sub_index, "ids": ids})
+            else:
+                self.save_ids(collection, db_connection_id, ids, sub_index["dimension"])
+
+    @override
+    def delete_collection(self, collection: str):
+        with self.write_lock(collection):
+            shutil.rmtree(
+                os.path.join(self.persist_directory, collection), ignore_errors=True
+            )
+            self.sub_indexes = {
+                key: sub_index
+                for key, sub_index in self.sub_indexes.items()
+                if key[0] != collection
+            }
+            self.db_connection_ids = {
+                key: db_connection_id
+                for key, db_connection_id in self.db_connection_ids.items()
+                if key[0] != collection
+            }
+
+    @override
+    def create_collection(self, collection: str):
+        os.makedirs(os.path.join(self.persist_directory, collection), exist_ok=True)
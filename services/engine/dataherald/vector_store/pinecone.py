@@ -2,18 +2,13 @@ import os
 from typing import Any, List
 
 import pinecone
-from langchain_openai import OpenAIEmbeddings
 from overrides import override
 from sql_metadata import Parser
 
 from dataherald.config import System
-from dataherald.db import DB
-from dataherald.repositories.database_connections import DatabaseConnectionRepository
 from dataherald.types import GoldenSQL
 from dataherald.vector_store import VectorStore
 
-EMBEDDING_MODEL = "text-embedding-3-small"
-
 
 class Pinecone(VectorStore):
     pinecone: None
@@ -35,13 +30,7 @@ class Pinecone(VectorStore):
         num_results: int,
     ) -> list:
         index = self.pinecone.Index(name=collection)
-        db_connection_repository = DatabaseConnectionRepository(
-            self.system.instance(DB)
-        )
-        database_connection = db_connection_repository.find_by_id(db_connection_id)
-        embedding = OpenAIEmbeddings(
-            openai_api_key=database_connection.decrypt_api_key(), model=EMBEDDING_MODEL
-        )
+        embedding = self.get_embedding(db_connection_id)
         xq = embedding.embed_query(query_texts[0])
         query_response = index.query(
             vector=[xq],
@@ -57,15 +46,7 @@ class Pinecone(VectorStore):
     def add_records(self, golden_sqls: List[GoldenSQL], collection: str):
         if collection not in self.pinecone.list_indexes().names():
             self.create_collection(collection)
-        db_connection_repository = DatabaseConnectionRepository(
-            self.system.instance(DB)
-        )
-        database_connection = db_connection_repository.find_by_id(
-            str(golden_sqls[0].db_connection_id)
-        )
-        embedding = OpenAIEmbeddings(
-            openai_api_key=database_connection.decrypt_api_key(), model=EMBEDDING_MODEL
-        )
+        embedding = self.get_embedding(str(golden_sqls[0].db_connection_id))
         index = self.pinecone.Index(name=collection)
         batch_limit = 100
         for limit_index in range(0, len(golden_sqls), batch_limit):
@@ -103,16 +84,10 @@ class Pinecone(VectorStore):
     ):
         if collection not in self.pinecone.list_indexes().names():
             self.create_collection(collection)
-        db_connection_repository = DatabaseConnectionRepository(
-            self.system.instance(DB)
-        )
-        database_connection = db_connection_repository.find_by_id(db_connection_id)
-        embedding = OpenAIEmbeddings(
-            openai_api_key=database_connection.decrypt_api_key(), model=EMBEDDING_MODEL
-        )
+        embedding = self.get_embedding(db_connection_id)
         index = self.pinecone.Index(name=collection)
         embeds = embedding.embed_documents([documents])
-        record = [(ids[0], embeds, metadata[0])]
+        record = [(ids[0], embeds[0], metadata[0])]
         index.upsert(vectors=record)
 
     @override